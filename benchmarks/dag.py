@@ -0,0 +1,49 @@
+"""
+Builds TAC for a large generated program directly and through the
+hash-consing ExpressionDag, comparing the length of the TAC and the time
+optimize_tac then spends on it
+
+    python -m benchmarks.dag
+"""
+from time import perf_counter
+
+from compiler.frontend import parse_source
+from compiler.optimize import optimize_tac
+from compiler.tac import build_tac
+
+FUNCTIONS = 500
+
+
+def function(index):
+    return (f'int f{index}(int a, int b) {{\n'
+            f'  int k = {index % 7} * 4 + 1;\n'
+            f'  int x = a * b + k * 2;\n'
+            f'  int y = (b * a + 0) * 1 - k;\n'
+            f'  if (x > y) {{\n'
+            f'    y = a * b + x * 2;\n'
+            f'  }}\n'
+            f'  return x + y + a * b;\n'
+            f'}}\n')
+
+
+def program():
+    return ''.join(function(i) for i in range(FUNCTIONS))
+
+
+def main():
+    head = parse_source(program())
+    for dag in [False, True]:
+        start = perf_counter()
+        tac_list = build_tac(head, dag=dag)
+        built = perf_counter() - start
+        size = len(tac_list)
+        start = perf_counter()
+        optimized = optimize_tac(tac_list)
+        optimized_in = perf_counter() - start
+        print(f'dag={dag!s:5}: {size} instructions built in '
+              f'{built * 1000:.1f}ms, optimized to {len(optimized)} in '
+              f'{optimized_in * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
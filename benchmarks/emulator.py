@@ -0,0 +1,63 @@
+"""
+Runs recursive programs in the emulator, reporting how many instructions
+they execute, how many of those are under each label, and how fast the
+emulator runs them
+
+    python -m benchmarks.emulator
+"""
+from time import perf_counter
+
+from compiler.emulator import Emulator
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.optimize import optimize_tac
+from compiler.tac import build_tac
+
+PROGRAMS = {
+    'sum': '''int sum(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+
+int main() {
+  print(sum(10000));
+  return 0;
+}
+''',
+    'fib': '''int fib(int n) {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+
+int main() {
+  print(fib(20));
+  return 0;
+}
+''',
+}
+
+
+def main():
+    for name, source in PROGRAMS.items():
+        for optimize in [False, True]:
+            tac_list = build_tac(parse_source(source), dag=optimize)
+            if optimize:
+                tac_list = optimize_tac(tac_list)
+            emulator = Emulator(build_mips(tac_list))
+            start = perf_counter()
+            emulator.run()
+            elapsed = perf_counter() - start
+            labels = ', '.join(
+                f'{label} {count}' for label, count in
+                sorted(emulator.label_counts().items()) if count)
+            print(f'{name} optimize={optimize!s:5}: {emulator.executed} '
+                  f'instructions in {elapsed * 1000:.1f}ms, '
+                  f'{emulator.executed / elapsed / 1e6:.1f}M/s ({labels})')
+
+
+if __name__ == '__main__':
+    main()
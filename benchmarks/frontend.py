@@ -0,0 +1,38 @@
+"""
+Compares compile-throughput of the in-process frontend against the ./mycc
+subprocess path
+
+    python -m benchmarks.frontend
+"""
+from glob import glob
+from timeit import timeit
+
+from compiler.compile import stream_ast
+from compiler.frontend import parse_source
+from compiler.parse import parse
+
+ROUNDS = 20
+
+
+def with_mycc(sources):
+    for src in sources:
+        with open(src) as src_file:
+            parse(stream_ast(src_file))
+
+
+def in_process(sources):
+    for src in sources:
+        with open(src) as src_file:
+            parse_source(src_file.read())
+
+
+def main():
+    sources = glob('examples/*.cmm')
+    for name, func in [('mycc', with_mycc), ('in-process', in_process)]:
+        seconds = timeit(lambda: func(sources), number=ROUNDS)
+        files = ROUNDS * len(sources)
+        print(f'{name:>12}: {files / seconds:10.1f} files/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Recompiles a 500 function program after editing one function, against a
+full compile and against compiling that function alone
+
+    python -m benchmarks.incremental
+"""
+from time import perf_counter
+
+from compiler.compile import compile_source
+from compiler.incremental import IncrementalBuild
+
+FUNCTIONS = 500
+
+
+def function(index, constant):
+    return (f'int f{index}(int a, int b) {{\n'
+            f'  int x = a * {constant} + b;\n'
+            f'  if (x > 10) {{\n'
+            f'    x = x - b;\n'
+            f'  }}\n'
+            f'  return x + f{index - 1}(b, a);\n'
+            f'}}\n' if index else
+            f'int f0(int a, int b) {{\n  return a + b;\n}}\n')
+
+
+def program(edited=None):
+    return ''.join(function(i, 7 if i == edited else 3)
+                   for i in range(FUNCTIONS))
+
+
+def timed(func, *args):
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+
+def main():
+    builder = IncrementalBuild()
+    full = timed(compile_source, program())
+    initial = timed(builder.build, program())
+    edit = timed(builder.build, program(250))
+    assert builder.rebuilt == ['f250']
+    single = timed(compile_source, function(250, 7).replace('f249', 'f250'))
+
+    print(f'full compile:        {full * 1000:8.2f}ms')
+    print(f'initial incremental: {initial * 1000:8.2f}ms')
+    print(f'edit one function:   {edit * 1000:8.2f}ms')
+    print(f'one function alone:  {single * 1000:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
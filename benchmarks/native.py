@@ -0,0 +1,74 @@
+"""
+Times recursive programs compiled natively for x86-64 against the same
+programs run as MIPS in the emulator, and in spim when it is installed
+
+    python -m benchmarks.native
+"""
+from os import path
+from shutil import which
+from subprocess import DEVNULL, run
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from compiler.compile import compile_source
+from compiler.emulator import Emulator
+from compiler.x86 import assemble
+
+PROGRAMS = {
+    'fib(22)': '''int fib(int n) {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+
+int main() {
+  print(fib(22));
+  return 0;
+}
+''',
+    'sum(20000)': '''int sum(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+
+int main() {
+  print(sum(20000));
+  return 0;
+}
+''',
+}
+
+
+def timed(function):
+    start = perf_counter()
+    function()
+    return (perf_counter() - start) * 1000
+
+
+def main():
+    with TemporaryDirectory() as directory:
+        executable = path.join(directory, 'prog')
+        script = path.join(directory, 'prog.s')
+        for name, source in PROGRAMS.items():
+            assemble(compile_source(source, True, target='x86-64'),
+                     executable)
+            mips = compile_source(source, True)
+            times = {
+                'native': timed(lambda: run([executable], stdout=DEVNULL)),
+                'emulator': timed(lambda: Emulator(mips).run()),
+            }
+            if which('spim'):
+                with open(script, 'w') as f:
+                    f.write(''.join(line + '\n' for line in mips))
+                times['spim'] = timed(lambda: run(['spim', 'load', script],
+                                                  stdout=DEVNULL))
+            print(f'{name}: ' + ', '.join(
+                f'{target} {elapsed:.1f}ms'
+                for target, elapsed in times.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Times one sweep of each optimizer pass over a large generated straight line
+TAC list
+
+    python -m benchmarks.optimizer
+"""
+from random import Random
+from timeit import timeit
+
+from compiler.optimize import (eliminate_dead_code, optimize_tac,
+                               propagate_copies)
+from compiler.peephole import DEFAULT_RULES
+from compiler.tac import TacOperation, TacPrint
+
+OPERATORS = ['+', '-', '*', '<', '==']
+
+
+def generate_tac(size, seed=0):
+    """
+    Operations over a few variables, constants and earlier temporaries,
+    printing every eighth result so the values have readers
+    """
+    random = Random(seed)
+    tac_list = []
+    for index in range(size):
+        operands = ['x', 'y', 'z', '0', '1', '2', '7']
+        operands.extend(f't{i}' for i in range(max(0, index - 4), index))
+        tac_list.append(TacOperation(
+            f't{index}', random.choice(OPERATORS),
+            random.choice(operands), random.choice(operands)))
+        if index % 8 == 7:
+            tac_list.append(TacPrint(f't{index}'))
+    return tac_list
+
+
+def peephole(tac_list):
+    for instruction in tac_list:
+        DEFAULT_RULES.apply(instruction)
+    return tac_list
+
+
+def dead_code(tac_list):
+    return eliminate_dead_code(tac_list)[0]
+
+
+def copies(tac_list):
+    propagate_copies(tac_list)
+    return tac_list
+
+
+def main():
+    for size in [500, 1000, 2000]:
+        timings = []
+        for optimization in [peephole, dead_code, copies]:
+            tac_lists = [generate_tac(size, seed) for seed in range(3)]
+            # Earlier passes shape the input of later ones
+            for previous in [peephole, dead_code, copies]:
+                if previous is optimization:
+                    break
+                tac_lists = [previous(tac_list) for tac_list in tac_lists]
+            seconds = timeit(lambda: optimization(tac_lists.pop()), number=3)
+            timings.append(f'{optimization.__name__} '
+                           f'{seconds / 3 * 1000:8.2f}ms')
+        print(f'{size:>5} instructions: ' + ', '.join(timings))
+
+    # Dead code elimination and the whole worklist driven optimizer are
+    # close to linear, so they also run on much larger lists
+    for size in [2000, 10000, 100000]:
+        timings = []
+        for optimization in [dead_code, optimize_tac]:
+            tac_lists = [generate_tac(size, seed) for seed in range(3)]
+            seconds = timeit(lambda: optimization(tac_lists.pop()), number=3)
+            timings.append(f'{optimization.__name__} '
+                           f'{seconds / 3 * 1000:8.2f}ms')
+        print(f'{size:>5} instructions: ' + ', '.join(timings))
+
+
+if __name__ == '__main__':
+    main()
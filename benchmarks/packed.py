@@ -0,0 +1,44 @@
+"""
+Compares the packed TAC store with the object form: memory per instruction
+and optimizer pass throughput
+
+    python -m benchmarks.packed
+"""
+import tracemalloc
+from timeit import timeit
+
+from benchmarks.optimizer import copies, dead_code, generate_tac, peephole
+from compiler.packed import pack
+
+SIZE = 2000
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tac = build()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / SIZE, tac
+
+
+def main():
+    # Tokens are interned, so build them outside the measured region
+    objects = generate_tac(SIZE)
+    object_bytes, _ = measure_memory(lambda: generate_tac(SIZE))
+    packed_bytes, packed = measure_memory(lambda: pack(objects))
+    print(f'object form: {object_bytes:6.1f} bytes/instruction')
+    print(f'packed form: {packed_bytes:6.1f} bytes/instruction '
+          f'({packed.nbytes / SIZE:.1f} in columns)')
+
+    for optimization in [peephole, dead_code, copies]:
+        for name, form in [('object', lambda s: generate_tac(SIZE, s)),
+                           ('packed', lambda s: pack(generate_tac(SIZE, s)))]:
+            tac_lists = [form(seed) for seed in range(3)]
+            seconds = timeit(lambda: optimization(tac_lists.pop()), number=3)
+            print(f'{optimization.__name__:>10} {name}: '
+                  f'{seconds / 3 * 1000:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
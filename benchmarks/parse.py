@@ -0,0 +1,53 @@
+"""
+Times parse_ast on generated AST dumps of growing size, both balanced
+(log depth) and deep (a single nested chain, where indentation makes the
+dump itself grow quadratically in bytes)
+
+    python -m benchmarks.parse
+"""
+import tracemalloc
+from time import perf_counter
+
+from compiler.parse import parse_ast
+
+
+def balanced_ast(lines):
+    stack = [(lines, 0)]
+    while stack:
+        size, level = stack.pop()
+        yield ' ' * (2 * level) + ('+' if size > 1 else '1')
+        if size > 1:
+            half = (size - 1) // 2
+            stack.append((size - 1 - half, level + 1))
+            stack.append((half, level + 1))
+
+
+def deep_ast(lines):
+    for level in range(lines):
+        yield ' ' * (2 * level) + '!'
+
+
+def measure(shape, lines):
+    size = sum(map(len, shape(lines)))
+    start = perf_counter()
+    parse_ast(shape(lines))
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    parse_ast(shape(lines))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    for shape in [balanced_ast, deep_ast]:
+        for lines in [25000, 50000, 100000]:
+            size, elapsed, peak = measure(shape, lines)
+            print(f'{shape.__name__:>12} {lines:>7} lines '
+                  f'{size / 2 ** 20:8.1f} MiB: {elapsed:6.3f}s '
+                  f'({elapsed * 1e6 / lines:5.2f} us/line) '
+                  f'{peak / 2 ** 20:5.1f} MiB peak')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compares MIPS selected with tiles against one register form per operation:
+the machine instructions of each program under the cost model, and how
+many instructions it executes and the machine instructions and cycles
+those take
+
+    python -m benchmarks.selection
+"""
+from glob import glob
+
+from benchmarks.emulator import PROGRAMS
+from compiler.emulator import Emulator
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.optimize import optimize_tac
+from compiler.selection import BASIC_TILES, TILES, cost, cycles, total_cost
+from compiler.tac import build_tac
+
+# Divides and multiplies by constants
+DIGITS = '''int digits(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n % 10 * 3 + digits(n / 10);
+}
+
+int sum(int i, int total) {
+  if (i == 2000) {
+    return total;
+  }
+  return sum(i + 1, total + digits(i * 7919));
+}
+
+int main() {
+  print(sum(0, 0));
+  return 0;
+}
+'''
+
+
+REPORT = '{} machine, {} executed ({} machine, {} cycles)'
+
+
+def measure(tac_list, tiles):
+    mips = build_mips(tac_list, tiles=tiles)
+    emulator = Emulator(mips)
+    emulator.run()
+    # The emulator counts instructions, weight them by what they cost
+    lines = [line for line in mips
+             if line.split('#', 1)[0].strip() and not line.endswith(':')]
+    executed_cost = sum(count * cost(line) for count, line
+                        in zip(emulator.counts, lines))
+    executed_cycles = sum(count * cycles(line) for count, line
+                          in zip(emulator.counts, lines))
+    return (total_cost(mips), emulator.executed, executed_cost,
+            executed_cycles)
+
+
+def main():
+    programs = dict(PROGRAMS, digits=DIGITS)
+    for src in sorted(glob('examples/*.cmm')):
+        with open(src) as src_file:
+            if 'Answer' in src_file.readline():
+                src_file.seek(0)
+                programs[src] = src_file.read()
+
+    totals = {}
+    for name, source in programs.items():
+        tac_list = optimize_tac(build_tac(parse_source(source)))
+        results = []
+        for tiles in (BASIC_TILES, TILES):
+            result = measure(tac_list, tiles)
+            totals[tiles] = [a + b for a, b in
+                             zip(totals.get(tiles, [0] * 4), result)]
+            results.append(REPORT.format(*result))
+        print(f'{name}: {results[0]} -> {results[1]}')
+    print(f'total: {REPORT.format(*totals[BASIC_TILES])} -> '
+          f'{REPORT.format(*totals[TILES])}')
+
+
+if __name__ == '__main__':
+    main()
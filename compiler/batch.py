@@ -0,0 +1,113 @@
+"""
+Compiles many C-- files across a pool of processes
+
+    mmcc build examples/ other.cmm -o build/ -j 4
+"""
+import argparse
+import sys
+from compiler.cache import CACHE_DIR, Cache
+from compiler.client import write_program
+from compiler.compile import compile_source, make_program
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from os import makedirs, path
+from time import perf_counter
+from typing import NamedTuple, Optional
+
+
+class BuildResult(NamedTuple):
+    src: str
+    out: str
+    error: Optional[str]
+    elapsed: float
+    cached: bool = False
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='mmcc build', description='Compiles many scripts in parallel.')
+    parser.add_argument('sources', nargs='+',
+                        help='source files or directories of .cmm files')
+    parser.add_argument('-o', '--out-dir',
+                        help='directory for outputs, defaults to beside '
+                             'each source')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--optimize', action='store_true')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    return parser.parse_args(argv)
+
+
+def find_sources(paths):
+    for src in paths:
+        if path.isdir(src):
+            yield from sorted(glob(path.join(src, '*.cmm')))
+        else:
+            yield src
+
+
+def output_path(src, out_dir):
+    stem, _ = path.splitext(src)
+    if out_dir:
+        return path.join(out_dir, path.basename(stem) + '.out')
+    return stem + '.out'
+
+
+def build_file(src, out, optimize=False, cache_dir=None) -> BuildResult:
+    """
+    Compiles a single file, turning the pipeline's sys.exit calls into a
+    per-file error rather than letting them end the whole batch
+    """
+    start = perf_counter()
+    cache = Cache(cache_dir) if cache_dir else None
+    try:
+        with open(src) as f:
+            mips = compile_source(f.read(), optimize, cache)
+        write_program(make_program(mips), out)
+    except SystemExit as error:
+        return BuildResult(src, out, str(error.code), perf_counter() - start)
+    except Exception as error:
+        message = f'{type(error).__name__}: {error}'
+        return BuildResult(src, out, message, perf_counter() - start)
+    cached = bool(cache and cache.hits)
+    return BuildResult(src, out, None, perf_counter() - start, cached)
+
+
+def build(sources, out_dir=None, jobs=None, optimize=False, cache_dir=None):
+    if out_dir:
+        makedirs(out_dir, exist_ok=True)
+    outs = [output_path(src, out_dir) for src in sources]
+    with ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(build_file, sources, outs,
+                            [optimize] * len(sources),
+                            [cache_dir] * len(sources))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = list(find_sources(args.sources))
+
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    start = perf_counter()
+    failures = hits = 0
+    for result in build(sources, args.out_dir, args.jobs, args.optimize,
+                        cache_dir):
+        if result.error:
+            failures += 1
+            print(f'FAIL {result.src} ({result.elapsed * 1000:.2f}ms)')
+            print(f'     {result.error}')
+        else:
+            hits += result.cached
+            cached = ', cached' if result.cached else ''
+            print(f'ok   {result.src} -> {result.out} '
+                  f'({result.elapsed * 1000:.2f}ms{cached})')
+    elapsed = perf_counter() - start
+
+    print(f'{len(sources)} files, {failures} failed in {elapsed:.2f}s '
+          f'({len(sources) / elapsed:.1f} files/s)')
+    if cache_dir:
+        print(f'cache: {hits} hits, {len(sources) - hits} misses')
+
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,101 @@
+"""
+Content addressed on-disk cache of compiled programs
+
+Entries are keyed by a hash of the source, the compiler's own code and the
+flags that change its output, and evicted least recently used first once
+the cache grows past its size limit
+"""
+import json
+from glob import glob
+from hashlib import sha256
+from os import environ, makedirs, path, replace, scandir, unlink, utime
+from tempfile import NamedTemporaryFile
+
+CACHE_DIR = path.join(
+    environ.get('XDG_CACHE_HOME', path.expanduser('~/.cache')), 'mmcc')
+
+MAX_SIZE = 64 * 1024 * 1024
+
+_compiler_version = None
+
+
+def compiler_version():
+    """Hash of the compiler's sources, so any change invalidates the cache"""
+    global _compiler_version
+    if _compiler_version is None:
+        digest = sha256()
+        for module in sorted(glob(path.join(path.dirname(__file__), '*.py'))):
+            with open(module, 'rb') as f:
+                digest.update(f.read())
+        _compiler_version = digest.hexdigest()
+    return _compiler_version
+
+
+class Cache:
+
+    def __init__(self, cache_dir=CACHE_DIR, max_size=MAX_SIZE,
+                 store_tac=False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.store_tac = store_tac
+        self.hits = 0
+        self.misses = 0
+        makedirs(cache_dir, exist_ok=True)
+
+    def key(self, source, **flags) -> str:
+        digest = sha256(compiler_version().encode('utf-8'))
+        digest.update(json.dumps(flags, sort_keys=True).encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            # Mark as recently used
+            utime(entry_path)
+        except OSError:
+            # Another build evicted it since it was read
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        with NamedTemporaryFile('w', dir=self.cache_dir, suffix='.tmp',
+                                delete=False) as f:
+            json.dump(entry, f)
+        replace(f.name, self.entry_path(key))
+        self.evict()
+
+    def entries(self):
+        with scandir(self.cache_dir) as it:
+            return [e for e in it if e.name.endswith('.json')]
+
+    def evict(self):
+        entries = [(e.stat(), e.path) for e in self.entries()]
+        size = sum(stat.st_size for stat, _ in entries)
+        if size <= self.max_size:
+            return
+        for stat, entry_path in sorted(entries, key=lambda e: e[0].st_mtime):
+            try:
+                unlink(entry_path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+            if size <= self.max_size:
+                break
+
+    def stats(self) -> str:
+        entries = self.entries()
+        size = sum(e.stat().st_size for e in entries)
+        return (f'cache: {self.hits} hits, {self.misses} misses, '
+                f'{len(entries)} entries, {size / 1024:.1f} KiB '
+                f'in {self.cache_dir}')
@@ -0,0 +1,218 @@
+"""
+Basic blocks and control flow graphs over the TAC of each function
+
+Analyses run on a ControlFlowGraph are cached on it, a pass that edits the
+function's instructions calls invalidate so they are worked out again
+"""
+from itertools import chain
+from typing import Dict, Iterator, List
+
+from compiler.tac import (TacEndFunc, TacIfStatement, TacInstruction,
+                          TacLabel, TacReturn, TacStartFunc)
+
+
+class BasicBlock:
+
+    def __init__(self, index, instructions):
+        self.index = index
+        self.instructions = instructions  # type: List[TacInstruction]
+        self.successors = []  # type: List[BasicBlock]
+        self.predecessors = []  # type: List[BasicBlock]
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def __repr__(self):
+        return f'<BasicBlock(index={self.index}, size={len(self)})>'
+
+
+class ControlFlowGraph:
+
+    def __init__(self, function: List[TacInstruction]):
+        self.blocks = split_blocks(function)
+        self._analyses = {}  # type: dict
+
+    @property
+    def entry(self) -> BasicBlock:
+        return self.blocks[0]
+
+    def analysis(self, analysis):
+        """Runs analysis(cfg), or returns its result from the last run"""
+        try:
+            return self._analyses[analysis]
+        except KeyError:
+            result = self._analyses[analysis] = analysis(self)
+            return result
+
+    def invalidate(self):
+        self._analyses.clear()
+
+    def instructions(self) -> Iterator[TacInstruction]:
+        return chain.from_iterable(self.blocks)
+
+    def reverse_postorder(self) -> List[BasicBlock]:
+        """
+        The blocks reachable from the entry, each before its successors
+        except along back edges
+        """
+        order = []
+        visited = {self.entry}
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        return order[::-1]
+
+    def dominates(self, dominator: BasicBlock, block: BasicBlock) -> bool:
+        idom = self.analysis(immediate_dominators)
+        if block not in idom:
+            return False
+        while block is not dominator:
+            if block is self.entry:
+                return False
+            block = idom[block]
+        return True
+
+
+def split_functions(tac_list) -> Iterator[List[TacInstruction]]:
+    """Splits a TAC list into runs bounded by TacStartFunc/TacEndFunc"""
+    function = []  # type: List[TacInstruction]
+    for tac in tac_list:
+        if isinstance(tac, TacStartFunc) and function:
+            yield function
+            function = []
+        function.append(tac)
+        if isinstance(tac, TacEndFunc):
+            yield function
+            function = []
+    if function:
+        yield function
+
+
+def split_blocks(function: List[TacInstruction]) -> List[BasicBlock]:
+    """
+    Splits a function into basic blocks, a block starts at a label and ends
+    after a branch or return
+    """
+    blocks = []  # type: List[BasicBlock]
+    labels = {}
+    instructions = []  # type: List[TacInstruction]
+    for tac in function:
+        if isinstance(tac, TacLabel) and instructions:
+            blocks.append(BasicBlock(len(blocks), instructions))
+            instructions = []
+        if isinstance(tac, TacLabel):
+            labels[tac.label] = len(blocks)
+        instructions.append(tac)
+        if isinstance(tac, (TacIfStatement, TacReturn, TacEndFunc)):
+            blocks.append(BasicBlock(len(blocks), instructions))
+            instructions = []
+    if instructions or not blocks:
+        blocks.append(BasicBlock(len(blocks), instructions))
+
+    for block, following in zip(blocks, blocks[1:] + [None]):
+        last = block.instructions[-1] if block.instructions else None
+        # Returns leave the function, and a function's code never runs on
+        # into the next one
+        ends = isinstance(last, (TacReturn, TacEndFunc))
+        if following is not None and not ends:
+            block.successors.append(following)
+        if isinstance(last, TacIfStatement):
+            block.successors.append(blocks[labels[last.label]])
+        for successor in block.successors:
+            successor.predecessors.append(block)
+    return blocks
+
+
+def build_cfgs(tac_list) -> List[ControlFlowGraph]:
+    return [ControlFlowGraph(function)
+            for function in split_functions(tac_list)]
+
+
+def live_variables(cfg: ControlFlowGraph) -> Dict[BasicBlock, set]:
+    """
+    Backward liveness analysis, returns the set of variables live on exit
+    from each block
+    """
+    uses, defines = {}, {}
+    for block in cfg.blocks:
+        used, defined = set(), set()
+        for tac in reversed(block.instructions):
+            dest = tac.defines
+            if dest is not None:
+                used.discard(dest)
+                defined.add(dest)
+            used.update(tac.uses)
+        uses[block], defines[block] = used, defined
+
+    live_in = {block: set(uses[block]) for block in cfg.blocks}
+    live_out = {block: set() for block in cfg.blocks}
+    worklist = list(cfg.blocks)
+    pending = set(worklist)
+    while worklist:
+        block = worklist.pop()
+        pending.discard(block)
+        live = set()
+        for successor in block.successors:
+            live |= live_in[successor]
+        live_out[block] = live
+        live = uses[block] | (live - defines[block])
+        if live != live_in[block]:
+            live_in[block] = live
+            for predecessor in block.predecessors:
+                if predecessor not in pending:
+                    pending.add(predecessor)
+                    worklist.append(predecessor)
+    return live_out
+
+
+def immediate_dominators(
+        cfg: ControlFlowGraph) -> Dict[BasicBlock, BasicBlock]:
+    """
+    Maps each reachable block to its immediate dominator, the entry maps to
+    itself (Cooper, Harvey and Kennedy's iterative algorithm)
+    """
+    order = cfg.reverse_postorder()
+    position = {block: index for index, block in enumerate(order)}
+    idom = {cfg.entry: cfg.entry}
+
+    def intersect(lhs, rhs):
+        while lhs is not rhs:
+            while position[lhs] > position[rhs]:
+                lhs = idom[lhs]
+            while position[rhs] > position[lhs]:
+                rhs = idom[rhs]
+        return lhs
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            processed = [pred for pred in block.predecessors if pred in idom]
+            dominator = processed[0]
+            for pred in processed[1:]:
+                dominator = intersect(pred, dominator)
+            if idom.get(block) is not dominator:
+                idom[block] = dominator
+                changed = True
+    return idom
+
+
+def dominator_tree(
+        cfg: ControlFlowGraph) -> Dict[BasicBlock, List[BasicBlock]]:
+    """Maps each reachable block to the blocks it immediately dominates"""
+    idom = cfg.analysis(immediate_dominators)
+    children = {block: [] for block in idom}  # type: dict
+    for block in cfg.reverse_postorder()[1:]:
+        children[idom[block]].append(block)
+    return children
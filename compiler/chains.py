@@ -0,0 +1,201 @@
+"""
+Def-use and use-def chains over the TAC of one function
+
+A read of a variable is linked to the definitions (instructions writing
+it) that can reach the read, and each definition to the reads it reaches.
+The chains are built once, from reaching definitions over the blocks of a
+ControlFlowGraph, and kept current by passes that rewrite operands through
+replace/update and delete instructions through remove.
+
+Removed instructions stay in their blocks, so positions are stable, until
+compact is called, after which the chains should be rebuilt
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from compiler.cfg import BasicBlock, ControlFlowGraph
+from compiler.tac import TacInstruction
+from compiler.token import Token
+
+Use = Tuple[int, str]
+
+
+def is_variable(tok) -> bool:
+    return tok is not None and not tok.is_constant
+
+
+class DefUseChains:
+
+    def __init__(self, graph: ControlFlowGraph):
+        self.graph = graph
+        self.instructions = {}  # type: Dict[int, TacInstruction]
+        self.position = {}  # type: Dict[int, Tuple[BasicBlock, int]]
+        self.writes = defaultdict(list)  # type: defaultdict
+        self.removed = set()  # type: Set[int]
+        # (instruction, field) -> definitions, definition -> uses
+        self.ud = {}  # type: Dict[Use, Set[int]]
+        self.du = defaultdict(set)  # type: defaultdict
+        self.linked = {}  # type: Dict[int, List[str]]
+        self.acyclic = True
+
+        last_writes = {}
+        dests = {}
+        for block in graph.blocks:
+            last = last_writes[block] = {}
+            for offset, tac in enumerate(block.instructions):
+                key = id(tac)
+                self.instructions[key] = tac
+                self.position[key] = (block, offset)
+                dest = dests[key] = tac.defines
+                if is_variable(dest):
+                    self.writes[dest, block].append(offset)
+                    last[dest] = frozenset([key])
+
+        self.entry_definitions = self.reaching_definitions(last_writes)
+
+        # Link every read in one sweep per block, tracking the definition
+        # of each variable written so far in the block
+        for block in graph.blocks:
+            entry = self.entry_definitions[block]
+            current = {}  # type: dict
+            for tac in block.instructions:
+                key = id(tac)
+                fields = self.linked[key] = list(tac.reads)
+                for field in fields:
+                    var = getattr(tac, field)
+                    if var in current:
+                        definitions = {current[var]}
+                    else:
+                        definitions = set(entry.get(var, ()))
+                    self.ud[key, field] = definitions
+                    for definition in definitions:
+                        self.du[definition].add((key, field))
+                dest = dests[key]
+                if is_variable(dest):
+                    current[dest] = key
+
+    def reaching_definitions(self, last_writes) -> Dict[BasicBlock, dict]:
+        """
+        Forward analysis, maps each block to the definitions of each
+        variable that reach its start
+        """
+        order = self.graph.reverse_postorder()
+        rank = {block: index for index, block in enumerate(order)}
+        for block in order:
+            for successor in block.successors:
+                if rank[successor] <= rank[block]:
+                    self.acyclic = False
+
+        entry = {block: {} for block in self.graph.blocks}  # type: dict
+        worklist = order[::-1]
+        pending = set(worklist)
+        while worklist:
+            block = worklist.pop()
+            pending.discard(block)
+            exit_definitions = dict(entry[block])
+            exit_definitions.update(last_writes[block])
+            for successor in block.successors:
+                definitions = entry[successor]
+                grown = False
+                for var, defs in exit_definitions.items():
+                    known = definitions.get(var, frozenset())
+                    if not defs <= known:
+                        definitions[var] = known | defs
+                        grown = True
+                if grown and successor not in pending:
+                    pending.add(successor)
+                    worklist.append(successor)
+        return entry
+
+    def reaching(self, var: Token, tac: TacInstruction) -> Set[int]:
+        """The definitions of var that reach the point just before tac"""
+        if not is_variable(var):
+            return set()
+        block, offset = self.position[id(tac)]
+        writes = self.writes.get((var, block), [])
+        index = bisect_left(writes, offset)
+        if index:
+            definitions = {id(block.instructions[writes[index - 1]])}
+        else:
+            definitions = set(self.entry_definitions[block].get(var, ()))
+        # A removed definition stands for the ones that reached it
+        for key in [key for key in definitions if key in self.removed]:
+            definitions.discard(key)
+            definitions |= self.reaching(var, self.instructions[key])
+        return definitions
+
+    def link(self, tac: TacInstruction):
+        fields = self.linked[id(tac)] = list(tac.reads)
+        for field in fields:
+            definitions = self.reaching(getattr(tac, field), tac)
+            self.ud[id(tac), field] = definitions
+            for key in definitions:
+                self.du[key].add((id(tac), field))
+
+    def unlink(self, tac: TacInstruction) -> List[TacInstruction]:
+        """Drops the reads of tac, returns the definitions they reached"""
+        definitions = []
+        for field in self.linked.pop(id(tac), ()):
+            for key in self.ud.pop((id(tac), field)):
+                self.du[key].discard((id(tac), field))
+                definitions.append(self.instructions[key])
+        return definitions
+
+    def definitions(self, tac: TacInstruction,
+                    field: str) -> List[TacInstruction]:
+        """The definitions reaching the read of field in tac"""
+        return [self.instructions[key] for key in self.ud[id(tac), field]]
+
+    def uses(self, tac: TacInstruction) -> List[Tuple[TacInstruction, str]]:
+        """The reads the value written by tac reaches"""
+        return [(self.instructions[key], field)
+                for key, field in self.du.get(id(tac), ())]
+
+    def update(self, tac: TacInstruction):
+        """Relinks the reads of tac after its operands were rewritten"""
+        self.unlink(tac)
+        self.link(tac)
+
+    def replace(self, tac: TacInstruction, field: str, value: Token):
+        setattr(tac, field, value)
+        self.update(tac)
+
+    def remove(self, tac: TacInstruction) -> List[TacInstruction]:
+        """
+        Deletes an instruction nothing reads from, returns the definitions
+        that lost a use
+        """
+        self.removed.add(id(tac))
+        return self.unlink(tac)
+
+    def is_dead(self, tac: TacInstruction) -> bool:
+        return (tac.is_pure and id(tac) not in self.removed
+                and not self.du.get(id(tac)))
+
+    def constant(self, tac: TacInstruction, field: str) -> Optional[Token]:
+        """
+        The constant read by field in tac, when it is one or every
+        definition reaching it copies the same constant
+        """
+        value = getattr(tac, field)
+        if not is_variable(value):
+            return value
+        constants = set()
+        definitions = self.definitions(tac, field)
+        for definition in definitions:
+            if not definition.is_copy or is_variable(definition.rhs):
+                return None
+            constants.add(definition.rhs)
+        if len(constants) == 1:
+            return constants.pop()
+        return None
+
+    def compact(self):
+        """Drops removed instructions from their blocks"""
+        if not self.removed:
+            return
+        for block in self.graph.blocks:
+            block.instructions = [tac for tac in block.instructions
+                                  if id(tac) not in self.removed]
+        self.graph.invalidate()
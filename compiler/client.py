@@ -0,0 +1,69 @@
+"""
+Thin client for a running `mmcc --serve`
+
+Only imports the standard library so that compiling through the server
+doesn't pay for loading the compiler pipeline
+"""
+import argparse
+import json
+import socket
+import stat
+import sys
+from os import chmod, getuid, path
+from tempfile import gettempdir
+
+SOCKET_PATH = path.join(gettempdir(), f'mmcc-{getuid()}.sock')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compiles a script on a running mmcc server.')
+    parser.add_argument('file', type=argparse.FileType('r'))
+    parser.add_argument('-o', '--out', default="prog.out")
+    parser.add_argument('--optimize', action='store_true')
+    parser.add_argument('--ssa', action='store_true')
+    parser.add_argument('--allocator', choices=['coloring', 'linear'],
+                        default='linear')
+    parser.add_argument('--target', choices=['mips', 'x86-64'],
+                        default='mips')
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    return parser.parse_args()
+
+
+def write_program(program, out):
+    with open(out, 'w') as f:
+        f.write(program)
+
+    # Make the script executable
+    chmod(out, stat.S_IRWXU)
+
+
+def request(sock_path, message):
+    """Sends a single JSON request to the server and returns its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(sock_path)
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+def main():
+    args = parse_args()
+    reply = request(args.socket, {
+        'name': args.file.name,
+        'source': args.file.read(),
+        'optimize': args.optimize,
+        'ssa': args.ssa,
+        'allocator': args.allocator,
+        'target': args.target,
+        # The server assembles x86-64 executables itself
+        'out': path.abspath(args.out),
+    })
+    if not reply['ok']:
+        sys.exit(reply['error'])
+    if 'program' in reply:
+        write_program(reply['program'], args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,65 +1,283 @@
 import argparse
-import stat
 import sys
+from collections import Counter, deque
+from compiler.cache import CACHE_DIR, Cache
+from compiler.client import SOCKET_PATH, write_program
+from compiler.frontend import parse_source
+from compiler.interpreter import Interpreter, TacError
 from compiler.mips import build_mips
 from compiler.optimize import optimize_tac
-from compiler.parse import parse_ast
+from compiler.peephole import DEFAULT_RULES
+from compiler.parse import format_ast, parse, split_indent
+from compiler.regalloc import ALLOCATORS
 from compiler.tac import build_tac
-from compiler.utils import draw_graph, line_count
-from os import chmod
+from compiler.utils import draw_graph
+from compiler.x86 import assemble, build_x86
+from os import path
+from shlex import quote
 from shutil import get_terminal_size
-from subprocess import PIPE, STDOUT, run
+from subprocess import PIPE, STDOUT, Popen
+from threading import Thread
+from time import perf_counter
+
+CHUNK_SIZE = 1 << 16
+
+# The repository, which programs put on PYTHONPATH to find the emulator
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Each target's backend, lowering a TAC list to its assembly
+TARGETS = {'mips': build_mips, 'x86-64': build_x86}
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Interprets a script.')
-    parser.add_argument('file', type=argparse.FileType('r'))
+    parser.add_argument('file', type=argparse.FileType('r'), nargs='?')
     parser.add_argument('-o', '--out', default="prog.out")
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--graph', action='store_true')
     parser.add_argument('--ast', action='store_true')
     parser.add_argument('--optimize', action='store_true')
+    parser.add_argument('--ssa', action='store_true',
+                        help='also propagate constants in SSA form, '
+                             'implies --optimize')
+    parser.add_argument('--optimize-stats', action='store_true',
+                        help='print how many instructions each '
+                             'optimization eliminated, and how often each '
+                             'peephole rule fired, implies --optimize')
+    parser.add_argument('--rules', type=argparse.FileType('r'),
+                        help='python file defining RULES, a list of '
+                             'peephole Rules to add to the defaults')
+    parser.add_argument('--allocator', choices=sorted(ALLOCATORS),
+                        default='linear',
+                        help='assign registers by linear scan or by '
+                             'coloring the interference graph')
+    parser.add_argument('--target', choices=sorted(TARGETS), default='mips',
+                        help='write a MIPS program run in the emulator, or '
+                             'a native x86-64 executable assembled with gcc')
     parser.add_argument('--tac-only', action='store_true')
+    parser.add_argument('--run-tac', action='store_true',
+                        help='run the TAC directly instead of writing a '
+                             'program, printing how many instructions ran')
+    parser.add_argument('--mycc', action='store_true',
+                        help='parse with the ./mycc binary')
+    parser.add_argument('--serve', action='store_true',
+                        help='run a compile server on a unix socket')
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('--watch', action='store_true',
+                        help='recompile changed functions on every save')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--cache-tac', action='store_true',
+                        help='also cache the intermediate TAC')
+    parser.add_argument('--cache-stats', action='store_true')
     args = parser.parse_args()
+    if not args.file and not args.serve:
+        parser.error('the following arguments are required: file')
+    if args.cache_stats and not uses_cache(args):
+        parser.error('--cache-stats only applies to builds through the '
+                     'cache')
+    if args.optimize_stats:
+        if args.serve or args.watch:
+            parser.error('--optimize-stats only applies to a single build')
+        args.optimize = True
     return args
 
 
-def make_ast(f):
+def inspecting(args) -> bool:
+    """Whether the build prints or runs its stages rather than caching"""
+    return bool(args.ast or args.graph or args.debug or args.tac_only or
+                args.optimize_stats or args.rules or args.run_tac)
+
+
+def uses_cache(args) -> bool:
+    return not (args.no_cache or args.mycc or args.serve or args.watch or
+                inspecting(args))
+
+
+def load_rules(f):
+    """The default peephole rules plus the RULES defined by a python file"""
+    namespace = {}  # type: dict
+    exec(compile(f.read(), f.name, 'exec'), namespace)
+    if 'RULES' not in namespace:
+        sys.exit(f"Error: '{f.name}' doesn't define RULES")
+    return DEFAULT_RULES + namespace['RULES']
 
-    cmd = f"./mycc < {f.name}"
 
-    out = run(cmd, shell=True, check=True, stdout=PIPE, stderr=STDOUT)
+def run_tac(tac_list):
+    """
+    Runs the TAC in the interpreter, then prints how many instructions ran
+    to stderr, in total, in each function and of each kind
+    """
+    interpreter = Interpreter(tac_list)
+    start = perf_counter()
+    try:
+        sys.stdout.write(interpreter.run())
+    except TacError as error:
+        sys.exit(f'Error: {error}')
+    elapsed = perf_counter() - start
+    sys.stdout.flush()
+    print(f'executed {interpreter.executed} instructions in '
+          f'{elapsed * 1000:.2f}ms', file=sys.stderr)
+    for counts in [interpreter.function_counts(),
+                   interpreter.instruction_counts()]:
+        for name, times in counts.most_common():
+            print(f'  {name}: {times}', file=sys.stderr)
 
-    output = out.stdout.decode('utf-8')
-    outlines = output.splitlines()
 
-    if outlines[-1] == 'syntax error':
-        # Exit if syntax error encountered
-        sys.stdout.write(output)
+def feed_source(f, stdin, echo):
+    """
+    Copies the source file into mycc's stdin, recording how many lines it
+    will echo back before printing the AST
+    """
+    lines, partial = 0, ''
+    try:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            lines += chunk.count('\n')
+            partial = (partial + chunk).rpartition('\n')[2]
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # mycc stops reading at the first syntax error
+        pass
+    finally:
+        # Only known once all the input is written, mycc can't print the
+        # AST before it sees the end of its input
+        echo['lines'], echo['partial'] = lines, partial
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def stream_ast(f):
+    """
+    Yields (indent, lexeme) pairs from ./mycc as it prints the AST, without
+    waiting for it to finish or buffering its output
+    """
+    proc = Popen('./mycc', stdin=PIPE, stdout=PIPE, stderr=STDOUT, text=True)
+    echo = {}  # type: dict
+    feeder = Thread(target=feed_source, args=(f, proc.stdin, echo))
+    feeder.start()
+
+    # The last few echoed lines show where a syntax error occurred
+    output = deque(maxlen=3)
+
+    for lineno, line in enumerate(proc.stdout):
+        line = line.rstrip('\n')
+        output.append(line)
+        if 'lines' not in echo or lineno < echo['lines']:
+            continue
+        if line.strip() == 'syntax error':
+            break
+        if lineno == echo['lines'] and echo['partial']:
+            # Source without a trailing newline runs into the AST root
+            if line.startswith(echo['partial']):
+                line = line[len(echo['partial']):]
+        yield split_indent(line)
+
+    proc.stdout.close()
+    proc.wait()
+    feeder.join()
+
+    if output and output[-1].strip() == 'syntax error':
+        sys.stdout.write('\n'.join(output) + '\n')
         sys.exit(1)
 
-    ast = outlines[line_count(f):]
 
-    return ast
+def compile_source(source, optimize=False, cache=None, ssa=False,
+                   allocator='linear', target='mips'):
+    """
+    Compiles C-- source to a list of instructions for target, MIPS by
+    default, a cache hit skips the whole pipeline
+    """
+    if cache:
+        key = cache.key(source, optimize=bool(optimize), ssa=bool(ssa),
+                        allocator=allocator, target=target)
+        entry = cache.get(key)
+        if entry:
+            return entry[target]
+
+    tac_list = build_tac(parse_source(source), dag=bool(optimize or ssa))
+    if optimize or ssa:
+        tac_list = optimize_tac(tac_list, ssa=ssa)
+    instructions = TARGETS[target](tac_list, allocator)
+
+    if cache:
+        entry = {target: instructions}
+        if cache.store_tac:
+            entry['tac'] = [str(instruction) for instruction in tac_list]
+        cache.put(key, entry)
+
+    return instructions
+
+
+def make_program(mips):
+    """
+    Builds the text of an executable script from mips instructions, which
+    runs the emulator from this repository whatever the working directory
+    """
+    with open(path.join(ROOT, 'templates', 'header.sh')) as f:
+        header = f.read().replace('@ROOT@', quote(ROOT))
+    return header + ''.join(line + '\n' for line in mips)
+
+
+def write_output(instructions, target, out):
+    """Writes out a MIPS script, or assembles an x86-64 executable"""
+    if target == 'x86-64':
+        assemble(instructions, out)
+    else:
+        write_program(make_program(instructions), out)
 
 
 def main():
 
+    if sys.argv[1:2] == ['build']:
+        from compiler.batch import main as build_main
+        build_main(sys.argv[2:])
+        return
+
     args = parse_args()
 
-    ast = make_ast(args.file)
+    if args.serve:
+        from compiler.server import serve
+        cache = None if args.no_cache else Cache(args.cache_dir,
+                                                 store_tac=args.cache_tac)
+        serve(args.socket, cache)
+        return
+
+    if args.watch:
+        from compiler.incremental import watch
+        rules = load_rules(args.rules) if args.rules else None
+        watch(args.file.name, args.out, args.optimize, args.ssa,
+              args.allocator, args.target, rules)
+        return
+
+    if uses_cache(args):
+        cache = Cache(args.cache_dir, store_tac=args.cache_tac)
+        instructions = compile_source(args.file.read(), args.optimize,
+                                      cache, args.ssa, args.allocator,
+                                      args.target)
+        if args.cache_stats:
+            print(cache.stats())
+        write_output(instructions, args.target, args.out)
+        return
+
+    if args.mycc:
+        head = parse(stream_ast(args.file))
+    else:
+        head = parse_source(args.file.read())
 
     if args.ast:
-        for line in ast:
+        for line in format_ast(head):
             print(line)
         print("─" * get_terminal_size().columns)
 
-    head = parse_ast(ast)
-
     if args.graph:
         draw_graph(head)
 
-    tac_list = build_tac(head)
+    rules = load_rules(args.rules) if args.rules else DEFAULT_RULES
+    fired = Counter()  # type: Counter
+    tac_list = build_tac(head, dag=args.optimize or args.ssa, rules=rules,
+                         fired=fired)
 
     if args.debug:
         print("─" * get_terminal_size().columns)
@@ -68,39 +286,40 @@ def main():
         for instruction in tac_list:
             print(instruction)
 
-    if args.optimize:
-        tac_list = optimize_tac(tac_list, args.debug)
+    if args.optimize or args.ssa:
+        stats = Counter()  # type: Counter
+        tac_list = optimize_tac(tac_list, args.debug, args.ssa, stats, rules,
+                                fired)
+        if args.optimize_stats:
+            stats.update({f'rule {name}': times
+                          for name, times in fired.items()})
+            for name, times in sorted(stats.items()):
+                print(f'{name}: {times}')
+
+    if args.run_tac:
+        run_tac(tac_list)
+        return
 
     if args.tac_only:
         sys.exit()
 
     if args.debug:
         print("─" * get_terminal_size().columns)
-        print("MIPS")
+        print(args.target.upper())
         print("─" * get_terminal_size().columns)
 
-    mips = build_mips(tac_list)
+    instructions = TARGETS[args.target](tac_list, args.allocator)
 
-    leftcol = len(str(len(mips)))
+    leftcol = len(str(len(instructions)))
 
     if args.debug:
-        for lineno, instruction in enumerate(mips, 1):
+        for lineno, instruction in enumerate(instructions, 1):
             if ":" in instruction:
                 print(str(lineno).ljust(leftcol), "│", instruction)
             else:
                 print(str(lineno).ljust(leftcol), "│",  "\t", instruction)
 
-    # Builds an executable file from mips instructions
-    with open('templates/header.sh') as f:
-        header = f.readlines()
-
-    with open(args.out, 'w') as f:
-        f.writelines(header)
-        for line in mips:
-            f.write(line + "\n")
-
-    # Make the script executable
-    chmod(args.out, stat.S_IRWXU)
+    write_output(instructions, args.target, args.out)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,375 @@
+"""
+Runs the subset of MIPS that build_mips emits in-process, in place of spim
+
+Each instruction is decoded once, before the program runs, into a closure
+over the register file that carries out the instruction and returns the
+index of the next one, so running a program is a loop of calls through a
+table of them. Registers hold signed 32 bit words, and code addresses are
+instruction indexes. The emulator counts how many times each instruction
+is executed, giving the number executed in total and under each label.
+
+    python -m compiler.emulator prog.out
+"""
+import argparse
+import re
+import sys
+from collections import Counter
+from typing import Callable, Dict, List
+
+REGISTER_NAMES = [
+    '$zero', '$at', '$v0', '$v1', '$a0', '$a1', '$a2', '$a3',
+    *(f'$t{n}' for n in range(8)), *(f'$s{n}' for n in range(8)),
+    '$t8', '$t9', '$k0', '$k1', '$gp', '$sp', '$fp', '$ra',
+]
+REGISTERS = {name: index for index, name in enumerate(REGISTER_NAMES)}
+REGISTERS.update({f'${index}': index for index in range(32)})
+REGISTERS['$0'] = 0
+
+ZERO, V0, A0, SP, FP, RA = (REGISTERS[name] for name in
+                            ('$zero', '$v0', '$a0', '$sp', '$fp', '$ra'))
+# Where mult leaves the high and low words of its product, after the
+# general registers
+HI, LO = len(REGISTER_NAMES), len(REGISTER_NAMES) + 1
+
+STACK_TOP = 0x7ffffffc
+HEAP_START = 0x10040000
+
+memory_regex = re.compile(r'(-?\w*)\((\$\w+)\)')
+
+
+class MipsError(Exception):
+    pass
+
+
+def word(value) -> int:
+    """value wrapped to a signed 32 bit word"""
+    return ((value + 0x80000000) & 0xffffffff) - 0x80000000
+
+
+def divide(lhs, rhs) -> int:
+    """Division truncating towards zero, like div"""
+    if rhs == 0:
+        raise MipsError('division by zero')
+    quotient = abs(lhs) // abs(rhs)
+    return word(quotient if (lhs < 0) == (rhs < 0) else -quotient)
+
+
+def remainder(lhs, rhs) -> int:
+    """The remainder taking the sign of lhs, like rem"""
+    return word(lhs - divide(lhs, rhs) * rhs)
+
+
+# Operations on two words, the register and immediate forms
+BINARY = {
+    'add': lambda a, b: a + b,
+    'addu': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'subu': lambda a, b: a - b,
+    'mul': lambda a, b: a * b,
+    'div': divide,
+    'rem': remainder,
+    'and': lambda a, b: a & b,
+    'or': lambda a, b: a | b,
+    'xor': lambda a, b: a ^ b,
+    'nor': lambda a, b: ~(a | b),
+    'slt': lambda a, b: int(a < b),
+    'sltu': lambda a, b: int(a & 0xffffffff < b & 0xffffffff),
+    'seq': lambda a, b: int(a == b),
+    'sne': lambda a, b: int(a != b),
+    'sgt': lambda a, b: int(a > b),
+    'sge': lambda a, b: int(a >= b),
+    'sle': lambda a, b: int(a <= b),
+    'sll': lambda a, b: a << (b & 31),
+    'srl': lambda a, b: (a & 0xffffffff) >> (b & 31),
+    'sra': lambda a, b: a >> (b & 31),
+    'sllv': lambda a, b: a << (b & 31),
+    'srlv': lambda a, b: (a & 0xffffffff) >> (b & 31),
+    'srav': lambda a, b: a >> (b & 31),
+}
+IMMEDIATE = {
+    'addi': 'add', 'addiu': 'addu', 'andi': 'and', 'ori': 'or',
+    'xori': 'xor', 'slti': 'slt', 'sltiu': 'sltu',
+}
+# Branches comparing a register with zero, and with another register
+BRANCH_ZERO = {
+    'beqz': lambda a: a == 0, 'bnez': lambda a: a != 0,
+    'bltz': lambda a: a < 0, 'bgez': lambda a: a >= 0,
+    'blez': lambda a: a <= 0, 'bgtz': lambda a: a > 0,
+}
+BRANCH = {
+    'beq': lambda a, b: a == b, 'bne': lambda a, b: a != b,
+    'blt': lambda a, b: a < b, 'bge': lambda a, b: a >= b,
+    'ble': lambda a, b: a <= b, 'bgt': lambda a, b: a > b,
+}
+
+
+def strip_header(lines: List[str]) -> List[str]:
+    """The MIPS of a program written by make_program, without its header"""
+    if lines and lines[0].startswith('#!'):
+        for index, line in enumerate(lines):
+            if line.startswith('exec '):
+                return lines[index + 1:]
+    return lines
+
+
+class Emulator:
+
+    def __init__(self, lines: List[str], stdout=None):
+        self.stdout = stdout
+        self.output = []  # type: List[str]
+        self.registers = [0] * (len(REGISTER_NAMES) + 2)
+        self.memory = {}  # type: Dict[int, int]
+        self.heap = HEAP_START
+        self.halted = False
+
+        # Labels -> the index of the instruction they are on
+        self.labels = {}  # type: Dict[str, int]
+        decoded = []
+        for lineno, line in enumerate(lines, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.endswith(':'):
+                self.labels[line[:-1]] = len(decoded)
+                continue
+            op, _, operands = line.partition(' ')
+            operands = [operand.strip() for operand in operands.split(',')
+                        if operand.strip()]
+            decoded.append((lineno, op, operands))
+        self.code = [self.decode(index, *instruction)
+                     for index, instruction in enumerate(decoded)]
+        self.counts = [0] * len(self.code)
+
+    def register(self, name) -> int:
+        if name not in REGISTERS:
+            raise MipsError(f"unknown register '{name}'")
+        return REGISTERS[name]
+
+    def label(self, name) -> int:
+        if name not in self.labels:
+            raise MipsError(f"undefined label '{name}'")
+        return self.labels[name]
+
+    def decode(self, index, lineno, op, operands) -> Callable[[], int]:
+        """A closure carrying out the instruction, returning the next"""
+        try:
+            return self.decode_operands(index, op, operands)
+        except (ValueError, IndexError):
+            raise MipsError(f"line {lineno}: can't decode "
+                            f"'{op} {', '.join(operands)}'")
+        except MipsError as error:
+            raise MipsError(f'line {lineno}: {error}')
+
+    def decode_operands(self, index, op, operands) -> Callable[[], int]:
+        r = self.registers
+        memory = self.memory
+        after = index + 1
+
+        def value(operand):
+            """An operand's register, or its constant"""
+            if operand.startswith('$'):
+                return self.register(operand), None
+            return None, int(operand, 0)
+
+        def address(operand):
+            offset, base = memory_regex.fullmatch(operand).groups()
+            return int(offset or '0', 0), self.register(base)
+
+        if op == 'nop':
+            return lambda: after
+        if op == 'syscall':
+            return lambda: self.syscall(after)
+        if op in ('j', 'b'):
+            target = self.label(operands[0])
+            return lambda: target
+        if op == 'jal':
+            target = self.label(operands[0])
+
+            def jal():
+                r[RA] = after
+                return target
+            return jal
+        if op == 'jr':
+            source = self.register(operands[0])
+            return lambda: r[source]
+        if op in BRANCH_ZERO:
+            test, source = BRANCH_ZERO[op], self.register(operands[0])
+            target = self.label(operands[1])
+            return lambda: target if test(r[source]) else after
+        if op in BRANCH:
+            test, source = BRANCH[op], self.register(operands[0])
+            other, constant = value(operands[1])
+            target = self.label(operands[2])
+            if other is None:
+                return lambda: target if test(r[source], constant) else after
+            return lambda: target if test(r[source], r[other]) else after
+        if op == 'mult':
+            lhs, rhs = map(self.register, operands)
+
+            def mult():
+                product = r[lhs] * r[rhs]
+                r[HI], r[LO] = word(product >> 32), word(product)
+                return after
+            return mult
+        if op == 'sw':
+            source = self.register(operands[0])
+            offset, base = address(operands[1])
+
+            def sw():
+                location = r[base] + offset
+                if location & 3:
+                    raise MipsError(f'unaligned address {location:#x}')
+                memory[location] = r[source]
+                return after
+            return sw
+
+        # The rest write a register, writes to $zero are dropped
+        dest = self.register(operands[0])
+        if dest == ZERO:
+            return lambda: after
+        if op == 'lw':
+            offset, base = address(operands[1])
+
+            def lw():
+                location = r[base] + offset
+                if location & 3:
+                    raise MipsError(f'unaligned address {location:#x}')
+                r[dest] = memory.get(location, 0)
+                return after
+            return lw
+        if op == 'li':
+            constant = word(int(operands[1], 0))
+
+            def li():
+                r[dest] = constant
+                return after
+            return li
+        if op in ('mfhi', 'mflo'):
+            source = HI if op == 'mfhi' else LO
+
+            def move_from():
+                r[dest] = r[source]
+                return after
+            return move_from
+        if op == 'move':
+            source = self.register(operands[1])
+
+            def move():
+                r[dest] = r[source]
+                return after
+            return move
+        if op == 'neg':
+            source = self.register(operands[1])
+
+            def neg():
+                r[dest] = word(-r[source])
+                return after
+            return neg
+        if op in BINARY or op in IMMEDIATE:
+            function = BINARY[IMMEDIATE.get(op, op)]
+            lhs = self.register(operands[1])
+            rhs, constant = value(operands[2])
+            if rhs is None:
+                def immediate():
+                    r[dest] = word(function(r[lhs], constant))
+                    return after
+                return immediate
+
+            def binary():
+                r[dest] = word(function(r[lhs], r[rhs]))
+                return after
+            return binary
+        raise MipsError(f"unsupported instruction '{op}'")
+
+    def syscall(self, after) -> int:
+        r = self.registers
+        service = r[V0]
+        if service == 1:
+            self.write(str(r[A0]))
+        elif service == 11:
+            self.write(chr(r[A0] & 0xff))
+        elif service == 9:
+            # sbrk, memory is never given back
+            r[V0] = self.heap
+            self.heap += (r[A0] + 3) & ~3
+        elif service == 10:
+            self.halted = True
+            return len(self.code)
+        else:
+            raise MipsError(f'unsupported syscall {service}')
+        return after
+
+    def write(self, text):
+        if self.stdout is None:
+            self.output.append(text)
+        else:
+            self.stdout.write(text)
+
+    def run(self, entry=0, max_steps=None) -> str:
+        """
+        Runs from the instruction at entry until the program exits or runs
+        off its end, returning what it printed when there is no stdout
+        """
+        r = self.registers
+        r[SP] = STACK_TOP
+        code, counts = self.code, self.counts
+        end = len(code)
+        pc = entry
+        if max_steps is None:
+            while 0 <= pc < end:
+                counts[pc] += 1
+                pc = code[pc]()
+        else:
+            steps = 0
+            while 0 <= pc < end:
+                steps += 1
+                if steps > max_steps:
+                    raise MipsError(f'gave up after {max_steps} steps')
+                counts[pc] += 1
+                pc = code[pc]()
+        if pc != end:
+            raise MipsError(f'jumped to {pc:#x}, outside the program')
+        return ''.join(self.output)
+
+    @property
+    def executed(self) -> int:
+        return sum(self.counts)
+
+    def label_counts(self) -> Counter:
+        """How many instructions were executed under each label"""
+        starts = sorted((index, name) for name, index in self.labels.items())
+        counts = Counter()  # type: Counter
+        for position, (start, name) in enumerate(starts):
+            end = (starts[position + 1][0] if position + 1 < len(starts)
+                   else len(self.counts))
+            counts[name] = sum(self.counts[start:end])
+        return counts
+
+
+def run(lines: List[str], max_steps=None) -> str:
+    """Runs MIPS instructions, returning what they print"""
+    return Emulator(lines).run(max_steps=max_steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a MIPS program.')
+    parser.add_argument('file', type=argparse.FileType('r'))
+    parser.add_argument('--stats', action='store_true',
+                        help='print the number of instructions executed, '
+                             'in total and under each label')
+    args = parser.parse_args()
+    lines = strip_header(args.file.read().splitlines())
+    try:
+        emulator = Emulator(lines, stdout=sys.stdout)
+        emulator.run()
+    except MipsError as error:
+        sys.exit(f'Error: {error}')
+    if args.stats:
+        sys.stdout.flush()
+        for name, count in emulator.label_counts().most_common():
+            print(f'{name}: {count}', file=sys.stderr)
+        print(f'executed: {emulator.executed}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
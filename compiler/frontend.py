@@ -0,0 +1,290 @@
+import sys
+from compiler.lexer import lex
+from compiler.node import Node
+from compiler.token import Token
+
+specifiers = {'int', 'void', 'function', 'extern', 'auto'}
+
+# Binary operators by precedence, all left associative
+precedence = {
+    '*': 4, '/': 4, '%': 4,
+    '+': 3, '-': 3,
+    '<': 2, '>': 2, '<=': 2, '>=': 2,
+    '==': 1, '!=': 1,
+}
+
+unary_operators = {'&', '*', '+', '-', '!'}
+
+
+def make_node(lexeme, lhs=None, rhs=None):
+    """
+    Builds a Node the way mycc prints it: a missing left child means the
+    right child is printed (and so parsed back) in its place
+    """
+    if lhs is None:
+        lhs, rhs = rhs, None
+    return Node(Token(lexeme), lhs, rhs)
+
+
+class Parser:
+    """
+    Recursive descent parser for the C-- grammar accepted by mycc, building
+    the same Node trees parse_ast reconstructs from its output.
+
+    Unlike mycc, which prints unary operators as '???', unary minus is
+    built as 0 - x, ! as x == 0 and unary plus as its operand, and the
+    pointer operators are rejected
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.lexemes = list(lex(source))
+        self.pos = 0
+
+    @property
+    def peek(self):
+        return self.lexemes[self.pos].kind
+
+    def advance(self):
+        lexeme = self.lexemes[self.pos]
+        self.pos += 1
+        return lexeme
+
+    def accept(self, kind):
+        if self.peek == kind:
+            return self.advance()
+        return None
+
+    def expect(self, kind):
+        if self.peek != kind:
+            self.syntax_error()
+        return self.advance()
+
+    def syntax_error(self, message='syntax error', pos=None):
+        offset = self.lexemes[self.pos if pos is None else pos].pos
+        start = self.source.rfind('\n', 0, offset) + 1
+        end = self.source.find('\n', offset)
+        line = self.source[start:end if end != -1 else None]
+        sys.exit(f'{line}\n{" " * (offset - start)}^\n{message}')
+
+    def translation_unit(self):
+        tree = self.external_declaration()
+        while self.peek != 'eof':
+            tree = make_node('~', tree, self.external_declaration())
+        return tree
+
+    def external_declaration(self):
+        if self.peek not in specifiers:
+            self.syntax_error()
+        return self.declaration()
+
+    def declaration_specifiers(self):
+        kind = self.advance().kind
+        # Storage class specifiers have no leaf in mycc's tree
+        spec = None if kind in {'extern', 'auto'} else make_node(kind)
+        if self.peek in specifiers:
+            return make_node('~', spec, self.declaration_specifiers())
+        return spec
+
+    def declaration(self):
+        spec = self.declaration_specifiers()
+        if self.accept(';'):
+            return spec
+        declarator = self.declarator()
+        if self.peek == '{':
+            return make_node('D', make_node('d', spec, declarator),
+                             self.compound_statement())
+        if self.peek in specifiers:
+            decls = self.declaration_list()
+            return make_node('D', make_node(
+                'd', spec, make_node('e', declarator, decls)),
+                self.compound_statement())
+        init = self.init_declarator(declarator)
+        while self.accept(','):
+            init = make_node(',', init,
+                             self.init_declarator(self.declarator()))
+        self.expect(';')
+        return make_node('~', spec, init)
+
+    def declaration_list(self):
+        decls = self.declaration()
+        while self.peek in specifiers:
+            decls = make_node(';', decls, self.declaration())
+        return decls
+
+    def init_declarator(self, declarator):
+        if self.accept('='):
+            return make_node('=', declarator, self.assignment_expression())
+        return declarator
+
+    def declarator(self):
+        if self.accept('('):
+            declarator = self.declarator()
+            self.expect(')')
+        else:
+            declarator = make_node(self.expect('id').text)
+        while self.accept('('):
+            if self.accept(')'):
+                declarator = make_node('F', declarator)
+                continue
+            if self.peek == 'id':
+                params = self.identifier_list()
+            else:
+                params = self.parameter_list()
+            self.expect(')')
+            declarator = make_node('F', declarator, params)
+        return declarator
+
+    def identifier_list(self):
+        ids = make_node(self.expect('id').text)
+        while self.accept(','):
+            ids = make_node(',', ids, make_node(self.expect('id').text))
+        return ids
+
+    def parameter_list(self):
+        params = self.parameter_declaration()
+        while self.accept(','):
+            params = make_node(',', params, self.parameter_declaration())
+        return params
+
+    def parameter_declaration(self):
+        if self.peek not in specifiers:
+            self.syntax_error()
+        spec = self.declaration_specifiers()
+        if self.peek == 'id' or (self.peek == '(' and
+                                 self.lexemes[self.pos + 1].kind == 'id'):
+            return make_node('~', spec, self.declarator())
+        if self.peek == '(':
+            return make_node('~', spec, self.abstract_declarator())
+        return spec
+
+    def abstract_declarator(self):
+        self.expect('(')
+        if self.accept(')'):
+            declarator = None
+        elif self.peek == '(':
+            declarator = self.abstract_declarator()
+            self.expect(')')
+        else:
+            declarator = self.parameter_list()
+            self.expect(')')
+        while self.accept('('):
+            if self.accept(')'):
+                declarator = make_node('apply', declarator)
+            else:
+                declarator = make_node('apply', declarator,
+                                       self.parameter_list())
+                self.expect(')')
+        return declarator
+
+    def compound_statement(self):
+        self.expect('{')
+        if self.accept('}'):
+            return None
+        decls = stmts = None
+        if self.peek in specifiers:
+            decls = self.declaration_list()
+        if self.peek != '}':
+            stmts = self.statement()
+            while self.peek != '}':
+                stmts = make_node(';', stmts, self.statement())
+        self.expect('}')
+        if decls and stmts:
+            return make_node(';', decls, stmts)
+        return decls or stmts
+
+    def statement(self):
+        kind = self.peek
+        if kind == '{':
+            return self.compound_statement()
+        elif kind == ';':
+            self.advance()
+            return None
+        elif kind in {'if', 'while'}:
+            self.advance()
+            self.expect('(')
+            cond = self.expression()
+            self.expect(')')
+            body = self.statement()
+            if kind == 'if' and self.accept('else'):
+                body = make_node('else', body, self.statement())
+            return make_node(kind, cond, body)
+        elif kind in {'continue', 'break'}:
+            self.advance()
+            self.expect(';')
+            return make_node(kind)
+        elif kind == 'return':
+            self.advance()
+            expr = self.expression()
+            self.expect(';')
+            return make_node('return', expr)
+        expr = self.expression()
+        self.expect(';')
+        return expr
+
+    def expression(self):
+        expr = self.assignment_expression()
+        while self.accept(','):
+            expr = make_node(',', expr, self.assignment_expression())
+        return expr
+
+    def assignment_expression(self):
+        lhs = self.unary_expression()
+        if self.accept('='):
+            return make_node('=', lhs, self.assignment_expression())
+        return self.binary_expression(lhs, 1)
+
+    def binary_expression(self, lhs, min_precedence):
+        """Precedence climbing over the left associative binary operators"""
+        while precedence.get(self.peek, 0) >= min_precedence:
+            op = self.advance().kind
+            rhs = self.unary_expression()
+            while precedence.get(self.peek, 0) > precedence[op]:
+                rhs = self.binary_expression(rhs, precedence[op] + 1)
+            lhs = make_node(op, lhs, rhs)
+        return lhs
+
+    def unary_expression(self):
+        if self.peek in unary_operators:
+            pos = self.pos
+            op = self.advance().kind
+            operand = self.unary_expression()
+            if op == '-':
+                return make_node('-', make_node('0'), operand)
+            if op == '!':
+                return make_node('==', operand, make_node('0'))
+            if op == '+':
+                return operand
+            self.syntax_error(f"Error: unary '{op}' isn't supported", pos)
+        return self.postfix_expression()
+
+    def postfix_expression(self):
+        expr = self.primary_expression()
+        while self.accept('('):
+            if self.accept(')'):
+                expr = make_node('apply', expr)
+                continue
+            args = self.assignment_expression()
+            while self.accept(','):
+                args = make_node(',', args, self.assignment_expression())
+            self.expect(')')
+            expr = make_node('apply', expr, args)
+        return expr
+
+    def primary_expression(self):
+        lexeme = self.advance()
+        if lexeme.kind == 'id' or lexeme.kind == 'string':
+            return make_node(lexeme.text)
+        elif lexeme.kind == 'constant':
+            return make_node(str(int(lexeme.text)))
+        elif lexeme.kind == '(':
+            expr = self.expression()
+            self.expect(')')
+            return expr
+        self.pos -= 1
+        self.syntax_error()
+
+
+def parse_source(source):
+    """Parses C-- source straight into a Node tree"""
+    return Parser(source).translation_unit()
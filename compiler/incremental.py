@@ -0,0 +1,175 @@
+"""
+Function granular recompilation
+
+Each function definition is lowered on its own, to TAC with its own
+temporaries and labels and then to MIPS or x86-64 with its own registers,
+so a unit only depends on its subtree and on which functions it can call.
+
+Source is split after every top level closing brace, so each chunk holds
+one function definition (with any declarations before it). Units are
+cached by a hash of their chunk's text, which fixes their subtree, and only
+reused while every function they call is still defined before them.
+Unchanged chunks are never parsed again.
+"""
+import re
+import sys
+from compiler import mips, x86
+from compiler.cache import compiler_version
+from compiler.compile import write_output
+from compiler.frontend import parse_source
+from compiler.lexer import lex
+from compiler.optimize import optimize_tac
+from compiler.peephole import DEFAULT_RULES
+from compiler.tac import TacEnv, recursive_build_tac
+from hashlib import sha256
+from os import path
+from time import perf_counter, sleep
+from typing import FrozenSet, Iterator, List, NamedTuple, Optional
+
+brace_regex = re.compile(r'/\*[\s\S]*?(?:\*/|\Z)|L?"(?:\\.|[^\\"])*"|[{}]')
+
+# The program prologue, epilogue and function builder for each target
+BACKENDS = {
+    'mips': (mips.ENTRY, mips.EXIT, mips.build_function_mips),
+    'x86-64': (x86.ENTRY, x86.EXIT, x86.build_function_x86),
+}
+
+
+class FunctionUnit(NamedTuple):
+    name: str
+    key: str
+    tac: list
+    instructions: List[str]
+    calls: FrozenSet[str]
+
+
+def split_source(source) -> Iterator[str]:
+    """Splits source text after every top level closing brace"""
+    depth = start = 0
+    for match in brace_regex.finditer(source):
+        text = match.group()
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                yield source[start:match.end()]
+                start = match.end()
+    rest = source[start:]
+    if next(lex(rest)).kind != 'eof':
+        yield rest
+
+
+def function_nodes(head):
+    """Yields the top level function definitions in source order"""
+    stack = [head]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.tok.lexeme == 'D':
+            yield node
+        else:
+            stack.extend((node.rhs, node.lhs))
+
+
+def function_name(node):
+    return node.lhs.rhs.lhs.tok.lexeme
+
+
+def build_unit(node, key, defined, optimize=False, ssa=False,
+               allocator='linear', target='mips',
+               rules=None) -> FunctionUnit:
+    name = function_name(node)
+    env = TacEnv(label_prefix=f'{name}.', functions=defined,
+                 dag=optimize or ssa, rules=rules)
+    recursive_build_tac(node, env)
+    tac_list = env.tac_list
+    if optimize or ssa:
+        tac_list = optimize_tac(tac_list, ssa=ssa,
+                                rules=rules or DEFAULT_RULES)
+    build_function = BACKENDS[target][2]
+    return FunctionUnit(name, key, tac_list,
+                        build_function(tac_list, allocator),
+                        frozenset(env.calls))
+
+
+class IncrementalBuild:
+
+    def __init__(self, optimize=False, ssa=False, allocator='linear',
+                 target='mips', rules=None):
+        self.optimize = optimize
+        self.ssa = ssa
+        self.allocator = allocator
+        self.target = target
+        self.rules = rules
+        self.units = {}  # type: dict
+        self.rebuilt = []  # type: List[str]
+        self.digest = sha256(compiler_version().encode('utf-8'))
+        self.digest.update(b'optimize' if optimize else b'')
+        self.digest.update(b'ssa' if ssa else b'')
+        self.digest.update(f'{allocator} {target}'.encode('utf-8'))
+
+    def chunk_key(self, chunk) -> str:
+        digest = self.digest.copy()
+        digest.update(chunk.encode('utf-8'))
+        return digest.hexdigest()
+
+    def build(self, source) -> List[str]:
+        """
+        Compiles a program, only rebuilding functions whose source changed
+        or that call a function which is no longer defined before them
+        """
+        units = []
+        defined = set()  # type: set
+        self.rebuilt = []
+        for chunk in split_source(source):
+            key = self.chunk_key(chunk)
+            unit = self.units.get(key)  # type: Optional[FunctionUnit]
+            if unit is not None:
+                defined.add(unit.name)
+            if unit is None or not unit.calls <= defined:
+                for node in function_nodes(parse_source(chunk)):
+                    defined.add(function_name(node))
+                    unit = build_unit(node, key, defined, self.optimize,
+                                      self.ssa, self.allocator, self.target,
+                                      self.rules)
+                    self.rebuilt.append(unit.name)
+            if unit is not None:
+                units.append(unit)
+        self.units = {unit.key: unit for unit in units}
+
+        entry, exit, _ = BACKENDS[self.target]
+        instructions = list(entry)
+        for unit in units:
+            instructions.extend(unit.instructions)
+        instructions.extend(exit)
+        return instructions
+
+
+def watch(src, out, optimize=False, ssa=False, allocator='linear',
+          target='mips', rules=None, interval=0.2):
+    """Recompiles src into out whenever it is saved"""
+    builder = IncrementalBuild(optimize, ssa, allocator, target, rules)
+    mtime = None
+    while True:
+        try:
+            current = path.getmtime(src)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current != mtime:
+            mtime = current
+            start = perf_counter()
+            try:
+                with open(src) as f:
+                    instructions = builder.build(f.read())
+                write_output(instructions, target, out)
+            except SystemExit as error:
+                print(error.code, file=sys.stderr)
+            else:
+                elapsed = perf_counter() - start
+                print(f'{src}: rebuilt {len(builder.rebuilt)}/'
+                      f'{len(builder.units)} functions in '
+                      f'{elapsed * 1000:.2f}ms '
+                      f'({", ".join(builder.rebuilt) or "no changes"})')
+        sleep(interval)
@@ -0,0 +1,254 @@
+"""
+Runs a TAC list directly, without lowering it to MIPS
+
+The program is compiled once before it runs: labels and function entry
+points are resolved to instruction indexes, each variable of a function
+gets a slot in its frame, and each instruction becomes a closure over its
+operands that carries it out on a frame and returns the index of the next
+instruction. Labels and parameters don't run, a call puts the arguments
+straight into the callee's parameter slots. Calls and returns switch
+frames in the interpreter's own loop, so deep recursion doesn't use up
+Python's stack.
+
+Each instruction counts how many times it runs, so optimization levels can
+be compared by how many instructions a program executes.
+"""
+from collections import Counter
+from itertools import chain
+from typing import Callable, Dict, List
+
+from compiler.cfg import split_functions
+from compiler.tac import (TacArg, TacAssingment, TacCall, TacEndFunc,
+                          TacIfStatement, TacInstruction, TacLabel,
+                          TacOperation, TacParam, TacParamCount, TacPrint,
+                          TacReturn, TacStartFunc, operators)
+
+# Instructions that only tell the compiler something
+DECLARATIONS = (TacLabel, TacParam, TacParamCount, TacStartFunc)
+# An instruction returns SWITCH when it changes the frame, the interpreter
+# then picks up the new frame and where to carry on from
+SWITCH = -1
+
+
+class TacError(Exception):
+    pass
+
+
+def wrap(value) -> int:
+    """value wrapped to 32 bits like the registers"""
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+class Function:
+    """Where a function starts, and the frame slots of its variables"""
+
+    def __init__(self, name, instructions: List[TacInstruction]):
+        self.name = name
+        self.instructions = instructions
+        self.entry = 0
+        self.slots = {}  # type: Dict[object, int]
+        self.params = []  # type: List[int]
+        for tac in instructions:
+            for var in chain(tac.uses, [tac.defines]):
+                if var is not None and not var.is_constant:
+                    self.slots.setdefault(var, len(self.slots))
+            if isinstance(tac, TacParam):
+                self.params.append(self.slots[tac.pname])
+
+    def frame(self, args) -> List[int]:
+        frame = [0] * len(self.slots)
+        for slot, value in zip(self.params, args):
+            frame[slot] = value
+        return frame
+
+
+class Interpreter:
+
+    def __init__(self, tac_list: List[TacInstruction]):
+        self.output = []  # type: List[str]
+        # Set by instructions that return SWITCH
+        self.frame = []  # type: List[int]
+        self.pc = 0
+        # The return index, frame and result slot of each active call, and
+        # the arguments passed so far
+        self.stack = []  # type: List[tuple]
+        self.args = []  # type: List[int]
+        self.functions = {}  # type: Dict[str, Function]
+        # The function and the instruction each compiled instruction is
+        self.compiled_from = []  # type: List[tuple]
+        for instructions in split_functions(tac_list):
+            head = instructions[0]
+            if not isinstance(head, TacStartFunc):
+                continue
+            function = Function(head.label.lexeme, instructions)
+            self.functions[function.name] = function
+            function.entry = len(self.compiled_from)
+            self.compiled_from.extend(
+                (function, tac) for tac in instructions
+                if not isinstance(tac, DECLARATIONS))
+
+        # Labels go to the instruction after them
+        self.labels = {}  # type: Dict[str, int]
+        index = 0
+        for function in self.functions.values():
+            for tac in function.instructions:
+                if isinstance(tac, TacLabel):
+                    self.labels[tac.label.lexeme] = index
+                elif not isinstance(tac, DECLARATIONS):
+                    index += 1
+
+        self.code = [self.compile(index, function, tac) for index,
+                     (function, tac) in enumerate(self.compiled_from)]
+        self.counts = [0] * len(self.code)
+
+    def compile(self, index, function, tac) -> Callable[[list], int]:
+        """A closure carrying out tac on a frame, returning the next index"""
+        slots = function.slots
+        after = index + 1
+
+        def read(tok) -> Callable[[list], int]:
+            if tok.is_constant:
+                value = tok.val
+                return lambda frame: value
+            slot = slots[tok]
+            return lambda frame: frame[slot]
+
+        if isinstance(tac, TacOperation) and not tac.is_copy:
+            dest = slots[tac.reg]
+            operator = operators[tac.op.lexeme]
+            lhs, rhs = tac.lhs, tac.rhs
+            if not lhs.is_constant and not rhs.is_constant:
+                lhs, rhs = slots[lhs], slots[rhs]
+
+                def operation(frame):
+                    frame[dest] = wrap(int(operator(frame[lhs], frame[rhs])))
+                    return after
+                return operation
+            lhs, rhs = read(lhs), read(rhs)
+
+            def operation_constant(frame):
+                frame[dest] = wrap(int(operator(lhs(frame), rhs(frame))))
+                return after
+            return operation_constant
+
+        if isinstance(tac, (TacOperation, TacAssingment)):
+            dest = slots[tac.lhs]
+            if tac.rhs.is_constant:
+                value = tac.rhs.val
+
+                def assign_constant(frame):
+                    frame[dest] = value
+                    return after
+                return assign_constant
+            source = slots[tac.rhs]
+
+            def assign(frame):
+                frame[dest] = frame[source]
+                return after
+            return assign
+
+        if isinstance(tac, TacIfStatement):
+            pred = read(tac.pred)
+            target = self.labels[tac.label.lexeme]
+            return lambda frame: after if pred(frame) else target
+
+        if isinstance(tac, TacPrint):
+            value = read(tac.lhs)
+            output = self.output
+
+            def print_value(frame):
+                output.append(f'{value(frame)}\n')
+                return after
+            return print_value
+
+        if isinstance(tac, TacArg):
+            value = read(tac.arg)
+            args = self.args
+
+            def arg(frame):
+                args.append(value(frame))
+                return after
+            return arg
+
+        if isinstance(tac, TacCall):
+            callee = self.functions.get(tac.label.lexeme)
+            if callee is None:
+                raise TacError(f"function '{tac.label}' undefined")
+            dest = slots[tac.reg]
+            count = len(callee.params)
+            args, stack = self.args, self.stack
+
+            def call(frame):
+                passed = args[len(args) - count:] if count else []
+                del args[len(args) - len(passed):]
+                stack.append((after, frame, dest))
+                self.frame = callee.frame(passed)
+                self.pc = callee.entry
+                return SWITCH
+            return call
+
+        if isinstance(tac, (TacReturn, TacEndFunc)):
+            # Running off the end of a function returns 0
+            value = read(tac.lhs) if isinstance(tac, TacReturn) else None
+            stack = self.stack
+            end = len(self.compiled_from)
+
+            def return_value(frame):
+                result = value(frame) if value else 0
+                if not stack:
+                    self.pc = end
+                    return SWITCH
+                self.pc, self.frame, dest = stack.pop()
+                self.frame[dest] = result
+                return SWITCH
+            return return_value
+
+        raise TacError(f"can't run '{tac}'")
+
+    def run(self, entry='main', max_steps=None) -> str:
+        """Calls entry and runs until it returns, returning what it printed"""
+        if entry not in self.functions:
+            raise TacError(f"function '{entry}' undefined")
+        code, counts = self.code, self.counts
+        end = len(code)
+        frame = self.functions[entry].frame([])
+        pc = self.functions[entry].entry
+        try:
+            if max_steps is None:
+                while pc != end:
+                    counts[pc] += 1
+                    pc = code[pc](frame)
+                    if pc == SWITCH:
+                        frame, pc = self.frame, self.pc
+            else:
+                steps = 0
+                while pc != end:
+                    steps += 1
+                    if steps > max_steps:
+                        raise TacError(f'gave up after {max_steps} steps')
+                    counts[pc] += 1
+                    pc = code[pc](frame)
+                    if pc == SWITCH:
+                        frame, pc = self.frame, self.pc
+        except ZeroDivisionError:
+            raise TacError('division by zero')
+        return ''.join(self.output)
+
+    @property
+    def executed(self) -> int:
+        return sum(self.counts)
+
+    def function_counts(self) -> Counter:
+        """How many instructions ran in each function"""
+        counts = Counter()  # type: Counter
+        for (function, _), count in zip(self.compiled_from, self.counts):
+            counts[function.name] += count
+        return counts
+
+    def instruction_counts(self) -> Counter:
+        """How many instructions of each kind ran"""
+        counts = Counter()  # type: Counter
+        for (_, tac), count in zip(self.compiled_from, self.counts):
+            if count:
+                counts[type(tac).__name__] += count
+        return counts
@@ -0,0 +1,37 @@
+import re
+from collections import namedtuple
+
+Lexeme = namedtuple('Lexeme', ['kind', 'text', 'pos'])
+
+keywords = {
+    'auto', 'break', 'continue', 'else', 'extern', 'function', 'if', 'int',
+    'return', 'void', 'while'
+}
+
+token_regex = re.compile(r"""
+    (?P<space>[ \t\v\n\f]+)
+  | (?P<comment>/\*[\s\S]*?(?:\*/|\Z))
+  | (?P<string>L?"(?:\\.|[^\\"])*")
+  | (?P<id>[a-zA-Z_][a-zA-Z_0-9]*)
+  | (?P<constant>[0-9]+)
+  | (?P<op><=|>=|==|!=|[;{},:=()&!\-+*/%<>])
+  | (?P<bad>.)
+""", re.VERBOSE)
+
+
+def lex(source):
+    """
+    Splits C-- source into Lexemes, mirroring the mycc flex scanner:
+    comments and whitespace are skipped and unknown characters ignored
+    """
+    for match in token_regex.finditer(source):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'id':
+            yield Lexeme(text if text in keywords else 'id', text,
+                         match.start())
+        elif kind == 'constant' or kind == 'string':
+            yield Lexeme(kind, text, match.start())
+        elif kind == 'op':
+            yield Lexeme(text, text, match.start())
+    yield Lexeme('eof', '', len(source))
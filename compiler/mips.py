@@ -1,101 +1,230 @@
-import sys
-from compiler.token import Token
-from typing import List, Union
-from compiler.tac import TacInstruction
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from compiler.cfg import split_functions
+from compiler.chains import is_variable
+from compiler.regalloc import Allocation, allocate
+from compiler.selection import COMPARISONS, TILES, TileSet
+from compiler.tac import (TacArg, TacEndFunc, TacIfStatement, TacInstruction,
+                          TacOperation, TacParam, TacReturn)
+
+# Jump to main
+ENTRY = [
+    "li $fp, 0",
+    "jal main",
+    "j end",
+]
+
+# Load and call the exit syscall
+EXIT = [
+    "end:",
+    "# Exit the program",
+    "li $v0, 10",
+    "syscall"
+]
+
+# The first arguments of a call are passed in registers, the rest on the
+# stack
+ARGUMENT_REGISTERS = ('$a0', '$a1', '$a2', '$a3')
 
 
 class MipsData:
-
-    def __init__(self):
-        self.temporaries = (Token(f't{x}') for x in range(9))
-        self.saved = (Token(f's{x}') for x in range(7))
-        self.arguments = (Token(f'a{x}') for x in range(4))
-        self._mappings = {}
-
-    @property
-    def mappings(self):
-        return self._mappings
-
-    def get(self, value):
-        return self._mappings.get(value)
-
-    def __setitem__(self, key, val) -> None:
-        self._mappings[key] = val
-
-    def __getitem__(self, key) -> Token:
-        try:
-            val = self._mappings[key]
-        except KeyError as val:
-            sys.exit(f'Value {val} undefined')
-        else:
-            return val
-
-    def get_next_register(self, pool) -> Token:
-        try:
-            register = next(iter(pool))
-        except StopIteration:
-            sys.exit('Ran out of registers')
-        else:
-            return register
-
-    def mips_assign(self, dest, src) -> List[str]:
-        cmd = 'li' if src.is_constant else 'move'
-        return [f'{cmd} {dest.to_mips}, {src.to_mips}']
-
-    def assign_temp(self, tok):
-        temp = self.get_next_register(self.temporaries)
-        self[tok.lexeme] = temp
-        return temp
-
-    def lookup_mapping(self, tok) -> Token:
-        if tok.is_constant:
-            return tok
-        return self.get(tok.lexeme)
-
-    def resolve_mapping(self, tok) -> Union[Token, str]:
-        mapping = self.lookup_mapping(tok)
-        if not mapping.is_register:
-            temp = self.assign_temp(mapping)
-            assingment, *_ = self.mips_assign(temp, tok)
-            return temp, assingment
-        return mapping, None
-
-    def allocate_register(self, tok) -> Token:
+    """
+    Where the register allocator put each variable of a single function,
+    and its frame on the stack: the caller's frame pointer, the return
+    address if it makes calls, then the callee saved registers it uses, the
+    caller saved registers it keeps across calls and its spilled variables.
+    Arguments after the ones passed in registers are pushed by the caller
+    just above it, and spilled parameters passed there stay there.
+    Operations are lowered by the cheapest of tiles
+    """
+
+    def __init__(self, allocation: Allocation,
+                 function: List[TacInstruction] = (), tiles: TileSet = TILES):
+        self.allocation = allocation
+        self.tiles = tiles
+        self.registers = dict(allocation.registers)
+        # The registers saved on entry and restored on return
+        self.saved_registers = allocation.callee_saved
+        if allocation.liveness.calls:
+            self.saved_registers = ['$ra', *self.saved_registers]
+        self.params = [tac.pname for tac in function
+                       if isinstance(tac, TacParam)]
+        stack_params = self.params[len(ARGUMENT_REGISTERS):]
+        spilled = [var for var in allocation.spilled
+                   if var not in stack_params]
+        slots = ['$fp', *self.saved_registers, *allocation.caller_saved,
+                 *spilled]
+        self.offsets = {slot: 4 * index for index, slot in enumerate(slots)}
+        self.frame_size = 4 * len(slots)
+        for index, param in enumerate(reversed(stack_params)):
+            self.offsets[param] = self.frame_size + 4 * index
+        self.stack_size = 4 * len(stack_params)
+
+        # The position of each arg among its call's, they come just
+        # before the call
+        self.arg_index = {}  # type: Dict[int, int]
+        index = 0
+        for tac in function:
+            if isinstance(tac, TacArg):
+                self.arg_index[id(tac)] = index
+                index += 1
+            else:
+                index = 0
+
+        # The comparisons only read by the branch after them, by the id of
+        # the branch, which covers them
+        self.fused = {}  # type: Dict[int, TacOperation]
+        reads = Counter(var for tac in function for var in tac.uses)
+        writes = Counter(tac.defines for tac in function)
+        for tac, after in zip(function, function[1:]):
+            # Only values written once and read once are looked at
+            var = tac.defines
+            if not is_variable(var) or reads[var] != 1 or writes[var] != 1:
+                continue
+            if tiles.branches and isinstance(tac, TacOperation) and \
+                    tac.op.lexeme in COMPARISONS and \
+                    isinstance(after, TacIfStatement) and after.pred == var:
+                self.fused[id(after)] = tac
+            # Values only returned or passed by the instruction after them
+            # are computed where it wants them
+            elif tiles.forward and not isinstance(tac, TacParam):
+                if isinstance(after, TacReturn) and after.lhs == var:
+                    self.registers[var] = '$v1'
+                elif isinstance(after, TacArg) and after.arg == var and \
+                        self.arg_index[id(after)] < len(ARGUMENT_REGISTERS):
+                    index = self.arg_index[id(after)]
+                    self.registers[var] = ARGUMENT_REGISTERS[index]
+        self.covered = {id(tac) for tac in self.fused.values()}
+
+    def slot(self, key) -> str:
+        return f'{self.offsets[key]}($fp)'
+
+    def prologue(self) -> List[str]:
+        return [
+            f'addi $sp, $sp, -{self.frame_size}',
+            'sw $fp, 0($sp)',
+            'move $fp, $sp',
+            *(f'sw {reg}, {self.slot(reg)}' for reg in self.saved_registers),
+        ]
+
+    def epilogue(self) -> List[str]:
+        """Restores the caller's registers and pops the frame and arguments"""
+        return [
+            *(f'lw {reg}, {self.slot(reg)}' for reg in self.saved_registers),
+            f'addi $sp, $fp, {self.frame_size + self.stack_size}',
+            'lw $fp, 0($fp)',
+            'jr $ra',
+        ]
+
+    def load(self, register, tok) -> List[str]:
+        """Loads the value of tok into register"""
         if tok.is_constant:
-            return tok
-        mapping = self.get(tok.lexeme)
-        if mapping:
-            return mapping
-        elif tok.is_identifier:
-            reg = self.get_next_register(self.saved)
-        else:
-            reg = self.get_next_register(self.temporaries)
-        self._mappings[tok.lexeme] = reg
-        return reg
+            return [f'li {register}, {tok}']
+        src = self.registers.get(tok)
+        if src is None:
+            return [f'lw {register}, {self.slot(tok)}']
+        return [] if src == register else [f'move {register}, {src}']
+
+    def read(self, tok, scratch) -> Tuple[str, List[str]]:
+        """
+        The register holding tok, loading it into scratch if it is a
+        constant or spilled
+        """
+        register = self.registers.get(tok)
+        if register is not None:
+            return register, []
+        return scratch, self.load(scratch, tok)
+
+    def write(self, tok) -> Tuple[str, List[str]]:
+        """
+        The register to write tok to, and the instructions storing it
+        after if it is spilled
+        """
+        register = self.registers.get(tok)
+        if register is not None:
+            return register, []
+        return '$v0', [f'sw $v0, {self.slot(tok)}']
+
+    def store(self, tok, register) -> List[str]:
+        """Stores register into tok"""
+        dest = self.registers.get(tok)
+        if dest is None:
+            return [f'sw {register}, {self.slot(tok)}']
+        return [] if dest == register else [f'move {dest}, {register}']
+
+    def assign(self, dest, src) -> List[str]:
+        register = self.registers.get(dest)
+        if register is not None:
+            return self.load(register, src)
+        src, loads = self.read(src, '$v0')
+        return loads + self.store(dest, src)
+
+    def operation(self, op, dest, lhs, rhs) -> List[str]:
+        return self.tiles.operation(self, op, dest, lhs, rhs)
+
+    def branch(self, branch) -> List[str]:
+        """
+        Goes to the label of branch, a TacIfStatement, if the comparison it
+        covers is false
+        """
+        comparison = self.fused[id(branch)]
+        return self.tiles.branch(self, comparison.op.lexeme, comparison.lhs,
+                                 comparison.rhs, branch.label)
+
+    def param(self, pname) -> List[str]:
+        """Moves a parameter to where the allocator put it"""
+        live_range = self.allocation.liveness.ranges.get(pname)
+        if live_range is None or live_range.start == live_range.end:
+            # Never read
+            return []
+        index = self.params.index(pname)
+        if index < len(ARGUMENT_REGISTERS):
+            return self.store(pname, ARGUMENT_REGISTERS[index])
+        # A spilled parameter is left in its argument slot
+        register = self.registers.get(pname)
+        if register is None:
+            return []
+        return [f'lw {register}, {self.slot(pname)}']
+
+    def argument(self, arg) -> List[str]:
+        """Passes the value of arg, a TacArg, in a register or pushed"""
+        index = self.arg_index[id(arg)]
+        if index < len(ARGUMENT_REGISTERS):
+            return self.load(ARGUMENT_REGISTERS[index], arg.arg)
+        register, load = self.read(arg.arg, '$v0')
+        return [*load, 'addi $sp, $sp, -4', f'sw {register}, 0($sp)']
+
+    def caller_saves(self, call) -> List[str]:
+        return self.allocation.caller_saves(call)
+
+
+def build_function_mips(function: List[TacInstruction], allocator='linear',
+                        tiles: TileSet = TILES) -> List[str]:
+    function = list(function)
+    env = MipsData(allocate(function, allocator), function, tiles)
 
+    instructions = []
+    previous = None
+    for tac in function:
+        # Only a function that doesn't end in a return needs an epilogue at
+        # its end
+        if not (isinstance(tac, TacEndFunc) and
+                isinstance(previous, TacReturn)):
+            instructions.extend(tac.to_mips(env))
+        previous = tac
+    return instructions
 
-def build_mips(tac_list: List[TacInstruction]) -> List[str]:
 
-    prog_data = MipsData()
-    instructions = []
+def build_mips(tac_list: List[TacInstruction], allocator='linear',
+               tiles: TileSet = TILES) -> List[str]:
+
+    instructions = list(ENTRY)
+
+    # Convert all the tac instructions to MIPS, one function at a time
+    for function in split_functions(tac_list):
+        instructions.extend(build_function_mips(function, allocator, tiles))
 
-    # Jump to main
-    instructions.extend([
-        "li $fp, 0",
-        "jal main",
-        "j end",
-    ])
-
-    # Convert all the tac instructions to MIPS
-    for index, tac in enumerate(tac_list, 1):
-        instructions.extend(tac.to_mips(prog_data))
-
-    # Load and call the exit syscall
-    instructions.extend([
-        "end:",
-        "# Exit the program",
-        "li $v0, 10",
-        "syscall"
-    ])
+    instructions.extend(EXIT)
 
     return instructions
@@ -6,6 +6,11 @@ Param = namedtuple('Param', ['type', 'name'])
 
 class Node:
 
+    def __init__(self, tok=None, lhs=None, rhs=None):
+        self.tok = tok
+        self.lhs = lhs
+        self.rhs = rhs
+
     @property
     def func_params(self):
         if not self.lhs.rhs.rhs:
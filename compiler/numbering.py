@@ -0,0 +1,148 @@
+"""
+Value numbering over the TAC of one function
+
+Each value a block computes gets a number, and variables holding the same
+value share it: a copy passes its number on, and an operation is numbered
+by its operator and the numbers of its operands. An operation whose number
+is already held by some variable is rewritten into a copy of that
+variable, which copy propagation and dead code elimination then clean up.
+
+Writing to a variable gives it a new number, so the expressions it held
+are no longer available through it. Scoped by dominators, a block starts
+from the numbers known at the end of its immediate dominator, less the
+variables written on some path between the two.
+"""
+from itertools import count
+from typing import Set
+
+from compiler.cfg import BasicBlock, dominator_tree
+from compiler.chains import is_variable
+from compiler.tac import COMMUTATIVE, TacOperation
+
+
+class ValueTable:
+
+    def __init__(self, fresh):
+        self.fresh = fresh
+        # Variable -> number, expression -> number, and a variable holding
+        # each number, constants are their own numbers
+        self.numbers = {}  # type: dict
+        self.expressions = {}  # type: dict
+        self.holders = {}  # type: dict
+
+    def copy(self) -> 'ValueTable':
+        table = ValueTable(self.fresh)
+        table.numbers = dict(self.numbers)
+        table.expressions = dict(self.expressions)
+        table.holders = dict(self.holders)
+        return table
+
+    def number(self, tok):
+        if tok.is_constant:
+            return tok
+        if tok not in self.numbers:
+            self.kill(tok)
+        return self.numbers[tok]
+
+    def expression(self, op, lhs, rhs):
+        lhs, rhs = self.number(lhs), self.number(rhs)
+        if op in COMMUTATIVE:
+            return op, frozenset([lhs, rhs])
+        return op, lhs, rhs
+
+    def holder(self, number):
+        """A variable or constant that still holds number, if any"""
+        if not isinstance(number, int):
+            return number
+        var = self.holders.get(number)
+        if var is not None and self.numbers.get(var) == number:
+            return var
+        return None
+
+    def assign(self, var, number):
+        self.numbers[var] = number
+        if self.holder(number) is None:
+            self.holders[number] = var
+
+    def kill(self, var):
+        """Gives var a value not seen before"""
+        self.assign(var, next(self.fresh))
+
+
+def number_block(block: BasicBlock, table: ValueTable) -> int:
+    """
+    Given t0 := a * b ... t1 := b * a
+    rewrites the second operation into t1 := t0
+
+    Returns the number of operations rewritten
+    """
+    eliminated = 0
+    for tac in block.instructions:
+        dest = tac.defines
+        if not is_variable(dest):
+            continue
+        if tac.is_copy:
+            table.assign(dest, table.number(tac.rhs))
+        elif isinstance(tac, TacOperation):
+            key = table.expression(tac.op.lexeme, tac.lhs, tac.rhs)
+            number = table.expressions.get(key)
+            holder = None if number is None else table.holder(number)
+            if holder is not None:
+                tac.lhs, tac.rhs, tac.reg, tac.op = dest, holder, None, '='
+                eliminated += 1
+            else:
+                number = table.expressions[key] = next(table.fresh)
+            table.assign(dest, number)
+        else:
+            table.kill(dest)
+    return eliminated
+
+
+def written_between(dominator: BasicBlock, block: BasicBlock) -> Set:
+    """
+    The variables written in blocks on some path from dominator to block,
+    including block itself when it is on a loop
+    """
+    written = set()
+    seen = set()
+    stack = [pred for pred in block.predecessors if pred is not dominator]
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        written.update(tac.defines for tac in current.instructions
+                       if is_variable(tac.defines))
+        stack.extend(pred for pred in current.predecessors
+                     if pred is not dominator)
+    return written
+
+
+def number_values(graph, dominators=False) -> int:
+    """
+    Reuses the results of repeated operations in each block of graph, or
+    across the blocks each dominates
+
+    Returns the number of operations rewritten into copies
+    """
+    fresh = count()
+    if not dominators:
+        return sum(number_block(block, ValueTable(fresh))
+                   for block in graph.blocks)
+
+    tree = graph.analysis(dominator_tree)
+    eliminated = 0
+    walk = [(graph.entry, ValueTable(fresh))]
+    while walk:
+        block, table = walk.pop()
+        eliminated += number_block(block, table)
+        for child in tree[block]:
+            scoped = table.copy()
+            for var in written_between(block, child):
+                scoped.kill(var)
+            walk.append((child, scoped))
+    # Blocks that can't be reached have no dominator
+    for block in graph.blocks:
+        if block not in tree:
+            eliminated += number_block(block, ValueTable(fresh))
+    return eliminated
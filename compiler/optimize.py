@@ -2,78 +2,105 @@ from operator import add, mod, mul, sub, truediv
 
 from shutil import get_terminal_size
 
+from compiler.cfg import build_cfgs
+from compiler.chains import DefUseChains
+from compiler.numbering import number_values
+from compiler.packed import PackedTac
+from compiler.peephole import DEFAULT_RULES
+from compiler.ssa import propagate_constants
+
 operators = {'+': add, '-': sub, '*': mul, '%': mod, '/': truediv}
 
 
-def has_reads(target, tac_list):
-    for index, tac in enumerate(tac_list):
-        # If the next instruction is an assigment, as prior writes can be
-        # eliminated
-        if tac.is_assingment and tac.lhs.lexeme == target.lexeme:
-            return False
-        # Check if variable is read by subsequent instructions
-        if tac.lhs and tac.lhs.lexeme == target.lexeme:
-            return True
-        if tac.rhs and tac.rhs.lexeme == target.lexeme:
-            return True
-    return False
+def join_functions(graphs, tac_list):
+    """Flattens optimized graphs back into the form tac_list came in"""
+    instructions = [tac for graph in graphs for tac in graph.instructions()]
+    if isinstance(tac_list, PackedTac):
+        return tac_list.repack(instructions)
+    return instructions
 
 
-def eliminate_dead_code(tac_list):
+def remove_dead_code(chains):
     """
     Given an instruction a := 5
-    removes instruction if no subsequent reads can be found in tac_list
+    removes instruction if no read of a is reached by it, and then the
+    definitions only the removed instructions read
 
-    Returns True if changes were made
+    Returns the variables written by the removed instructions
+    """
+    removed = set()
+    dead = [tac for tac in chains.graph.instructions() if chains.is_dead(tac)]
+    while dead:
+        tac = dead.pop()
+        if not chains.is_dead(tac):
+            continue
+        removed.add(tac.defines)
+        for definition in chains.remove(tac):
+            if chains.is_dead(definition):
+                dead.append(definition)
+    return removed
+
+
+def eliminate_dead_code(tac_list):
+    """
+    Removes dead instructions from every function in tac_list
+
+    Returns the new list and True if changes were made
     """
-    # Mark indexes of lines for deletion
-    marked = set()
     changed = False
-    for index, tac in enumerate(tac_list[:-1], 1):
-        if tac.op.lexeme == '=':
-            if tac.lhs.is_temporary or tac.lhs.is_identifier:
-                if not has_reads(tac.lhs, tac_list[index:]):
-                    changed = True
-                    marked.add(index)
-    new_list = [t for i, t in enumerate(tac_list, 1) if i not in marked]
-    return (new_list, changed)
+    graphs = build_cfgs(tac_list)
+    for graph in graphs:
+        chains = DefUseChains(graph)
+        if remove_dead_code(chains):
+            chains.compact()
+            changed = True
+    return (join_functions(graphs, tac_list), changed)
 
 
-def find_usages_until(target, until, tac_list):
+def propagate_copy(chains, copy):
     """
-    Finds usages of a target variable until a subsequent write to another
-    specified target
+    Given: a := b
+    replaces the reads of a only reached by this copy with b, where b
+    still holds the value the copy read
+
+    Returns the instructions that were rewritten
     """
-    occurances = []
-    for index, tac in enumerate(tac_list):
-        if tac.is_assingment and tac.lhs.lexeme == until.lexeme:
-            return occurances
-        if tac.lhs and target.lexeme == tac.lhs.lexeme:
-            occurances.append([index, 'lhs'])
-        if tac.rhs and target.lexeme == tac.rhs.lexeme:
-            occurances.append([index, 'rhs'])
-    return occurances
+    var, value = copy.lhs, copy.rhs
+    if var is value:
+        return []
+    source = chains.reaching(value, copy)
+    block, _ = chains.position[id(copy)]
+    rewritten = []
+    for use, field in chains.uses(copy):
+        if chains.definitions(use, field) != [copy]:
+            continue
+        # Without loops an instruction runs at most once, so a write to b
+        # between the copy and the use would reach the use but not the copy
+        if not chains.acyclic and chains.position[id(use)][0] is not block:
+            continue
+        if chains.reaching(value, use) != source:
+            continue
+        chains.replace(use, field, value)
+        rewritten.append(use)
+    return rewritten
 
 
 def propagate_copies(tac_list):
     """
-    Given: a := b
-    replaces all subsequent occurrences of a with b until
-    there is a write to b
+    Propagates copies through every function in tac_list, in place
 
     Returns True if changes were made
     """
     changed = False
-    for index, instruction in enumerate(tac_list, 1):
-        # Check if the instruction is a basic assignment
-        if instruction.has_branches:
-            # Check for subsequent usages in the TAC
-            var, until = instruction.lhs, instruction.rhs
-            usages = find_usages_until(var, until, tac_list[index:])
-            for offset, use_type in usages:
-                use = tac_list[index + offset]
-                setattr(use, use_type, instruction.rhs)
-                changed = True
+    for graph in build_cfgs(tac_list):
+        chains = DefUseChains(graph)
+        graph_changed = False
+        for tac in list(graph.instructions()):
+            if tac.is_copy and propagate_copy(chains, tac):
+                graph_changed = True
+        if graph_changed:
+            graph.invalidate()
+        changed |= graph_changed
     return changed
 
 
@@ -85,25 +112,124 @@ def debug_print(header, tac_list):
         print(instruction)
 
 
-def optimize_tac(tac_list, debug=False):
-
-    changed = True
-
-    while changed:
+class WorklistOptimizer:
+    """
+    Runs the peephole rules and copy propagation over one function,
+    revisiting an instruction only while it is queued: at the start, after
+    it is rewritten, or after a copy replaces one of its operands
 
-        changed = any([instruction.optimize() for instruction in tac_list])
+    Queued instructions are visited in rounds, in program order, the rules
+    first and then the copies. Operands are found through
+    def-use chains, which the passes keep up to date as they rewrite
+    """
 
-        if changed and debug:
-            debug_print("Optimize instructions", tac_list)
+    def __init__(self, graph, rules=DEFAULT_RULES, fired=None):
+        self.graph = graph
+        self.chains = DefUseChains(graph)
+        self.rules = rules
+        self.fired = fired
+
+    def program_order(self, queued):
+        def order(tac):
+            block, offset = self.chains.position[id(tac)]
+            return block.index, offset
+        return sorted(queued.values(), key=order)
+
+    def fold(self, tac):
+        """
+        Replaces operands the chains show to be constant, then applies the
+        peephole rules
+
+        Returns True if changes were made
+        """
+        changed = False
+        for field in tac.reads:
+            value = self.chains.constant(tac, field)
+            if value is not None and value is not getattr(tac, field):
+                self.chains.replace(tac, field, value)
+                changed = True
+        if self.rules.apply(tac, self.fired):
+            self.chains.update(tac)
+            changed = True
+        return changed
+
+    def run(self, instructions):
+        """
+        Works through rounds of queued instructions, seeded with
+        instructions, until none are left
+
+        Returns True if changes were made
+        """
+        changed = False
+        queued = {id(tac): tac for tac in instructions}
+        while queued:
+            instructions, queued = self.program_order(queued), {}
+            for tac in instructions:
+                if self.fold(tac):
+                    # It may fold further next round or have become a copy
+                    queued[id(tac)] = tac
+                    changed = True
+            for tac in instructions:
+                if tac.is_copy:
+                    for use in propagate_copy(self.chains, tac):
+                        queued[id(use)] = use
+                        changed = True
+        return changed
 
-        tac_list, changed = eliminate_dead_code(tac_list)
 
-        if changed and debug:
-            debug_print("Eliminate Dead Code", tac_list)
+def optimize_function(graph, debug=False, stats=None, rules=DEFAULT_RULES,
+                      fired=None):
+    """
+    Optimizes one function to a fixpoint, returns True if changes were made
 
-        changed = propagate_copies(tac_list)
+    stats, a Counter, is given the number of instructions each pass
+    eliminated, and fired, another, how many times each peephole rule fired
+    """
+    eliminated = number_values(graph, dominators=True)
+    if stats is not None:
+        stats['value numbering'] += eliminated
+    if eliminated and debug:
+        debug_print(f"Value Numbering ({eliminated} eliminated)",
+                    graph.instructions())
+
+    optimizer = WorklistOptimizer(graph, rules, fired)
+    chains = optimizer.chains
+    changed = optimizer.run(graph.instructions()) or bool(eliminated)
+    if changed and debug:
+        debug_print("Optimize instructions", graph.instructions())
+
+    removed = remove_dead_code(chains)
+    while removed:
+        changed = True
+        if debug:
+            debug_print("Eliminate Dead Code", [
+                tac for tac in graph.instructions()
+                if id(tac) not in chains.removed])
+        # Removing a write to b can let a copy of b reach further
+        copies = [tac for tac in graph.instructions()
+                  if tac.is_copy and tac.rhs in removed
+                  and id(tac) not in chains.removed]
+        if not optimizer.run(copies):
+            break
+        removed = remove_dead_code(chains)
+
+    if stats is not None:
+        stats['dead code'] += len(chains.removed)
+    chains.compact()
+    if changed:
+        graph.invalidate()
+    return changed
 
-        if changed and debug:
-            debug_print("Propagate Copies", tac_list)
 
-    return tac_list
+def optimize_tac(tac_list, debug=False, ssa=False, stats=None,
+                 rules=DEFAULT_RULES, fired=None):
+    instructions = tac_list
+    if ssa:
+        instructions = propagate_constants(tac_list)
+        if debug:
+            debug_print("Sparse Conditional Constant Propagation",
+                        instructions)
+    graphs = build_cfgs(instructions)
+    for graph in graphs:
+        optimize_function(graph, debug, stats, rules, fired)
+    return join_functions(graphs, tac_list)
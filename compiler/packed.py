@@ -0,0 +1,138 @@
+"""
+Compact struct of arrays store for TAC
+
+Each instruction is an opcode in one array plus up to four operand indexes
+into a shared table of interned Tokens, instead of an attrs object with its
+own __dict__. Indexing a PackedTac gives a view: a subclass of the matching
+Tac class whose fields read and write the columns, so the optimizer passes
+and build_mips run on a PackedTac unchanged.
+"""
+from array import array
+from typing import Iterable, List
+
+import attr
+from compiler.tac import (TacArg, TacAssingment, TacCall, TacEndFunc,
+                          TacIfStatement, TacInstruction, TacLabel,
+                          TacOperation, TacParam, TacParamCount, TacPrint,
+                          TacReturn, TacStartFunc)
+
+TAC_CLASSES = [
+    TacStartFunc, TacParamCount, TacEndFunc, TacParam, TacCall, TacReturn,
+    TacLabel, TacIfStatement, TacPrint, TacOperation, TacAssingment, TacArg,
+]
+
+OPERANDS = 4
+
+FIELDS = [[field.name for field in attr.fields(cls)] for cls in TAC_CLASSES]
+
+
+def column_property(column):
+
+    def get(self):
+        index = self._store.columns[column][self._index]
+        return None if index < 0 else self._store.operands[index]
+
+    def set(self, value):
+        self._store.columns[column][self._index] = self._store.operand(value)
+
+    return property(get, set)
+
+
+def view_init(self, store, index):
+    object.__setattr__(self, '_store', store)
+    object.__setattr__(self, '_index', index)
+
+
+def make_view_class(cls, fields):
+    namespace = {field: column_property(column)
+                 for column, field in enumerate(fields)}
+    namespace['__slots__'] = ('_store', '_index')
+    namespace['__init__'] = view_init
+    return type(f'Packed{cls.__name__}', (cls,), namespace)
+
+
+VIEW_CLASSES = [make_view_class(cls, fields)
+                for cls, fields in zip(TAC_CLASSES, FIELDS)]
+
+OPCODES = {cls: opcode for opcode, cls in enumerate(TAC_CLASSES)}
+OPCODES.update({cls: opcode for opcode, cls in enumerate(VIEW_CLASSES)})
+
+
+class PackedTac:
+
+    def __init__(self, operands=None, operand_index=None):
+        self.opcodes = array('B')
+        self.columns = [array('i') for _ in range(OPERANDS)]
+        # The operand table only grows, so stores derived from this one can
+        # share it
+        self.operands = [] if operands is None else operands
+        self.operand_index = {} if operand_index is None else operand_index
+
+    def operand(self, tok) -> int:
+        if tok is None:
+            return -1
+        index = self.operand_index.get(tok)
+        if index is None:
+            index = self.operand_index[tok] = len(self.operands)
+            self.operands.append(tok)
+        return index
+
+    def append(self, tac: TacInstruction):
+        opcode = OPCODES[type(tac)]
+        fields = FIELDS[opcode]
+        self.opcodes.append(opcode)
+        for column, values in enumerate(self.columns):
+            if column < len(fields):
+                values.append(self.operand(getattr(tac, fields[column])))
+            else:
+                values.append(-1)
+
+    def repack(self, instructions: Iterable[TacInstruction]) -> 'PackedTac':
+        """Packs instructions into a new store sharing this operand table"""
+        packed = PackedTac(self.operands, self.operand_index)
+        for tac in instructions:
+            packed.append(tac)
+        return packed
+
+    def unpack(self) -> List[TacInstruction]:
+        operands = self.operands
+        tac_list = []
+        for index, opcode in enumerate(self.opcodes):
+            args = [self.columns[column][index]
+                    for column in range(len(FIELDS[opcode]))]
+            tac_list.append(TAC_CLASSES[opcode](
+                *(None if arg < 0 else operands[arg] for arg in args)))
+        return tac_list
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the instruction columns"""
+        return sum(values.itemsize * len(values)
+                   for values in [self.opcodes, *self.columns])
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('PackedTac index out of range')
+        return VIEW_CLASSES[self.opcodes[index]](self, index)
+
+    def __iter__(self):
+        for index, opcode in enumerate(self.opcodes):
+            yield VIEW_CLASSES[opcode](self, index)
+
+
+def pack(tac_list: Iterable[TacInstruction]) -> PackedTac:
+    packed = PackedTac()
+    for tac in tac_list:
+        packed.append(tac)
+    return packed
+
+
+def unpack(packed: PackedTac) -> List[TacInstruction]:
+    return packed.unpack()
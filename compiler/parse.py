@@ -1,5 +1,4 @@
 from collections import namedtuple
-from itertools import chain, islice, repeat
 from compiler.node import Node
 from compiler.token import Token
 
@@ -8,46 +7,52 @@ Param = namedtuple('Param', ['type', 'name'])
 
 
 def parse_ast(ast):
-    AstLine = namedtuple('AstLine', ['id', 'indent', 'tok'])
-    ast_lines = []
+    """Builds a Node tree from an iterable of indented AST lines"""
+    return parse(split_indent(line) for line in ast)
 
-    for index, line in enumerate(ast):
-        tok = line.lstrip()
-        indent = len(line) - len(tok)
-        ast_lines.append(AstLine(index, indent, tok))
 
-    return parse(ast_lines)
+def split_indent(line):
+    tok = line.lstrip()
+    return len(line) - len(tok), tok.rstrip('\n')
 
 
-def get_next_indented(nodes, head):
-    next_indent = head.indent + 2
-    for node in nodes:
-        if node.indent == next_indent:
-            yield node
+def format_ast(head):
+    """Renders a Node tree in the indented form mycc prints"""
+    stack = [(head, 0)]
+    while stack:
+        node, indent = stack.pop()
+        yield ' ' * indent + node.tok.lexeme
+        for child in (node.rhs, node.lhs):
+            if child is not None:
+                stack.append((child, indent + 2))
 
 
-def parse(nodes):
+def parse(lines):
+    """
+    Builds a Node tree in a single pass over (indent, lexeme) pairs
 
-    head, *rest = nodes
-    node = Node()
+    Keeps a stack of the open ancestors of the current line, a node's
+    first two children (two spaces deeper) become its lhs and rhs
+    """
+    head = None
+    stack = []  # type: list
 
-    node.tok = Token(head.tok)
+    for indent, lexeme in lines:
+        node = Node(Token(lexeme))
 
-    children = get_next_indented(rest, head)
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
 
-    lhs, rhs = islice(chain(children, repeat(None)), 2)
+        if stack:
+            parent_indent, parent = stack[-1]
+            if indent == parent_indent + 2:
+                if parent.lhs is None:
+                    parent.lhs = node
+                elif parent.rhs is None:
+                    parent.rhs = node
+        elif head is None:
+            head = node
 
-    if lhs:
-        if rhs:
-            node.lhs = parse(rest[:rest.index(rhs)])
-        else:
-            node.lhs = parse(rest[:len(nodes)])
-    else:
-        node.lhs = None
+        stack.append((indent, node))
 
-    if rhs:
-        node.rhs = parse(rest[rest.index(rhs):])
-    else:
-        node.rhs = None
-
-    return node
+    return head
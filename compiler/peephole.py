@@ -0,0 +1,129 @@
+"""
+Table driven peephole rewrites of TAC operations
+
+A Rule matches one operator with a pattern for each operand: VAR for any
+variable, CONST for any constant, or a particular constant value. A
+RuleSet indexes its rules by operator and operand patterns, so an operation
+is only tried against the rules that can match it, found with a few
+dictionary lookups however many rules there are, and one when there are
+none. A RuleSet isn't changed by applying it, so compiles can share one,
+each counting the rules that fire in a Counter of its own.
+
+A rule's rewrite is given the operator and operands and returns an operand
+the operation can be replaced with a copy of, a new (op, lhs, rhs), or None
+when the rule doesn't apply after all.
+"""
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+from attr import attrib, attrs
+from compiler.tac import TacOperation, evaluate, mips_operators, tokenize
+
+VAR = 'var'
+CONST = 'const'
+
+
+@attrs(frozen=True)
+class Rule:
+    name = attrib()  # type: str
+    op = attrib()  # type: str
+    lhs = attrib()
+    rhs = attrib()
+    rewrite = attrib()  # type: Callable
+
+
+class RuleSet:
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self.rules = []  # type: list
+        # (op, lhs is constant, rhs is constant) -> the rules for that
+        # shape, by operand patterns
+        self.index = {}  # type: dict
+        self.extend(rules)
+
+    def extend(self, rules: Iterable[Rule]):
+        for rule in rules:
+            self.rules.append(rule)
+            shape = (rule.op, rule.lhs != VAR, rule.rhs != VAR)
+            patterns = self.index.setdefault(shape, defaultdict(list))
+            patterns[rule.lhs, rule.rhs].append(rule)
+
+    def __add__(self, rules: Iterable[Rule]) -> 'RuleSet':
+        return RuleSet([*self.rules, *rules])
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def simplify(self, op, lhs, rhs, fired=None):
+        """
+        Returns the rule matching lhs op rhs and what it rewrites it to, or
+        None, counting the rule in fired, a Counter, when given
+        """
+        patterns = self.index.get((op, lhs.is_constant, rhs.is_constant))
+        if patterns is None:
+            return None
+        # The most specific patterns first
+        lhs_patterns = (lhs.val, CONST) if lhs.is_constant else (VAR,)
+        rhs_patterns = (rhs.val, CONST) if rhs.is_constant else (VAR,)
+        for lhs_pattern in lhs_patterns:
+            for rhs_pattern in rhs_patterns:
+                for rule in patterns.get((lhs_pattern, rhs_pattern), ()):
+                    result = rule.rewrite(op, lhs, rhs)
+                    if result is not None:
+                        if fired is not None:
+                            fired[rule.name] += 1
+                        return rule, result
+        return None
+
+    def apply(self, tac, fired=None) -> bool:
+        """
+        Rewrites the operation tac with the first rule that matches it,
+        returns True if one did
+        """
+        if not isinstance(tac, TacOperation) or tac.is_copy:
+            return False
+        match = self.simplify(tac.op.lexeme, tac.lhs, tac.rhs, fired)
+        if match is None:
+            return False
+        _, result = match
+        if isinstance(result, tuple):
+            tac.op, tac.lhs, tac.rhs = result
+        else:
+            tac.lhs, tac.rhs, tac.reg, tac.op = tac.reg, result, None, '='
+        return True
+
+
+def fold(op, lhs, rhs) -> Optional[object]:
+    result = evaluate(op, lhs.val, rhs.val)
+    return None if result is None else tokenize(result)
+
+
+def copy_lhs(op, lhs, rhs):
+    return lhs
+
+
+def copy_rhs(op, lhs, rhs):
+    return rhs
+
+
+def double_lhs(op, lhs, rhs):
+    return '+', lhs, lhs
+
+
+def double_rhs(op, lhs, rhs):
+    return '+', rhs, rhs
+
+
+DEFAULT_RULES = RuleSet([
+    *(Rule('fold constants', op, CONST, CONST, fold)
+      for op in mips_operators),
+    # x + 0 -> x, x - 0 -> x, x * 1 -> x, x / 1 -> x, 1 * x -> x
+    Rule('add zero', '+', VAR, 0, copy_lhs),
+    Rule('subtract zero', '-', VAR, 0, copy_lhs),
+    Rule('multiply by one', '*', VAR, 1, copy_lhs),
+    Rule('divide by one', '/', VAR, 1, copy_lhs),
+    Rule('multiply by one', '*', 1, VAR, copy_rhs),
+    # x * 2 -> x + x
+    Rule('strength reduce', '*', VAR, 2, double_lhs),
+    Rule('strength reduce', '*', 2, VAR, double_rhs),
+])
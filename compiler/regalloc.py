@@ -0,0 +1,270 @@
+"""
+Register allocation for the TAC of one function
+
+Each variable gets a live range, from the first to the last point it is
+live at, worked out from block liveness. An instruction reads its operands
+at position 2n and writes its result at 2n + 1, so a register freed by its
+last read can take the result. Ranges get registers by linear scan
+(Poletto and Sarkar), or optionally by coloring the interference graph
+(Chaitin and Briggs), and the ones that don't fit are spilled to slots in
+the function's frame.
+
+$s registers are callee saved, a function saves the ones it uses. $t
+registers are caller saved, a value held in one across a call is saved
+around it, so ranges live across a call prefer $s registers and the others
+$t ones. $v0 and $v1 are left for loading constants and spilled values, and
+$a0 for syscalls. Other targets allocate from their own RegisterFile.
+"""
+from bisect import insort
+from collections import defaultdict
+from typing import Dict, List
+
+from compiler.cfg import ControlFlowGraph, live_variables
+from compiler.chains import is_variable
+from compiler.tac import TacCall, TacInstruction
+
+CALLER_SAVED = tuple(f'$t{n}' for n in range(10))
+CALLEE_SAVED = tuple(f'$s{n}' for n in range(8))
+REGISTERS = CALLER_SAVED + CALLEE_SAVED
+
+
+class RegisterFile:
+    """The registers a target allocates, by who saves them around a call"""
+
+    def __init__(self, caller_saved, callee_saved):
+        self.caller_saved = tuple(caller_saved)
+        self.callee_saved = tuple(callee_saved)
+        self.registers = self.caller_saved + self.callee_saved
+
+
+MIPS_REGISTERS = RegisterFile(CALLER_SAVED, CALLEE_SAVED)
+
+
+class LiveRange:
+
+    __slots__ = ('var', 'start', 'end', 'crosses_call', 'weight')
+
+    def __init__(self, var, position):
+        self.var = var
+        self.start = self.end = position
+        self.crosses_call = False
+        # Reads and writes, what spilling the range would cost
+        self.weight = 0
+
+    def __lt__(self, other):
+        return self.end < other.end
+
+    def extend(self, position):
+        self.start = min(self.start, position)
+        self.end = max(self.end, position)
+
+
+class Liveness:
+    """
+    The live ranges of a function's variables, the variables live across
+    each call, the copies between variables, and if asked for, which
+    variables interfere
+    """
+
+    def __init__(self, function: List[TacInstruction], interference=False):
+        self.ranges = {}  # type: Dict[object, LiveRange]
+        self.calls = {}  # type: Dict[int, set]
+        self.hints = defaultdict(set)  # type: defaultdict
+        self.interference = defaultdict(set)  # type: defaultdict
+
+        graph = ControlFlowGraph(function)
+        live_out = graph.analysis(live_variables)
+        position = 0
+        for block in graph.blocks:
+            if not block.instructions:
+                continue
+            first, position = position, position + len(block)
+            live = {var for var in live_out[block] if is_variable(var)}
+            for var in live:
+                self.extend(var, 2 * position - 1)
+            for offset in reversed(range(len(block))):
+                tac = block.instructions[offset]
+                read, write = 2 * (first + offset), 2 * (first + offset) + 1
+                dest = tac.defines
+                if is_variable(dest):
+                    self.extend(dest, write).weight += 1
+                    live.discard(dest)
+                    if interference:
+                        self.interfere(tac, dest, live)
+                    if tac.is_copy and is_variable(tac.rhs):
+                        self.hints[dest].add(tac.rhs)
+                        self.hints[tac.rhs].add(dest)
+                if isinstance(tac, TacCall):
+                    self.calls[id(tac)] = set(live)
+                    for var in live:
+                        self.ranges[var].crosses_call = True
+                for var in tac.uses:
+                    if is_variable(var):
+                        self.extend(var, read).weight += 1
+                        live.add(var)
+            for var in live:
+                self.extend(var, 2 * first)
+
+    def extend(self, var, position) -> LiveRange:
+        live_range = self.ranges.get(var)
+        if live_range is None:
+            live_range = self.ranges[var] = LiveRange(var, position)
+        else:
+            live_range.extend(position)
+        return live_range
+
+    def interfere(self, tac, dest, live):
+        """dest interferes with what is live after it is written"""
+        for var in live:
+            # The two sides of a copy hold the same value
+            if tac.is_copy and var is tac.rhs:
+                continue
+            self.interference[dest].add(var)
+            self.interference[var].add(dest)
+
+
+class Allocation:
+
+    def __init__(self, liveness: Liveness,
+                 register_file: RegisterFile = MIPS_REGISTERS):
+        self.liveness = liveness
+        self.register_file = register_file
+        self.registers = {}  # type: Dict[object, str]
+        self.spilled = []  # type: List[object]
+
+    def choose(self, live_range, available) -> str:
+        """
+        A register in available for live_range, the one a copy partner had
+        if possible so the copy becomes a no-op. Ranges live across a call,
+        or copied to or from one that is, prefer callee saved registers
+        """
+        register_file = self.register_file
+        partners = self.liveness.hints.get(live_range.var, ())
+        for partner in partners:
+            register = self.registers.get(partner)
+            if register in available and not (
+                    live_range.crosses_call and
+                    register in register_file.caller_saved):
+                return register
+        preferences = register_file.registers
+        if live_range.crosses_call or any(
+                self.liveness.ranges[partner].crosses_call
+                for partner in partners):
+            preferences = (register_file.callee_saved +
+                           register_file.caller_saved)
+        for register in preferences:
+            if register in available:
+                return register
+        return None
+
+    @property
+    def callee_saved(self) -> List[str]:
+        used = set(self.registers.values())
+        return [register for register in self.register_file.callee_saved
+                if register in used]
+
+    def caller_saves(self, call) -> List[str]:
+        """The caller saved registers holding values live across call"""
+        live = self.liveness.calls[id(call)]
+        return sorted(set(
+            register for register in map(self.registers.get, live)
+            if register in self.register_file.caller_saved))
+
+    @property
+    def caller_saved(self) -> List[str]:
+        """The caller saved registers saved around any call"""
+        saved = set()  # type: set
+        for live in self.liveness.calls.values():
+            saved.update(register
+                         for register in map(self.registers.get, live)
+                         if register in self.register_file.caller_saved)
+        return sorted(saved)
+
+
+def linear_scan(liveness: Liveness,
+                register_file: RegisterFile = MIPS_REGISTERS) -> Allocation:
+    """
+    Gives ranges registers in order of their start, freeing the registers
+    of ranges that have ended, and spilling the range that ends last when
+    none are free
+    """
+    allocation = Allocation(liveness, register_file)
+    registers = allocation.registers
+    free = set(register_file.registers)
+    # Ranges holding a register, by end
+    active = []  # type: List[LiveRange]
+    for live_range in sorted(liveness.ranges.values(),
+                             key=lambda live_range: live_range.start):
+        expired = 0
+        while expired < len(active) and \
+                active[expired].end < live_range.start:
+            free.add(registers[active[expired].var])
+            expired += 1
+        del active[:expired]
+
+        register = allocation.choose(live_range, free)
+        if register is not None:
+            free.discard(register)
+        elif active[-1].end > live_range.end:
+            furthest = active.pop()
+            register = registers.pop(furthest.var)
+            allocation.spilled.append(furthest.var)
+        else:
+            allocation.spilled.append(live_range.var)
+            continue
+        registers[live_range.var] = register
+        insort(active, live_range)
+    return allocation
+
+
+def color_graph(liveness: Liveness,
+                register_file: RegisterFile = MIPS_REGISTERS) -> Allocation:
+    """
+    Removes variables with fewer neighbours than there are registers, or
+    when there are none the cheapest to spill, then colors them in reverse
+    order, spilling those whose neighbours took every register
+    """
+    allocation = Allocation(liveness, register_file)
+    registers = allocation.registers
+    available = register_file.registers
+    neighbours = liveness.interference
+    degree = {var: len(neighbours[var]) for var in liveness.ranges}
+    remaining = set(liveness.ranges)
+    low = [var for var in liveness.ranges if degree[var] < len(available)]
+    stack = []
+    while remaining:
+        var = None
+        while low and var is None:
+            var = low.pop()
+            if var not in remaining:
+                var = None
+        if var is None:
+            var = min(remaining, key=lambda var: (
+                liveness.ranges[var].weight / (degree[var] + 1)))
+        remaining.discard(var)
+        stack.append(var)
+        for neighbour in neighbours[var]:
+            if neighbour in remaining:
+                degree[neighbour] -= 1
+                if degree[neighbour] == len(available) - 1:
+                    low.append(neighbour)
+
+    while stack:
+        var = stack.pop()
+        taken = set(map(registers.get, neighbours[var]))
+        register = allocation.choose(liveness.ranges[var],
+                                     set(available) - taken)
+        if register is None:
+            allocation.spilled.append(var)
+        else:
+            registers[var] = register
+    return allocation
+
+
+ALLOCATORS = {'linear': linear_scan, 'coloring': color_graph}
+
+
+def allocate(function: List[TacInstruction], method='linear',
+             register_file: RegisterFile = MIPS_REGISTERS) -> Allocation:
+    liveness = Liveness(function, interference=method == 'coloring')
+    return ALLOCATORS[method](liveness, register_file)
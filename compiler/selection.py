@@ -0,0 +1,462 @@
+"""
+MIPS instruction selection by tiling TAC operations, with a cost model
+
+A Tile covers one operator with a pattern for each operand, like the
+peephole Rules: REG for any operand, loaded into a register if it isn't in
+one, IMM for a constant, or a particular constant value. Its emit is given
+the environment, the operands and a target, the register an operation
+writes or the label a branch goes to, and returns the instructions, or
+None when the tile doesn't apply after all, say when an immediate doesn't
+fit in 16 bits. Every tile matching an operation is tried, also with the
+operands swapped when the operator allows it, and the cheapest cover wins.
+
+A comparison only read by the branch straight after it is covered
+together with that branch by a branch tile, which branches when the
+comparison is false. A value only read by the return or register argument
+straight after it can be computed where that wants it, $v1 or the argument
+register, instead of being moved there.
+
+What an instruction costs is the number of machine instructions it
+assembles to: pseudo instructions like sge, div and blt expand to several,
+a constant operand in a register form has to be loaded first, and so does
+a constant that doesn't fit in 16 bits. The cycles it takes add how long
+multiplies and divides keep the multiply unit busy, and covers are chosen
+by cycles, then cost.
+
+Multiplying by a constant is lowered to shifts and adds when that is
+quicker than mul, and dividing by one to shifts with a correction for
+negative dividends when the divisor is a power of two, or otherwise to a
+multiply by its magic number (Hacker's Delight, chapter 10). Remainders
+are what is left after the quotient times the divisor. The lowered
+sequences use addu and subu, which wrap like mul rather than trapping.
+"""
+from collections import defaultdict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from attr import attrib, attrs
+from compiler.tac import mips_operators
+
+REG = 'reg'
+IMM = 'imm'
+
+# Machine instructions each pseudo instruction assembles to with register
+# operands, the rest are one
+PSEUDO = {
+    'seq': 3, 'sne': 2, 'sge': 3, 'sle': 3, 'div': 4, 'rem': 4,
+    'blt': 2, 'bge': 2, 'bgt': 2, 'ble': 2,
+}
+# Instructions taking an immediate, and ones with no register operands to
+# load a constant into
+IMMEDIATE = {
+    'addi', 'addiu', 'andi', 'ori', 'xori', 'slti', 'sltiu', 'sll', 'srl',
+    'sra',
+}
+NO_OPERANDS = {'li', 'lw', 'sw', 'j', 'jal', 'jr', 'syscall', 'nop'}
+# Cycles the multiply unit is busy for after the first
+LATENCY = {'mul': 4, 'mult': 4, 'div': 34, 'rem': 34}
+
+# The operator an operation keeps when its operands are swapped
+SWAPPED = {
+    '+': '+', '*': '*', '==': '==', '!=': '!=', '<': '>', '>': '<',
+    '<=': '>=', '>=': '<=',
+}
+# The comparison that is true when another is false
+NEGATED = {
+    '==': '!=', '!=': '==', '<': '>=', '>=': '<', '>': '<=', '<=': '>',
+}
+BRANCHES = {
+    '==': 'beq', '!=': 'bne', '<': 'blt', '>=': 'bge', '>': 'bgt',
+    '<=': 'ble',
+}
+ZERO_BRANCHES = {
+    '==': 'beqz', '!=': 'bnez', '<': 'bltz', '>=': 'bgez', '>': 'bgtz',
+    '<=': 'blez',
+}
+COMPARISONS = tuple(NEGATED)
+
+
+def is_number(operand) -> bool:
+    try:
+        int(operand, 0)
+    except ValueError:
+        return False
+    return True
+
+
+def fits(value) -> bool:
+    """Whether value fits a sign extended 16 bit immediate"""
+    return -2 ** 15 <= value < 2 ** 15
+
+
+def fits_unsigned(value) -> bool:
+    """Whether value fits a zero extended 16 bit immediate"""
+    return 0 <= value < 2 ** 16
+
+
+def load_cost(value) -> int:
+    # li is an addiu or ori, or a lui and an ori
+    return 1 if fits(value) or fits_unsigned(value) else 2
+
+
+def cost(instruction: str) -> int:
+    """The machine instructions instruction assembles to"""
+    line = instruction.split('#', 1)[0].strip()
+    if not line or line.endswith(':'):
+        return 0
+    op, _, operands = line.partition(' ')
+    operands = [operand.strip() for operand in operands.split(',')]
+    if op == 'li':
+        return load_cost(int(operands[1], 0))
+    total = PSEUDO.get(op, 1)
+    if op not in IMMEDIATE and op not in NO_OPERANDS:
+        total += sum(load_cost(int(operand, 0)) for operand in operands
+                     if is_number(operand))
+    return total
+
+
+def cycles(instruction: str) -> int:
+    """How many cycles instruction takes, roughly"""
+    op = instruction.strip().split(' ', 1)[0]
+    return cost(instruction) + LATENCY.get(op, 0)
+
+
+def total_cost(instructions: Iterable[str]) -> int:
+    return sum(map(cost, instructions))
+
+
+def cheapest(covers: Iterable[List[str]]) -> List[str]:
+    """The quickest of covers, the cheapest and then shortest of those"""
+    return min(covers, key=lambda instructions: (
+        sum(map(cycles, instructions)), total_cost(instructions),
+        len(instructions)))
+
+
+def read(env, tok, scratch) -> Tuple[str, List[str]]:
+    """env.read, except that zero is read from $zero"""
+    if tok.is_constant and tok.val == 0:
+        return '$zero', []
+    return env.read(tok, scratch)
+
+
+@attrs(frozen=True)
+class Tile:
+    name = attrib()  # type: str
+    ops = attrib()  # type: tuple
+    lhs = attrib()
+    rhs = attrib()
+    emit = attrib()  # type: Callable
+
+    def matches(self, lhs, rhs) -> bool:
+        return all(pattern == REG or tok.is_constant and (
+                   pattern == IMM or pattern == tok.val)
+                   for pattern, tok in ((self.lhs, lhs), (self.rhs, rhs)))
+
+
+class TileSet:
+
+    def __init__(self, operations: Iterable[Tile] = (),
+                 branches: Iterable[Tile] = (), forward=False):
+        self.operations = list(operations)
+        self.branches = list(branches)
+        self.forward = forward
+        # op -> the tiles covering it
+        self.index = defaultdict(list)  # type: defaultdict
+        self.branch_index = defaultdict(list)  # type: defaultdict
+        for tile in self.operations:
+            for op in tile.ops:
+                self.index[op].append(tile)
+        for tile in self.branches:
+            for op in tile.ops:
+                self.branch_index[op].append(tile)
+
+    def cheapest(self, index, env, op, lhs, rhs, target) -> List[str]:
+        covers = []
+        for op, lhs, rhs in ((op, lhs, rhs), (SWAPPED.get(op), rhs, lhs)):
+            for tile in index.get(op, ()):
+                if tile.matches(lhs, rhs):
+                    instructions = tile.emit(env, op, lhs, rhs, target)
+                    if instructions is not None:
+                        covers.append(instructions)
+        return cheapest(covers)
+
+    def operation(self, env, op, dest, lhs, rhs) -> List[str]:
+        """The cheapest instructions computing dest = lhs op rhs"""
+        reg, store = env.write(dest)
+        return [*self.cheapest(self.index, env, op, lhs, rhs, reg), *store]
+
+    def branch(self, env, op, lhs, rhs, label) -> List[str]:
+        """The cheapest instructions going to label unless lhs op rhs"""
+        return self.cheapest(self.branch_index, env, op, lhs, rhs, label)
+
+
+def register_form(env, op, lhs, rhs, dest) -> List[str]:
+    lhs, lhs_load = read(env, lhs, '$v0')
+    rhs, rhs_load = read(env, rhs, '$v1')
+    instruction = mips_operators[op]
+    return [*lhs_load, *rhs_load, f'{instruction} {dest}, {lhs}, {rhs}']
+
+
+def add_immediate(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    value = rhs.val if op == '+' else -rhs.val
+    if not fits(value):
+        return None
+    lhs, load = read(env, lhs, '$v0')
+    return [*load, f'addi {dest}, {lhs}, {value}']
+
+
+def less_than(env, op, lhs, rhs, dest) -> List[str]:
+    """
+    slt, or for the other orderings slt with the operands swapped and the
+    result flipped, which is cheaper than sge and sle
+    """
+    lhs, lhs_load = read(env, lhs, '$v0')
+    rhs, rhs_load = read(env, rhs, '$v1')
+    if op in ('>', '<='):
+        lhs, rhs = rhs, lhs
+    flip = [f'xori {dest}, {dest}, 1'] if op in ('>=', '<=') else []
+    return [*lhs_load, *rhs_load, f'slt {dest}, {lhs}, {rhs}', *flip]
+
+
+def less_than_immediate(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    """lhs < c is slti, and lhs <= c is lhs < c + 1, the others flip them"""
+    value = rhs.val + 1 if op in ('>', '<=') else rhs.val
+    if not fits(value):
+        return None
+    lhs, load = read(env, lhs, '$v0')
+    flip = [f'xori {dest}, {dest}, 1'] if op in ('>', '>=') else []
+    return [*load, f'slti {dest}, {lhs}, {value}', *flip]
+
+
+def equality(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    """
+    lhs and rhs are equal when their xor is zero, which sltiu tests by
+    being unsigned less than one
+    """
+    lhs, lhs_load = read(env, lhs, '$v0')
+    if rhs.is_constant and rhs.val == 0:
+        difference, instructions = lhs, lhs_load
+    elif rhs.is_constant:
+        if not fits_unsigned(rhs.val):
+            return None
+        difference = dest
+        instructions = [*lhs_load, f'xori {dest}, {lhs}, {rhs.val}']
+    else:
+        rhs, rhs_load = read(env, rhs, '$v1')
+        difference = dest
+        instructions = [*lhs_load, *rhs_load, f'xor {dest}, {lhs}, {rhs}']
+    if op == '==':
+        return [*instructions, f'sltiu {dest}, {difference}, 1']
+    return [*instructions, f'sltu {dest}, $zero, {difference}']
+
+
+def magic(divisor, bits=32) -> Tuple[int, int]:
+    """
+    The magic number and shift for dividing bits wide words by divisor,
+    where 2 <= abs(divisor) < 2 ** (bits - 1): the quotient is the high
+    word of the dividend times the magic number, plus the dividend if the
+    number is negative for a positive divisor or minus it the other way
+    round, shifted right, plus one if that is negative
+    """
+    half = 2 ** (bits - 1)
+    absolute = abs(divisor)
+    # The largest dividend whose remainder is abs(divisor) - 1
+    limit = half + (divisor < 0)
+    limit -= 1 + limit % absolute
+    # Find the smallest power of two with a multiplier close enough to
+    # 2 ** power / absolute
+    power = bits - 1
+    q1, r1 = divmod(half, limit)
+    q2, r2 = divmod(half, absolute)
+    while True:
+        power += 1
+        q1, r1 = 2 * q1, 2 * r1
+        if r1 >= limit:
+            q1, r1 = q1 + 1, r1 - limit
+        q2, r2 = 2 * q2, 2 * r2
+        if r2 >= absolute:
+            q2, r2 = q2 + 1, r2 - absolute
+        delta = absolute - r2
+        if q1 > delta or q1 == delta and r1:
+            break
+    multiplier = q2 + 1
+    if divisor < 0:
+        multiplier = -multiplier
+    # As a signed word
+    multiplier = (multiplier + half) % (2 * half) - half
+    return multiplier, power - bits
+
+
+def power_of_two(value) -> Optional[int]:
+    """k if abs(value) is 2 ** k"""
+    absolute = abs(value)
+    if absolute and absolute & (absolute - 1) == 0:
+        return absolute.bit_length() - 1
+    return None
+
+
+def shift_and_add(src, dest, value) -> List[str]:
+    """
+    dest = src * value by Horner's rule over the non adjacent form of
+    value, a sum of powers of two with no two next to each other. dest
+    can only be src when value is a power of two
+    """
+    # The terms of the form, highest first
+    terms = []
+    remaining, position = abs(value), 0
+    while remaining:
+        if remaining & 1:
+            digit = 2 - (remaining & 3)
+            terms.insert(0, (position, digit))
+            remaining -= digit
+        remaining >>= 1
+        position += 1
+    if not terms:
+        return [f'move {dest}, $zero']
+
+    instructions = []
+    current, position = src, terms[0][0]
+    for next_position, digit in terms[1:]:
+        instruction = 'addu' if digit > 0 else 'subu'
+        instructions.extend([
+            f'sll {dest}, {current}, {position - next_position}',
+            f'{instruction} {dest}, {dest}, {src}',
+        ])
+        current, position = dest, next_position
+    if position:
+        instructions.append(f'sll {dest}, {current}, {position}')
+    elif current != dest:
+        instructions.append(f'move {dest}, {current}')
+    if value < 0:
+        instructions.append(f'subu {dest}, $zero, {dest}')
+    return instructions
+
+
+def multiply_by_constant(env, op, lhs, rhs, dest) -> List[str]:
+    lhs, load = read(env, lhs, '$v0')
+    if dest != lhs or power_of_two(rhs.val) is not None:
+        return [*load, *shift_and_add(lhs, dest, rhs.val)]
+    return [*load, *shift_and_add(lhs, '$v1', rhs.val), f'move {dest}, $v1']
+
+
+def rounding(lhs, power) -> List[str]:
+    """
+    Sets $v1 to 2 ** power - 1 if lhs is negative or to 0 if not, added to
+    lhs before shifting so the quotient is truncated towards zero
+    """
+    if power == 1:
+        return [f'srl $v1, {lhs}, 31']
+    return [f'sra $v1, {lhs}, 31', f'srl $v1, $v1, {32 - power}']
+
+
+def divide_by_power_of_two(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    power = power_of_two(rhs.val)
+    if power is None:
+        return None
+    lhs, load = read(env, lhs, '$v0')
+    negate = [f'subu {dest}, $zero, {dest}'] if rhs.val < 0 else []
+    if power == 0:
+        return [*load, f'subu {dest}, $zero, {lhs}' if negate else
+                f'move {dest}, {lhs}']
+    return [*load, *rounding(lhs, power), f'addu $v1, {lhs}, $v1',
+            f'sra {dest}, $v1, {power}', *negate]
+
+
+def remainder_of_power_of_two(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    """
+    The low bits of lhs, rounded like the quotient and the rounding taken
+    off again. A remainder takes the sign of lhs, so the divisor's doesn't
+    matter
+    """
+    power = power_of_two(rhs.val)
+    if power is None:
+        return None
+    if power == 0:
+        return [f'move {dest}, $zero']
+    lhs, load = read(env, lhs, '$v0')
+    mask = 2 ** power - 1
+    if fits_unsigned(mask):
+        low_bits = [f'andi $v0, $v0, {mask}']
+    else:
+        low_bits = [f'sll $v0, $v0, {32 - power}',
+                    f'srl $v0, $v0, {32 - power}']
+    return [*load, *rounding(lhs, power), f'addu $v0, {lhs}, $v1',
+            *low_bits, f'subu {dest}, $v0, $v1']
+
+
+def divide_by_constant(env, op, lhs, rhs, dest) -> Optional[List[str]]:
+    """
+    The quotient by the magic number of the divisor, and for a remainder
+    the dividend less the quotient times the divisor
+    """
+    divisor = rhs.val
+    if op == '%':
+        divisor = abs(divisor)
+    if abs(divisor) < 2 or abs(divisor) >= 2 ** 31 or \
+            power_of_two(divisor) is not None:
+        return None
+    multiplier, shift = magic(divisor)
+    dividend = lhs
+    lhs, load = read(env, lhs, '$v0')
+    instructions = [*load, f'li $v1, {multiplier}', f'mult {lhs}, $v1',
+                    'mfhi $v1']
+    if divisor > 0 and multiplier < 0:
+        instructions.append(f'addu $v1, $v1, {lhs}')
+    elif divisor < 0 and multiplier > 0:
+        instructions.append(f'subu $v1, $v1, {lhs}')
+    if shift:
+        instructions.append(f'sra $v1, $v1, {shift}')
+    # Rounds a negative quotient up to truncate it towards zero
+    instructions.append('srl $v0, $v1, 31')
+    if op == '/':
+        return [*instructions, f'addu {dest}, $v1, $v0']
+    instructions.append('addu $v1, $v1, $v0')
+    product = cheapest([shift_and_add('$v1', '$v0', divisor),
+                        [f'li $v0, {divisor}', 'mul $v0, $v1, $v0']])
+    # The dividend is loaded again if it was in $v0
+    lhs, load = read(env, dividend, '$v1')
+    return [*instructions, *product, *load, f'subu {dest}, {lhs}, $v0']
+
+
+def compare_and_branch(env, op, lhs, rhs, label) -> List[str]:
+    lhs, lhs_load = read(env, lhs, '$v0')
+    rhs, rhs_load = read(env, rhs, '$v1')
+    return [*lhs_load, *rhs_load,
+            f'{BRANCHES[NEGATED[op]]} {lhs}, {rhs}, {label}']
+
+
+def compare_with_zero(env, op, lhs, rhs, label) -> List[str]:
+    lhs, load = read(env, lhs, '$v0')
+    return [*load, f'{ZERO_BRANCHES[NEGATED[op]]} {lhs}, {label}']
+
+
+def set_and_branch(env, op, lhs, rhs, label) -> List[str]:
+    """Computes the comparison into $v0 and branches if it is zero"""
+    return [*env.tiles.cheapest(env.tiles.index, env, op, lhs, rhs, '$v0'),
+            f'beqz $v0, {label}']
+
+
+REGISTER_FORM = Tile('register form', tuple(mips_operators), REG, REG,
+                     register_form)
+
+TILES = TileSet([
+    REGISTER_FORM,
+    Tile('add immediate', ('+', '-'), REG, IMM, add_immediate),
+    Tile('less than', ('<', '>', '<=', '>='), REG, REG, less_than),
+    Tile('less than immediate', ('<', '>', '<=', '>='), REG, IMM,
+         less_than_immediate),
+    Tile('equality', ('==', '!='), REG, REG, equality),
+    Tile('shift and add', ('*',), REG, IMM, multiply_by_constant),
+    Tile('divide by a power of two', ('/',), REG, IMM,
+         divide_by_power_of_two),
+    Tile('remainder of a power of two', ('%',), REG, IMM,
+         remainder_of_power_of_two),
+    Tile('divide by a constant', ('/', '%'), REG, IMM, divide_by_constant),
+], [
+    Tile('compare with zero', COMPARISONS, REG, 0, compare_with_zero),
+    Tile('compare and branch', COMPARISONS, REG, REG, compare_and_branch),
+    Tile('set and branch', COMPARISONS, REG, REG, set_and_branch),
+], forward=True)
+
+# One register form per operator, no compare and branch and every value
+# moved to where it is wanted, as MIPS was generated before there were tiles
+BASIC_TILES = TileSet([REGISTER_FORM])
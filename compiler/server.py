@@ -0,0 +1,67 @@
+import json
+import sys
+from compiler.compile import compile_source, make_program
+from compiler.x86 import assemble
+from os import path, unlink
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+from time import perf_counter
+
+
+def handle_request(message, cache=None):
+    """
+    Compiles one request, every stage builds its own TacEnv and MipsData so
+    nothing is shared between requests but the cache. A MIPS program is
+    sent back, an x86-64 one is assembled to the path the client asked for
+    """
+    target = message.get('target', 'mips')
+    try:
+        instructions = compile_source(
+            message['source'], message.get('optimize'), cache,
+            message.get('ssa'), message.get('allocator', 'linear'), target)
+        if target == 'x86-64':
+            assemble(instructions, message['out'])
+            return {'ok': True}
+    except SystemExit as error:
+        return {'ok': False, 'error': str(error.code)}
+    except Exception as error:
+        return {'ok': False, 'error': f'{type(error).__name__}: {error}'}
+    return {'ok': True, 'program': make_program(instructions)}
+
+
+class CompileHandler(StreamRequestHandler):
+
+    def handle(self):
+        start = perf_counter()
+        message = json.loads(self.rfile.readline())
+        reply = handle_request(message, self.server.cache)
+        reply['elapsed'] = perf_counter() - start
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+        status = 'ok' if reply['ok'] else 'error'
+        print(f"{message.get('name', '<stdin>')}: {status} "
+              f"{reply['elapsed'] * 1000:.2f}ms", file=sys.stderr)
+
+
+class CompileServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+    # Shared by every request, entries are written atomically
+    cache = None
+
+
+def make_server(sock_path, cache=None):
+    if path.exists(sock_path):
+        unlink(sock_path)
+    server = CompileServer(sock_path, CompileHandler)
+    server.cache = cache
+    return server
+
+
+def serve(sock_path, cache=None):
+    server = make_server(sock_path, cache)
+    print(f'Serving on {sock_path}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        unlink(sock_path)
@@ -0,0 +1,294 @@
+"""
+Static single assignment form and sparse conditional constant propagation
+
+SSAForm renames each variable written in a function so every name has one
+definition, with TacPhi instructions merging names where control flow
+joins at a label. sccp then works out which names hold constants and which
+branches can be taken, following only the edges it has shown can run
+(Wegman and Zadeck).
+
+leave applies what sccp found and undoes the renaming. Nothing moves a
+definition or makes a name live for longer, so dropping the phis and the
+version suffixes gives back valid TAC.
+"""
+from collections import defaultdict
+from typing import Dict, List
+
+from compiler.cfg import (BasicBlock, ControlFlowGraph, dominator_tree,
+                          immediate_dominators, split_functions)
+from compiler.chains import is_variable
+from compiler.tac import (TacEndFunc, TacIfStatement, TacInstruction,
+                          TacLabel, TacOperation, TacStartFunc, evaluate)
+from compiler.token import Token
+
+# Lattice values besides constants: not known yet, and known not constant
+TOP = 'top'
+BOTTOM = 'bottom'
+
+
+class TacPhi(TacInstruction):
+
+    writes = 'lhs'
+
+    def __init__(self, var):
+        self.lhs = var
+        # The variable this merges, and the name arriving from each
+        # predecessor block
+        object.__setattr__(self, 'var', var)
+        object.__setattr__(self, 'args', {})
+
+    def __str__(self) -> str:
+        args = ', '.join(str(arg) for arg in self.args.values())
+        return f'{self.lhs} := phi({args})'
+
+
+def meet(lhs, rhs):
+    if lhs == TOP:
+        return rhs
+    if rhs == TOP or lhs == rhs:
+        return lhs
+    return BOTTOM
+
+
+class SSAForm:
+
+    def __init__(self, graph: ControlFlowGraph):
+        self.graph = graph
+        # SSA name -> the variable it versions
+        self.origin = {}  # type: Dict[Token, Token]
+        self.definitions = {}  # type: Dict[Token, TacInstruction]
+        self.users = defaultdict(list)  # type: defaultdict
+        self.labels = {block.instructions[0].label: block
+                       for block in graph.blocks
+                       if block.instructions and
+                       isinstance(block.instructions[0], TacLabel)}
+        self.insert_phis()
+        self.rename()
+
+    def dominance_frontiers(self) -> Dict[BasicBlock, set]:
+        idom = self.graph.analysis(immediate_dominators)
+        frontiers = {block: set() for block in idom}  # type: dict
+        for block in idom:
+            predecessors = [pred for pred in block.predecessors
+                            if pred in idom]
+            if len(set(predecessors)) < 2:
+                continue
+            for runner in predecessors:
+                while runner is not idom[block]:
+                    frontiers[runner].add(block)
+                    runner = idom[runner]
+        return frontiers
+
+    def insert_phis(self):
+        """
+        Places phis on the iterated dominance frontiers of the blocks
+        writing each variable read in more than one block (semi-pruned)
+        """
+        frontiers = self.dominance_frontiers()
+        nonlocal_vars = set()
+        sites = defaultdict(set)  # type: defaultdict
+        for block in frontiers:
+            written = set()
+            for tac in block.instructions:
+                for var in tac.uses:
+                    if is_variable(var) and var not in written:
+                        nonlocal_vars.add(var)
+                if is_variable(tac.defines):
+                    written.add(tac.defines)
+                    sites[tac.defines].add(block)
+        self.renamed = set(sites)
+
+        phis = defaultdict(list)  # type: defaultdict
+        for var in nonlocal_vars & self.renamed:
+            worklist = list(sites[var])
+            placed = set()
+            while worklist:
+                for block in frontiers[worklist.pop()]:
+                    if block not in placed:
+                        placed.add(block)
+                        phis[block].append(TacPhi(var))
+                        if block not in sites[var]:
+                            worklist.append(block)
+
+        for block, block_phis in phis.items():
+            head = block.instructions[:1]
+            if head and not isinstance(head[0], (TacLabel, TacStartFunc)):
+                head = []
+            block.instructions[len(head):len(head)] = block_phis
+
+    def rename(self):
+        """Gives each definition a new name, walking the dominator tree"""
+        tree = self.graph.analysis(dominator_tree)
+        versions = defaultdict(int)  # type: defaultdict
+        stacks = defaultdict(list)  # type: defaultdict
+
+        def current(var):
+            return stacks[var][-1] if stacks[var] else var
+
+        walk = [(self.graph.entry, False)]
+        while walk:
+            block, leaving = walk.pop()
+            if leaving:
+                for tac in block.instructions:
+                    if tac.defines in self.origin:
+                        stacks[self.origin[tac.defines]].pop()
+                continue
+
+            for tac in block.instructions:
+                if not isinstance(tac, TacPhi):
+                    for field in tac.reads:
+                        name = current(getattr(tac, field))
+                        setattr(tac, field, name)
+                        self.users[name].append(tac)
+                var = tac.defines
+                if var in self.renamed:
+                    versions[var] += 1
+                    name = Token(f'{var}.{versions[var]}')
+                    setattr(tac, tac.writes, name)
+                    self.origin[name] = var
+                    self.definitions[name] = tac
+                    stacks[var].append(name)
+
+            for successor in block.successors:
+                for tac in successor.instructions:
+                    if isinstance(tac, TacPhi):
+                        name = current(tac.var)
+                        tac.args[block] = name
+                        self.users[name].append(tac)
+
+            walk.append((block, True))
+            walk.extend((child, False) for child in tree[block])
+
+    def value(self, values, tok):
+        if tok.is_constant:
+            return tok.val
+        if tok not in self.definitions:
+            # Parameters, and variables read before they are written
+            return BOTTOM
+        return values.get(tok, TOP)
+
+    def leave(self, values, reached) -> List[TacInstruction]:
+        """
+        Substitutes the constants sccp found, drops the blocks it never
+        reached and branches that are never taken, and restores the
+        original names
+        """
+        instructions = []
+        for block in self.graph.blocks:
+            for tac in block.instructions:
+                if isinstance(tac, TacPhi):
+                    continue
+                if block not in reached:
+                    if isinstance(tac, (TacStartFunc, TacEndFunc)):
+                        instructions.append(tac)
+                    continue
+                for field in tac.reads:
+                    name = getattr(tac, field)
+                    value = self.value(values, name)
+                    if isinstance(value, int):
+                        setattr(tac, field, value)
+                    else:
+                        setattr(tac, field, self.restore(name))
+                if tac.writes is not None:
+                    setattr(tac, tac.writes, self.restore(tac.defines))
+                if isinstance(tac, TacIfStatement) and \
+                        tac.pred.is_constant and tac.pred.val:
+                    continue
+                instructions.append(tac)
+        return instructions
+
+    def restore(self, tok):
+        return self.origin.get(tok, tok)
+
+
+def sccp(form: SSAForm):
+    """
+    Sparse conditional constant propagation, returns the lattice value of
+    each SSA name and the set of blocks that can run
+    """
+    graph = form.graph
+    values = {}  # type: dict
+    edges = set()  # type: set
+    reached = set()  # type: set
+    block_of = {id(tac): block for block in graph.blocks for tac in block}
+    flow = [(None, graph.entry)]
+    uses = []  # type: List[TacInstruction]
+
+    def lower(name, value):
+        value = meet(values.get(name, TOP), value)
+        if value != values.get(name, TOP):
+            values[name] = value
+            uses.extend(form.users[name])
+
+    def branch(tac, block):
+        pred = form.value(values, tac.pred)
+        target = form.labels[tac.label]
+        following = graph.blocks[block.index + 1] \
+            if block.index + 1 < len(graph.blocks) else None
+        taken = []
+        if pred == BOTTOM or pred == 0:
+            taken.append(target)
+        if following and (pred == BOTTOM or pred not in (TOP, 0)):
+            taken.append(following)
+        flow.extend((block, successor) for successor in taken)
+
+    def visit(tac, block):
+        if isinstance(tac, TacPhi):
+            value = TOP
+            for pred, name in tac.args.items():
+                if (pred, block) in edges:
+                    value = meet(value, form.value(values, name))
+            lower(tac.lhs, value)
+        elif isinstance(tac, TacIfStatement):
+            branch(tac, block)
+        elif tac.defines in form.definitions:
+            if tac.is_copy:
+                value = form.value(values, tac.rhs)
+            elif isinstance(tac, TacOperation):
+                lhs = form.value(values, tac.lhs)
+                rhs = form.value(values, tac.rhs)
+                if TOP in (lhs, rhs):
+                    value = TOP
+                elif BOTTOM in (lhs, rhs):
+                    value = BOTTOM
+                else:
+                    value = evaluate(tac.op.lexeme, lhs, rhs)
+                    value = BOTTOM if value is None else value
+            else:
+                value = BOTTOM
+            lower(tac.defines, value)
+
+    while flow or uses:
+        while flow:
+            pred, block = flow.pop()
+            if (pred, block) in edges:
+                continue
+            edges.add((pred, block))
+            if block in reached:
+                # Only the phis see the new edge
+                for tac in block.instructions:
+                    if isinstance(tac, TacPhi):
+                        visit(tac, block)
+                continue
+            reached.add(block)
+            for tac in block.instructions:
+                visit(tac, block)
+            last = block.instructions[-1] if block.instructions else None
+            if not isinstance(last, TacIfStatement):
+                flow.extend((block, successor)
+                            for successor in block.successors)
+        while uses:
+            tac = uses.pop()
+            block = block_of[id(tac)]
+            if block in reached:
+                visit(tac, block)
+    return values, reached
+
+
+def propagate_constants(tac_list) -> List[TacInstruction]:
+    """Runs sccp over each function of tac_list in SSA form"""
+    instructions = []  # type: List[TacInstruction]
+    for function in split_functions(tac_list):
+        form = SSAForm(ControlFlowGraph(function))
+        instructions.extend(form.leave(*sccp(form)))
+    return instructions
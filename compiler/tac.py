@@ -2,32 +2,53 @@ import sys
 from compiler.node import Node
 from compiler.token import Token
 from itertools import count
-from operator import add, eq, floordiv, ge, gt, le, lt, mod, mul, ne, sub
-from typing import List
+from operator import add, eq, ge, gt, le, lt, mul, ne, sub
+from typing import List, Optional, Tuple
 
 from attr import attrib, attrs
 
 # [TODO] Fix for the factorial example
 # [TODO] Implement if else statements
 
-tac_optimizations = []
+
+def divide(lhs, rhs):
+    """Integer division truncating towards zero, as MIPS div does"""
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+
+def remainder(lhs, rhs):
+    return lhs - rhs * divide(lhs, rhs)
+
 
 operators = {
-    '+': add, '-': sub, '*': mul, '%': mod, '/': floordiv,
+    '+': add, '-': sub, '*': mul, '%': remainder, '/': divide,
     '==': eq, '!=': ne, '>': gt, '<': lt, '>=': ge, '<=': le
 }
 
+
+def evaluate(op, lhs, rhs) -> Optional[int]:
+    """
+    Computes lhs op rhs as the generated MIPS would, or None if it can't be
+    worked out at compile time
+    """
+    # Leave division by zero to fail when the program runs
+    if op not in operators or (op in {'/', '%'} and rhs == 0):
+        return None
+    result = int(operators[op](lhs, rhs))
+    # Wrap to 32 bits like the registers
+    return (result + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+# Operators whose operands can be swapped
+COMMUTATIVE = {'+', '*', '==', '!='}
+
 mips_operators = {
     '+': 'add', '*': 'mul', '-': 'sub', '%': 'rem', '/': 'div', '==': 'seq',
     '!=': 'sne', '>': 'sgt', '>=': 'sge', '<': 'slt', '<=': 'sle',
 }
 
 
-def optimization(optimization_func):
-    tac_optimizations.append(optimization_func)
-    return optimization_func
-
-
 def tokenize(lexeme):
     """Converts a string to a Token"""
     if isinstance(lexeme, Token):
@@ -40,87 +61,55 @@ def tokenize(lexeme):
 
 class TacInstruction:
 
+    # Names of the fields an instruction reads and the one it writes
+    reads = ()  # type: Tuple[str, ...]
+    writes = None  # type: Optional[str]
+
+    # Instructions without side effects can be removed if nothing reads
+    # the value they write
+    is_pure = False
+
     def __setattr__(self, name, value):
         value = tokenize(value)
         super().__setattr__(name, value)
 
     @property
-    def is_assingment(self):
-        return self.op.lexeme == '=' and self.lhs.is_identifier
+    def uses(self) -> List[Token]:
+        return [getattr(self, field) for field in self.reads]
 
     @property
-    def has_branches(self):
-        return self.lhs and self.rhs
+    def defines(self) -> Optional[Token]:
+        return None if self.writes is None else getattr(self, self.writes)
 
-    @optimization
-    def transform_algebra(self):
-        if self.lhs.is_identifier:
-            # x + 0 -> x
-            if self.rhs.val == 0 and self.op.lexeme in {'+', '-'}:
-                self.rhs, self.lhs = self.lhs, self.reg
-                self.reg, self.op = None, '='
-                return True
-            # // x * 1 -> x or  x / 1 -> x
-            if self.rhs.val == 1 and self.op.lexeme in {'*', '/'}:
-                self.rhs, self.lhs = self.lhs, self.reg
-                self.reg, self.op = None, '='
-                return True
-        elif self.rhs.is_identifier:
-            # // 1 * x -> x
-            if self.lhs.val == 1 and self.op.lexeme == '*':
-                self.lhs, self.reg, self.op = self.reg, None, '='
-                return True
+    @property
+    def is_copy(self):
+        """True for instructions of the form a := b"""
         return False
 
-    @optimization
-    def fold_constants(self):
-        if self.lhs.is_constant and self.rhs.is_constant:
-            if self.op.lexeme in operators.keys():
-                lhs, rhs, reg = self.lhs.val, self.rhs.val, self.reg
-                result = operators.get(self.op.lexeme)(lhs, rhs)
-                if isinstance(result, bool):
-                    result = int(result)
-                self.lhs, self.rhs, self.reg, self.op = reg, result, None, '='
-                return True
-        return False
+    @property
+    def is_assingment(self):
+        return self.is_copy and self.lhs.is_identifier
 
-    @optimization
-    def strength_reduce(self):
-        # x * 2 -> x + x
-        if self.lhs.is_identifier and self.rhs.val == 2:
-            if self.op.lexeme == "*":
-                self.op, self.rhs = '+', self.lhs
-                return True
-        # 2 * x -> x + x
-        elif self.rhs.is_identifier and self.lhs.val == 2:
-            if self.op.lexeme == '*':
-                self.op, self.lhs = '+', self.rhs
-                return True
-        return False
+    @property
+    def has_branches(self):
+        return self.lhs and self.rhs
 
-    def optimize(self):
-        if isinstance(self, TacOperation):
-            return any(map(lambda func: func(self), tac_optimizations))
+    def optimize(self, rules=None, fired=None) -> bool:
+        """Applies the first peephole rule matching this instruction"""
+        if rules is None:
+            from compiler.peephole import DEFAULT_RULES as rules
+        return rules.apply(self, fired)
 
 
 @attrs
 class TacStartFunc(TacInstruction):
     label = attrib()
 
-    def to_mips(self, _) -> List[str]:
-        return [
-            f"{self.label.lexeme}:",
-            # Create a frame of fixed size
-            "li $a0, 48",
-            # Load the sbrk syscall
-            "li $v0, 9",
-            "syscall",
-            "sw $fp, 0($v0)",
-            # Move old frame pointer to new framepointer
-            "move $fp, $v0",
-            # Record return address
-            "sw $ra, 4($v0)"
-        ]
+    def to_mips(self, env) -> List[str]:
+        return [f"{self.label.lexeme}:", *env.prologue()]
+
+    def to_x86(self, env) -> List[str]:
+        return [f'cmm_{self.label.lexeme}:', *env.prologue()]
 
     def __str__(self) -> str:
         return f'func {self.label}'
@@ -131,10 +120,11 @@ class TacParamCount(TacInstruction):
     count = attrib()
 
     def to_mips(self, _) -> List[str]:
-        return [
-            '# Increment stack pointer by the number of args',
-            f'addi $sp, $sp {self.count.val * 4}'
-        ]
+        # Each parameter is read from where the caller passed it
+        return []
+
+    def to_x86(self, _) -> List[str]:
+        return []
 
     def __str__(self) -> str:
         return f'params {self.count}'
@@ -144,8 +134,11 @@ class TacParamCount(TacInstruction):
 class TacEndFunc(TacInstruction):
     label = attrib()
 
-    def to_mips(self, _) -> List[str]:
-        return [f'nop']
+    def to_mips(self, env) -> List[str]:
+        return env.epilogue()
+
+    def to_x86(self, env) -> List[str]:
+        return env.epilogue()
 
     def __str__(self) -> str:
         return f'endfunc'
@@ -157,15 +150,13 @@ class TacParam(TacInstruction):
     ptype = attrib()
     pname = attrib()
 
+    writes = 'pname'
+
     def to_mips(self, env):
-        # Assign arguments
-        arg = env.get_next_register(env.arguments)
-        env[self.pname.lexeme] = arg
-        return [
-            '# Count down each time',
-            'addi $sp, $sp, -4',
-            f'lw, {arg.to_mips}, 0($sp)',
-        ]
+        return env.param(self.pname)
+
+    def to_x86(self, env):
+        return env.param(self.pname)
 
     def __str__(self) -> str:
         return f'param {self.ptype} {self.pname}'
@@ -176,16 +167,21 @@ class TacCall(TacInstruction):
     reg = attrib()
     label = attrib()
 
+    writes = 'reg'
+
     def to_mips(self, env):
-        temp = env.get_next_register(env.temporaries)
-        env[self.reg.lexeme] = temp
+        # The callee may overwrite caller saved registers
+        saves = env.caller_saves(self)
         return [
+            *(f'sw {reg}, {env.slot(reg)}' for reg in saves),
             f'jal {self.label}',
-            f'lw $fp, 0($fp)',
-            f'lw $ra, 4($fp)',
-            f'move {temp.to_mips}, $v1'
+            *(f'lw {reg}, {env.slot(reg)}' for reg in saves),
+            *env.store(self.reg, '$v1'),
         ]
 
+    def to_x86(self, env):
+        return env.call(self)
+
     def __str__(self) -> str:
         return f'{self.reg} := call {self.label}'
 
@@ -194,17 +190,13 @@ class TacCall(TacInstruction):
 class TacReturn(TacInstruction):
     lhs = attrib()
 
+    reads = ('lhs',)
+
     def to_mips(self, env):
-        if self.lhs.is_constant:
-            return [
-                f'li $v1, {self.lhs.to_mips}',
-                f'jr $ra'
-            ]
-        lhs = env.allocate_register(self.lhs)
-        return [
-            f'move $v1, {lhs.to_mips}',
-            f'jr $ra'
-        ]
+        return [*env.load('$v1', self.lhs), *env.epilogue()]
+
+    def to_x86(self, env):
+        return [*env.move('%eax', env.operand(self.lhs)), *env.epilogue()]
 
     def __str__(self) -> str:
         return f'return {self.lhs}'
@@ -217,6 +209,9 @@ class TacLabel(TacInstruction):
     def to_mips(self, _) -> List[str]:
         return [f'{self.label}:']
 
+    def to_x86(self, _) -> List[str]:
+        return [f'.{self.label}:']
+
     def __str__(self) -> str:
         return self.label.lexeme
 
@@ -226,9 +221,21 @@ class TacIfStatement(TacInstruction):
     pred = attrib()
     label = attrib()
 
+    reads = ('pred',)
+
     def to_mips(self, env) -> List[str]:
-        pred = env.allocate_register(self.pred)
-        return [f"beqz {pred.to_mips}, {self.label}"]
+        # Folding can leave a constant predicate
+        if self.pred.is_constant:
+            return [] if self.pred.val else [f"j {self.label}"]
+        if id(self) in env.fused:
+            return env.branch(self)
+        pred, load = env.read(self.pred, '$v0')
+        return [*load, f"beqz {pred}, {self.label}"]
+
+    def to_x86(self, env) -> List[str]:
+        if self.pred.is_constant:
+            return [] if self.pred.val else [f'jmp .{self.label}']
+        return [f'cmpl $0, {env.operand(self.pred)}', f'je .{self.label}']
 
     def __str__(self) -> str:
         return f'!if {self.pred} goto {self.label}'
@@ -238,11 +245,11 @@ class TacIfStatement(TacInstruction):
 class TacPrint(TacInstruction):
     lhs = attrib()
 
+    reads = ('lhs',)
+
     def to_mips(self, env) -> List[str]:
-        reg = env.allocate_register(self.lhs)
-        load, *_ = env.mips_assign(Token('$a0'), reg)
         return [
-            load,
+            *env.load('$a0', self.lhs),
             "li $v0, 1",
             "syscall",
             "addi $a0, $0, 0xA",
@@ -250,6 +257,9 @@ class TacPrint(TacInstruction):
             "syscall",
         ]
 
+    def to_x86(self, env) -> List[str]:
+        return [f'movl {env.operand(self.lhs)}, %edi', 'call mmcc_print']
+
     def __str__(self) -> str:
         return f'print {self.lhs}'
 
@@ -261,15 +271,37 @@ class TacOperation(TacInstruction):
     lhs = attrib()
     rhs = attrib()
 
+    is_pure = True
+
+    @property
+    def is_copy(self):
+        # The algebraic optimizations rewrite an operation into lhs = rhs
+        return self.op.lexeme == '='
+
+    @property
+    def reads(self):
+        return ('rhs',) if self.is_copy else ('lhs', 'rhs')
+
+    @property
+    def writes(self):
+        return 'lhs' if self.is_copy else 'reg'
+
     def to_mips(self, env) -> List[str]:
-        op = mips_operators[self.op.lexeme]
-        lhs, lhs_assingment = env.resolve_mapping(self.lhs)
-        rhs, rhs_assingment = env.resolve_mapping(self.rhs)
-        temp = env.assign_temp(self.reg)
-        operation = f'{op} {temp.to_mips}, {lhs.to_mips}, {rhs.to_mips}'
-        return list(filter(None, [lhs_assingment, rhs_assingment, operation]))
+        if self.is_copy:
+            return env.assign(self.lhs, self.rhs)
+        # A comparison is left to the branch covering it
+        if id(self) in env.covered:
+            return []
+        return env.operation(self.op.lexeme, self.reg, self.lhs, self.rhs)
+
+    def to_x86(self, env) -> List[str]:
+        if self.is_copy:
+            return env.assign(self.lhs, self.rhs)
+        return env.operation(self.op.lexeme, self.reg, self.lhs, self.rhs)
 
     def __str__(self) -> str:
+        if self.is_copy:
+            return f'{self.lhs} := {self.rhs}'
         return f'{self.reg} := {self.lhs} {self.op} {self.rhs}'
 
 
@@ -278,11 +310,19 @@ class TacAssingment(TacInstruction):
     lhs = attrib()
     rhs = attrib()
 
+    reads = ('rhs',)
+    writes = 'lhs'
+    is_pure = True
+
+    @property
+    def is_copy(self):
+        return True
+
     def to_mips(self, env) -> List[str]:
-        return env.mips_assign(
-            env.allocate_register(self.lhs),
-            env.allocate_register(self.rhs)
-        )
+        return env.assign(self.lhs, self.rhs)
+
+    def to_x86(self, env) -> List[str]:
+        return env.assign(self.lhs, self.rhs)
 
     def __str__(self) -> str:
         return f'{self.lhs} := {self.rhs}'
@@ -292,50 +332,141 @@ class TacAssingment(TacInstruction):
 class TacArg(TacInstruction):
     arg = attrib()
 
+    reads = ('arg',)
+
     def to_mips(self, env):
-        if self.arg.lexeme in env._mappings:
-            reg = env[self.arg.lexeme]
-            return [
-                'addi $sp, $sp, -4',
-                f'sw {reg.to_mips}, 0($sp)'
-            ]
-        else:
-            reg = env.assign_temp(self.arg)
-            return [
-                f'li {reg.to_mips}, {self.arg.to_mips}',
-                'addi $sp, $sp, -4',
-                f'sw ${reg}, 0($sp)'
-            ]
+        return env.argument(self)
+
+    def to_x86(self, env):
+        return env.argument(self)
 
     def __str__(self) -> str:
         return f'arg {self.arg}'
 
 
+class ExpressionDag:
+    """
+    Hash-conses the operations of one function as they are built: an
+    operation already computed on operands holding the same values reuses
+    the earlier temporary, and operations the peephole rules reduce to an
+    operand are worked out without emitting anything
+
+    Assigning a variable gives it a new version, so the operations keyed on
+    the old one no longer match, and records the value when it is constant
+    """
+
+    def __init__(self, rules=None, fired=None):
+        if rules is None:
+            from compiler.peephole import DEFAULT_RULES as rules
+        self.rules = rules
+        # Counts the rules that fire, when a Counter
+        self.fired = fired
+        self.nodes = {}  # type: dict
+        self.versions = {}  # type: dict
+        self.constants = {}  # type: dict
+        self.temporaries = set()  # type: set
+        # Undo logs of the nodes added and variables assigned, for the
+        # code an if statement may skip
+        self.added = []  # type: list
+        self.assigned = []  # type: list
+
+    def value(self, tok):
+        return self.constants.get(tok, tok)
+
+    def key(self, tok):
+        return tok, self.versions.get(tok, 0)
+
+    def simplify(self, op, lhs, rhs):
+        """
+        Applies the peephole rules until none match, returns the operand the
+        operation reduces to or a simpler operation
+        """
+        simplified = (op, lhs, rhs)
+        while isinstance(simplified, tuple):
+            match = self.rules.simplify(*simplified, self.fired)
+            if match is None:
+                break
+            simplified = match[1]
+        return simplified
+
+    def operation(self, env, op, lhs, rhs) -> Token:
+        simplified = self.simplify(op.lexeme, self.value(lhs),
+                                   self.value(rhs))
+        if not isinstance(simplified, tuple):
+            simplified = tokenize(simplified)
+            if simplified.is_constant or simplified in self.temporaries:
+                return simplified
+            # A variable may be assigned before the result is read
+            temp = next(env.temporaries)
+            env.tac_list.append(TacAssingment(temp, simplified))
+            return temp
+
+        op, lhs, rhs = simplified
+        lhs, rhs = tokenize(lhs), tokenize(rhs)
+        if op in COMMUTATIVE:
+            key = (op, frozenset([self.key(lhs), self.key(rhs)]))
+        else:
+            key = (op, self.key(lhs), self.key(rhs))
+        temp = self.nodes.get(key)
+        if temp is None:
+            temp = self.nodes[key] = next(env.temporaries)
+            self.temporaries.add(temp)
+            self.added.append(key)
+            env.tac_list.append(TacOperation(temp, op, lhs, rhs))
+        return temp
+
+    def assign(self, var, value):
+        self.versions[var] = self.versions.get(var, 0) + 1
+        self.assigned.append(var)
+        if value.is_constant:
+            self.constants[var] = value
+        else:
+            self.constants.pop(var, None)
+
+    def save(self):
+        return len(self.added), len(self.assigned)
+
+    def restore(self, saved):
+        """
+        Forgets what was learnt since saved, at a label the code in between
+        may have been skipped
+        """
+        added, assigned = saved
+        for key in self.added[added:]:
+            del self.nodes[key]
+        for var in self.assigned[assigned:]:
+            self.constants.pop(var, None)
+        del self.added[added:]
+        del self.assigned[assigned:]
+
+
 class TacEnv:
 
-    def __init__(self):
+    def __init__(self, label_prefix='', functions=(), dag=False, rules=None,
+                 fired=None):
         self.temporaries = (Token(f't{x}') for x in count(0))
-        self.labels = (Token(f'L{x}') for x in count(0))
+        self.labels = (Token(f'{label_prefix}L{x}') for x in count(0))
         self.tac_list = []  # type: list
+        # Functions that may be called, and the ones that are
+        self.functions = set(functions)
+        self.calls = set()  # type: set
+        # Builds operations through an ExpressionDag when set, simplifying
+        # them with rules, a peephole RuleSet, and counting those that fire
+        # in fired
+        self.dag = ExpressionDag(rules, fired) if dag else None
 
 
-def build_tac(node):
-    environment = TacEnv()
+def build_tac(node, dag=False, rules=None, fired=None):
+    environment = TacEnv(dag=dag, rules=rules, fired=fired)
     recursive_build_tac(node, environment)
     return environment.tac_list
 
 
-def check_if_defined(tac_list, func_name, tac_type):
-    # Find matching Tac instructions
-    matches = (t for t in tac_list if isinstance(t, tac_type))
-    if tac_type == TacStartFunc:
-        fn_names = (fn.label.lexeme for fn in matches)
-        return func_name in fn_names
-
-
 def interpret_operator(node, env):
     lhs = recursive_build_tac(node.lhs, env)
     rhs = recursive_build_tac(node.rhs, env)
+    if env.dag:
+        return env.dag.operation(env, node.tok, lhs, rhs)
     temp = next(env.temporaries)
     env.tac_list.append(TacOperation(temp, node.tok, lhs, rhs))
     return temp
@@ -343,6 +474,9 @@ def interpret_operator(node, env):
 
 def interpret_function(node, env):
     func_name = node.lhs.rhs.lhs.tok.lexeme
+    env.functions.add(func_name)
+    if env.dag:
+        env.dag = ExpressionDag(env.dag.rules, env.dag.fired)
     env.tac_list.append(TacStartFunc(func_name))
 
     params = node.func_params
@@ -364,15 +498,18 @@ def interpret_apply(node, env):
         return rhs
     else:
         if node.rhs is not None:
-            func_args = list(node.rhs.func_args)
-            for arg in func_args:
-                val = recursive_build_tac(arg, env)
+            # Evaluate every argument before passing any, so calls in the
+            # arguments don't come between a call's args and the call
+            func_args = [recursive_build_tac(arg, env)
+                         for arg in node.rhs.func_args]
+            for val in func_args:
                 env.tac_list.append(TacArg(val))
         temp = next(env.temporaries)
         func_name = node.lhs.tok.lexeme
         # Check if the function is undefined
-        if not check_if_defined(env.tac_list, func_name, TacStartFunc):
+        if func_name not in env.functions:
             sys.exit(f"Error: Function '{func_name}' undefined")
+        env.calls.add(func_name)
         env.tac_list.append(TacCall(temp, func_name))
         return temp
 
@@ -382,7 +519,10 @@ def interpret_if(node, env):
     pred = recursive_build_tac(node.lhs, env)
     env.tac_list.append(TacIfStatement(pred.lexeme, label))
 
+    saved = env.dag.save() if env.dag else None
     recursive_build_tac(node.rhs, env)
+    if env.dag:
+        env.dag.restore(saved)
 
     instruction = TacLabel(label)
     env.tac_list.append(instruction)
@@ -392,7 +532,11 @@ def interpret_if(node, env):
 
 def interpret_assignment(node, env):
     rhs = recursive_build_tac(node.rhs, env)
-    env.tac_list.append(TacAssingment(node.lhs.tok, rhs))
+    value = rhs
+    if env.dag:
+        value = env.dag.value(rhs)
+        env.dag.assign(node.lhs.tok, value)
+    env.tac_list.append(TacAssingment(node.lhs.tok, value))
     return rhs
 
 
@@ -417,6 +561,9 @@ def recursive_build_tac(node: Node, env: TacEnv):
         return interpret_case(node, env)
     elif node.tok.lexeme in operators.keys():
         return interpret_operator(node, env)
+    elif node.tok.lexeme == '???':
+        # mycc prints every unary operator as '???', so which one is lost
+        sys.exit("Error: unary operators aren't supported with --mycc")
     elif node.is_leaf:
         return node.tok
     else:
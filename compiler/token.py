@@ -1,46 +1,55 @@
-from re import match
+import re
+from threading import Lock
+from weakref import WeakValueDictionary
 
+register_regex = re.compile(r'(a|t|s)\d+')
+temporary_regex = re.compile(r't\d+')
+saved_regex = re.compile(r's\d+')
+arg_regex = re.compile(r'a\d+')
+constant_regex = re.compile(r'-?\d+')
 
-class Token:
-
-    def __init__(self, lexeme):
-        self.lexeme = lexeme
-
-    @property
-    def val(self):
-        if self.lexeme.isdigit():
-            return int(self.lexeme)
-        return None
-
-    @property
-    def is_register(self):
-        return bool(match("(a|t|s)\d+", self.lexeme))
-
-    @property
-    def is_temporary(self):
-        return match("t\d+", self.lexeme)
 
-    @property
-    def is_saved(self):
-        return match("s\d+", self.lexeme)
-
-    @property
-    def is_arg(self):
-        return match("a\d+", self.lexeme)
-
-    @property
-    def is_identifier(self):
-        return self.lexeme.isalpha()
-
-    @property
-    def is_constant(self):
-        return self.lexeme.isdigit()
-
-    @property
-    def to_mips(self):
-        if self.is_register:
-            return f'${self.lexeme}'
-        return str(self)
+class Token:
+    """
+    An interned lexeme: identical lexemes share one Token, so equality is an
+    identity check, and its classification is worked out once on creation
+    """
+
+    __slots__ = (
+        'lexeme', 'val', 'is_register', 'is_temporary', 'is_saved',
+        'is_arg', 'is_identifier', 'is_constant', 'to_mips', '__weakref__',
+    )
+
+    _interned = WeakValueDictionary()  # type: WeakValueDictionary
+    _lock = Lock()
+
+    def __new__(cls, lexeme):
+        tok = cls._interned.get(lexeme)
+        if tok is not None:
+            return tok
+
+        tok = super().__new__(cls)
+        tok.lexeme = lexeme
+        # Folding can produce negative constants
+        tok.is_constant = bool(constant_regex.fullmatch(lexeme))
+        tok.val = int(lexeme) if tok.is_constant else None
+        tok.is_register = bool(register_regex.match(lexeme))
+        tok.is_temporary = bool(temporary_regex.match(lexeme))
+        tok.is_saved = bool(saved_regex.match(lexeme))
+        tok.is_arg = bool(arg_regex.match(lexeme))
+        tok.is_identifier = lexeme.isalpha()
+        tok.to_mips = f'${lexeme}' if tok.is_register else lexeme
+
+        # Another thread may have interned the lexeme since the lookup
+        with cls._lock:
+            interned = cls._interned.get(lexeme)
+            if interned is not None:
+                return interned
+            cls._interned[lexeme] = tok
+        return tok
+
+    def __reduce__(self):
+        return Token, (self.lexeme,)
 
     def __repr__(self):
         return f'<Token(lexeme={repr(self.lexeme)})>'
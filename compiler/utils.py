@@ -1,13 +1,6 @@
 from graphviz import Digraph
 
 
-def line_count(f):
-    """Returns the number of lines in a file"""
-    for i, l in enumerate(f):
-        pass
-    return i + 1
-
-
 def draw_graph(head):
     dot = Digraph(comment='AST')
     dot = build_graph(dot, head)
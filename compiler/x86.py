@@ -0,0 +1,268 @@
+"""
+Lowers TAC to x86-64 assembly for the System V ABI, and assembles it into
+an executable with the local toolchain
+
+Values are 32 bit like on MIPS, so arithmetic is done on the low halves
+of registers and wraps the same way. Functions follow the System V calling
+convention: the first six arguments are passed in registers and the rest
+on the stack, the result is returned in %eax, %rbx and %r12-%r15 are
+callee saved and %r10/%r11 caller saved. Those seven are allocated to
+variables, %eax, %ecx and %edx are left for loading operands, division and
+results, and the argument registers only hold arguments.
+
+C-- functions are prefixed so they can't clash with the C library, main
+calls cmm_main and print calls printf through a helper that saves the
+registers printf may overwrite. Unlike MIPS, dividing the smallest int by
+-1 traps.
+"""
+import sys
+from subprocess import PIPE, run
+from typing import Dict, List
+
+from compiler.cfg import split_functions
+from compiler.regalloc import Allocation, RegisterFile, allocate
+from compiler.tac import (TacArg, TacCall, TacEndFunc, TacInstruction,
+                          TacParam, TacReturn)
+
+X86_REGISTERS = RegisterFile(('%r10', '%r11'),
+                             ('%rbx', '%r12', '%r13', '%r14', '%r15'))
+ARGUMENT_REGISTERS = ('%edi', '%esi', '%edx', '%ecx', '%r8d', '%r9d')
+# The low 32 bits of each allocated register
+DWORDS = {
+    '%rbx': '%ebx', '%r10': '%r10d', '%r11': '%r11d', '%r12': '%r12d',
+    '%r13': '%r13d', '%r14': '%r14d', '%r15': '%r15d',
+}
+# Caller saved registers the print helper saves around printf
+PRINT_SAVES = ('%rcx', '%rdx', '%rsi', '%rdi', '%r8', '%r9', '%r10', '%r11')
+
+ENTRY = [
+    '.text',
+    '.globl main',
+    'main:',
+    'pushq %rbp',
+    'movq %rsp, %rbp',
+    'call cmm_main',
+    'xorl %eax, %eax',
+    'popq %rbp',
+    'ret',
+    'mmcc_print:',
+    'pushq %rbp',
+    'movq %rsp, %rbp',
+    *(f'pushq {reg}' for reg in PRINT_SAVES),
+    # Our frames aren't kept aligned, printf needs them to be
+    'andq $-16, %rsp',
+    'movl %edi, %esi',
+    'leaq .Lformat(%rip), %rdi',
+    'xorl %eax, %eax',
+    'call printf@PLT',
+    f'leaq -{8 * len(PRINT_SAVES)}(%rbp), %rsp',
+    *(f'popq {reg}' for reg in reversed(PRINT_SAVES)),
+    'popq %rbp',
+    'ret',
+]
+
+EXIT = [
+    '.section .rodata',
+    '.Lformat:',
+    '.string "%d\\n"',
+    '.section .note.GNU-stack,"",@progbits',
+]
+
+ARITHMETIC = {'+': 'addl', '-': 'subl', '*': 'imull'}
+COMPARISONS = {
+    '==': 'sete', '!=': 'setne', '>': 'setg', '>=': 'setge', '<': 'setl',
+    '<=': 'setle',
+}
+
+
+def is_memory(operand) -> bool:
+    return operand.endswith(')')
+
+
+class X86Data:
+    """
+    Where the register allocator put each variable of a single function,
+    and its frame below %rbp: the callee saved registers it uses, the
+    caller saved registers it keeps across calls and its spilled variables.
+    Arguments after the ones passed in registers are above the return
+    address, and spilled parameters passed there stay there
+    """
+
+    def __init__(self, allocation: Allocation,
+                 function: List[TacInstruction] = ()):
+        self.allocation = allocation
+        self.registers = {var: DWORDS[register] for var, register
+                          in allocation.registers.items()}
+        self.saved_registers = allocation.callee_saved
+        self.params = [tac.pname for tac in function
+                       if isinstance(tac, TacParam)]
+        stack_params = self.params[len(ARGUMENT_REGISTERS):]
+        spilled = [var for var in allocation.spilled
+                   if var not in stack_params]
+        slots = [*self.saved_registers, *allocation.caller_saved, *spilled]
+        self.offsets = {slot: -8 * (index + 1)
+                        for index, slot in enumerate(slots)}
+        self.frame_size = 8 * len(slots)
+        for index, param in enumerate(stack_params):
+            self.offsets[param] = 16 + 8 * index
+
+        # The position of each arg among its call's and how many that call
+        # has, they come just before the call
+        self.arg_index = {}  # type: Dict[int, int]
+        self.arg_count = {}  # type: Dict[int, int]
+        args = []  # type: List[TacInstruction]
+        for tac in function:
+            if isinstance(tac, TacArg):
+                self.arg_index[id(tac)] = len(args)
+                args.append(tac)
+                continue
+            if isinstance(tac, TacCall):
+                for arg in args:
+                    self.arg_count[id(arg)] = len(args)
+                self.arg_count[id(tac)] = len(args)
+            args = []
+
+    def slot(self, key) -> str:
+        return f'{self.offsets[key]}(%rbp)'
+
+    def operand(self, tok) -> str:
+        """An immediate, register or memory operand holding tok"""
+        if tok.is_constant:
+            return f'${tok}'
+        register = self.registers.get(tok)
+        return register if register is not None else self.slot(tok)
+
+    def move(self, dest, src) -> List[str]:
+        """Moves operand src to operand dest"""
+        if dest == src:
+            return []
+        if is_memory(dest) and is_memory(src):
+            return [f'movl {src}, %eax', f'movl %eax, {dest}']
+        return [f'movl {src}, {dest}']
+
+    def assign(self, dest, src) -> List[str]:
+        return self.move(self.operand(dest), self.operand(src))
+
+    def prologue(self) -> List[str]:
+        return [
+            'pushq %rbp',
+            'movq %rsp, %rbp',
+            *([f'subq ${self.frame_size}, %rsp'] if self.frame_size else []),
+            *(f'movq {reg}, {self.slot(reg)}' for reg in self.saved_registers),
+        ]
+
+    def epilogue(self) -> List[str]:
+        return [
+            *(f'movq {self.slot(reg)}, {reg}' for reg in self.saved_registers),
+            'leave',
+            'ret',
+        ]
+
+    def operation(self, op, dest, lhs, rhs) -> List[str]:
+        dest, lhs, rhs = map(self.operand, (dest, lhs, rhs))
+        if op in ('/', '%'):
+            instructions = [f'movl {lhs}, %eax', 'cltd']
+            if rhs.startswith('$'):
+                instructions.append(f'movl {rhs}, %ecx')
+                rhs = '%ecx'
+            result = '%eax' if op == '/' else '%edx'
+            return [*instructions, f'idivl {rhs}', *self.move(dest, result)]
+        if op in COMPARISONS:
+            instructions = []
+            if lhs.startswith('$') or is_memory(lhs) and is_memory(rhs):
+                instructions = self.move('%eax', lhs)
+                lhs = '%eax'
+            result = '%eax' if is_memory(dest) else dest
+            return [*instructions, f'cmpl {rhs}, {lhs}',
+                    f'{COMPARISONS[op]} %al', f'movzbl %al, {result}',
+                    *self.move(dest, result)]
+        instruction = ARITHMETIC[op]
+        if dest == rhs and op != '-' and not is_memory(dest):
+            # dest already holds one side of a commutative operation
+            return [f'{instruction} {lhs}, {dest}']
+        result = dest if dest != rhs and not is_memory(dest) else '%eax'
+        return [*self.move(result, lhs), f'{instruction} {rhs}, {result}',
+                *self.move(dest, result)]
+
+    def param(self, pname) -> List[str]:
+        """Moves a parameter to where the allocator put it"""
+        live_range = self.allocation.liveness.ranges.get(pname)
+        if live_range is None or live_range.start == live_range.end:
+            # Never read
+            return []
+        index = self.params.index(pname)
+        if index < len(ARGUMENT_REGISTERS):
+            return self.move(self.operand(pname), ARGUMENT_REGISTERS[index])
+        # A spilled parameter is left in its argument slot
+        register = self.registers.get(pname)
+        if register is None:
+            return []
+        return [f'movl {self.slot(pname)}, {register}']
+
+    def argument(self, arg) -> List[str]:
+        """
+        Passes the value of arg, a TacArg, in a register or in the space
+        made for the call's stack arguments by its first arg
+        """
+        index, count = self.arg_index[id(arg)], self.arg_count[id(arg)]
+        stacked = count - len(ARGUMENT_REGISTERS)
+        instructions = []
+        if index == 0 and stacked > 0:
+            instructions.append(f'subq ${8 * stacked}, %rsp')
+        value = self.operand(arg.arg)
+        if index < len(ARGUMENT_REGISTERS):
+            return [*instructions, *self.move(ARGUMENT_REGISTERS[index],
+                                              value)]
+        position = f'{8 * (index - len(ARGUMENT_REGISTERS))}(%rsp)'
+        return [*instructions, *self.move(position, value)]
+
+    def call(self, call) -> List[str]:
+        saves = self.allocation.caller_saves(call)
+        stacked = self.arg_count[id(call)] - len(ARGUMENT_REGISTERS)
+        return [
+            *(f'movq {reg}, {self.slot(reg)}' for reg in saves),
+            f'call cmm_{call.label}',
+            *([f'addq ${8 * stacked}, %rsp'] if stacked > 0 else []),
+            *(f'movq {self.slot(reg)}, {reg}' for reg in saves),
+            *self.move(self.operand(call.reg), '%eax'),
+        ]
+
+
+def build_function_x86(function: List[TacInstruction],
+                       allocator='linear') -> List[str]:
+    function = list(function)
+    env = X86Data(allocate(function, allocator, X86_REGISTERS), function)
+
+    instructions = []
+    previous = None
+    for tac in function:
+        # Only a function that doesn't end in a return needs an epilogue at
+        # its end
+        if not (isinstance(tac, TacEndFunc) and
+                isinstance(previous, TacReturn)):
+            instructions.extend(tac.to_x86(env))
+        previous = tac
+    return instructions
+
+
+def build_x86(tac_list: List[TacInstruction],
+              allocator='linear') -> List[str]:
+
+    instructions = list(ENTRY)
+
+    for function in split_functions(tac_list):
+        instructions.extend(build_function_x86(function, allocator))
+
+    instructions.extend(EXIT)
+
+    return instructions
+
+
+def assemble(instructions: List[str], out):
+    """Assembles and links x86-64 instructions into the executable out"""
+    source = ''.join(line + '\n' for line in instructions)
+    result = run(['gcc', '-x', 'assembler', '-', '-o', out],
+                 input=source, stdout=PIPE, stderr=PIPE,
+                 universal_newlines=True)
+    if result.returncode:
+        sys.exit(f'Error: assembling failed\n{result.stderr}')
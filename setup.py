@@ -11,7 +11,8 @@ setup(
     license='MIT',
     entry_points={
         'console_scripts': [
-            'mmcc=compiler.compile:main'
+            'mmcc=compiler.compile:main',
+            'mmcc-client=compiler.client:main',
         ]
     },
     include_package_data=True,
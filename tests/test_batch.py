@@ -0,0 +1,20 @@
+from os import path
+
+from compiler.batch import build, find_sources
+from compiler.compile import compile_source, make_program
+
+
+def test_build_examples(tmp_path):
+    sources = list(find_sources(['examples']))
+    results = {r.src: r for r in build(sources, str(tmp_path), jobs=2)}
+    assert set(results) == set(sources)
+
+    failed = results['examples/func_undefined.cmm']
+    assert failed.error == "Error: Function 'fail' undefined"
+    assert not path.exists(failed.out)
+
+    built = results['examples/func.cmm']
+    assert built.error is None
+    assert built.out == str(tmp_path / 'func.out')
+    with open('examples/func.cmm') as src, open(built.out) as out:
+        assert out.read() == make_program(compile_source(src.read()))
@@ -0,0 +1,62 @@
+import sys
+from os import unlink, utime
+
+import pytest
+from compiler import cache as cache_module
+from compiler.cache import Cache
+from compiler.compile import compile_source, parse_args
+
+SOURCE = 'int main() {\n  print(2 + 3);\n  return 0;\n}\n'
+
+
+def test_cache_hit(tmp_path):
+    cache = Cache(str(tmp_path), store_tac=True)
+    mips = compile_source(SOURCE, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert compile_source(SOURCE, cache=cache) == mips
+    assert (cache.hits, cache.misses) == (1, 1)
+    entry = cache.get(cache.key(SOURCE, optimize=False, ssa=False,
+                                allocator='linear', target='mips'))
+    assert entry['tac'][0] == 'func main'
+
+
+def test_cache_key_flags(tmp_path):
+    cache = Cache(str(tmp_path))
+    plain = cache.key(SOURCE, optimize=False)
+    optimized = cache.key(SOURCE, optimize=True)
+    assert plain != optimized
+    assert plain != cache.key(SOURCE + '\n')
+
+
+def test_cache_eviction(tmp_path):
+    cache = Cache(str(tmp_path), max_size=250)
+    for index, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, {'mips': ['x' * 50]})
+        utime(cache.entry_path(key), (index, index))
+    # Touching 'a' makes 'b' the least recently used entry
+    utime(cache.entry_path('a'), (10, 10))
+    cache.put('d', {'mips': ['x' * 50]})
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c') and cache.get('d')
+
+
+def test_cache_evicted_while_read(tmp_path, monkeypatch):
+    cache = Cache(str(tmp_path))
+    cache.put('a', {'mips': ['nop']})
+
+    def evicted(entry_path):
+        unlink(entry_path)
+        raise FileNotFoundError(entry_path)
+    monkeypatch.setattr(cache_module, 'utime', evicted)
+    assert cache.get('a') == {'mips': ['nop']}
+    assert cache.hits == 1
+
+
+def test_cache_stats_without_cache(monkeypatch):
+    for flag in ('--no-cache', '--mycc', '--debug', '--watch'):
+        monkeypatch.setattr(sys, 'argv',
+                            ['mmcc', 'return.cmm', '--cache-stats', flag])
+        with pytest.raises(SystemExit):
+            parse_args()
+    monkeypatch.setattr(sys, 'argv', ['mmcc', 'return.cmm', '--cache-stats'])
+    assert parse_args().cache_stats
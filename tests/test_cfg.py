@@ -0,0 +1,76 @@
+from compiler.cfg import (ControlFlowGraph, build_cfgs, dominator_tree,
+                          immediate_dominators, live_variables)
+from compiler.frontend import parse_source
+from compiler.optimize import propagate_copies
+from compiler.tac import (TacAssingment, TacEndFunc, TacIfStatement,
+                          TacLabel, TacPrint, TacReturn, TacStartFunc,
+                          build_tac)
+from compiler.token import Token
+
+# if (c) { x = 1 } else { x = 2 }, as two branches meeting at L1
+DIAMOND = [
+    TacStartFunc('main'),
+    TacIfStatement('c', 'L0'),
+    TacAssingment('x', '1'),
+    TacIfStatement('0', 'L1'),
+    TacLabel('L0'),
+    TacAssingment('x', '2'),
+    TacLabel('L1'),
+    TacPrint('x'),
+    TacReturn('0'),
+    TacEndFunc('main'),
+]
+
+
+def test_blocks():
+    graph = ControlFlowGraph(DIAMOND)
+    entry, then, other, join, end = graph.blocks
+    assert [len(block) for block in graph.blocks] == [2, 2, 2, 3, 1]
+    assert entry.successors == [then, other]
+    assert then.successors == [other, join]
+    assert join.predecessors == [then, other]
+    assert end.predecessors == []
+
+
+def test_split_functions():
+    source = 'int f() { return 1; }\nint main() { print(f()); return 0; }\n'
+    graphs = build_cfgs(build_tac(parse_source(source)))
+    assert [str(graph.entry.instructions[0]) for graph in graphs] == [
+        'func f', 'func main']
+    assert graphs[0].blocks[0].successors == []
+
+
+def test_dominators():
+    graph = ControlFlowGraph(DIAMOND)
+    entry, then, other, join, end = graph.blocks
+    idom = graph.analysis(immediate_dominators)
+    assert idom[then] is entry
+    assert idom[join] is entry
+    assert end not in idom
+    assert graph.dominates(entry, join)
+    assert not graph.dominates(then, join)
+    assert graph.analysis(dominator_tree)[entry] == [then, other, join]
+
+
+def test_analysis_cache():
+    graph = ControlFlowGraph(DIAMOND)
+    live = graph.analysis(live_variables)
+    assert graph.analysis(live_variables) is live
+    assert Token('x') in live[graph.blocks[1]]
+    graph.blocks[3].instructions[1] = TacPrint('1')
+    graph.invalidate()
+    assert Token('x') not in graph.analysis(live_variables)[graph.blocks[1]]
+
+
+def test_copies_stop_at_merge():
+    tac_list = [
+        TacStartFunc('main'),
+        TacAssingment('x', '0'),
+        TacIfStatement('c', 'L0'),
+        TacAssingment('x', '1'),
+        TacLabel('L0'),
+        TacPrint('x'),
+        TacEndFunc('main'),
+    ]
+    assert not propagate_copies(tac_list)
+    assert str(tac_list[5]) == 'print x'
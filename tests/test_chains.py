@@ -0,0 +1,63 @@
+from compiler.cfg import ControlFlowGraph
+from compiler.chains import DefUseChains
+from compiler.optimize import optimize_tac
+from compiler.tac import (TacAssingment, TacEndFunc, TacIfStatement,
+                          TacLabel, TacOperation, TacPrint, TacReturn,
+                          TacStartFunc)
+
+
+def diamond(then, other):
+    """if (c) x = then else x = other, then print x + y"""
+    return [
+        TacStartFunc('main'),
+        TacAssingment('y', '4'),
+        TacIfStatement('c', 'L0'),
+        TacAssingment('x', then),
+        TacIfStatement('0', 'L1'),
+        TacLabel('L0'),
+        TacAssingment('x', other),
+        TacLabel('L1'),
+        TacOperation('t0', '+', 'x', 'y'),
+        TacPrint('t0'),
+        TacReturn('0'),
+        TacEndFunc('main'),
+    ]
+
+
+def test_chains():
+    tac_list = diamond('1', '2')
+    chains = DefUseChains(ControlFlowGraph(tac_list))
+    add = tac_list[8]
+    assert set(map(id, chains.definitions(add, 'lhs'))) == {
+        id(tac_list[3]), id(tac_list[6])}
+    assert chains.definitions(add, 'rhs') == [tac_list[1]]
+    assert chains.uses(tac_list[1]) == [(add, 'rhs')]
+    assert chains.uses(add) == [(tac_list[9], 'lhs')]
+    assert chains.acyclic
+
+
+def test_replace():
+    tac_list = diamond('1', '2')
+    chains = DefUseChains(ControlFlowGraph(tac_list))
+    add = tac_list[8]
+    chains.replace(add, 'rhs', '4')
+    assert chains.uses(tac_list[1]) == []
+    assert chains.is_dead(tac_list[1])
+    assert chains.remove(tac_list[1]) == []
+    assert not chains.is_dead(tac_list[1])
+
+
+def test_constant():
+    chains = DefUseChains(ControlFlowGraph(diamond('1', '1')))
+    add = chains.graph.blocks[3].instructions[1]
+    assert str(chains.constant(add, 'lhs')) == '1'
+    assert str(chains.constant(add, 'rhs')) == '4'
+    chains = DefUseChains(ControlFlowGraph(diamond('1', '2')))
+    add = chains.graph.blocks[3].instructions[1]
+    assert chains.constant(add, 'lhs') is None
+
+
+def test_fold_through_branches():
+    assert list(map(str, optimize_tac(diamond('1', '1')))) == [
+        'func main', '!if c goto L0', '!if 0 goto L1', 'L0', 'L1',
+        'print 5', 'return 0', 'endfunc']
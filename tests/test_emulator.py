@@ -0,0 +1,91 @@
+import pytest
+from compiler.client import write_program
+from compiler.compile import make_program
+from compiler.emulator import Emulator, MipsError, run, strip_header
+from compiler.frontend import parse_source
+from compiler.mips import ENTRY, build_mips
+from compiler.tac import build_tac
+from subprocess import check_output
+
+RECURSIVE = '''int sum(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+
+int main() {
+  print(sum(100));
+  return 0;
+}
+'''
+
+
+def test_arithmetic():
+    assert run([
+        'li $t0, 2147483647',
+        'addi $t0, $t0, 1',
+        'move $a0, $t0',
+        'li $v0, 1',
+        'syscall',
+        'li $t1, -7',
+        'li $t2, 2',
+        'div $a0, $t1, $t2',
+        'syscall',
+        'rem $a0, $t1, $t2',
+        'syscall',
+        'li $zero, 5',
+        'slt $a0, $t1, $zero',
+        'syscall',
+    ]) == '-2147483648-3-11'
+
+
+def test_memory_and_syscalls():
+    assert run([
+        'li $a0, 8',
+        'li $v0, 9',
+        'syscall',
+        'li $t0, 42',
+        'sw $t0, 4($v0)',
+        'lw $a0, 4($v0)',
+        'li $v0, 1',
+        'syscall',
+        'li $v0, 10',
+        'syscall',
+        'li $v0, 1',
+        'syscall',
+    ]) == '42'
+
+
+def test_counters():
+    emulator = Emulator(build_mips(build_tac(parse_source(RECURSIVE))))
+    assert emulator.run() == '5050\n'
+    counts = emulator.label_counts()
+    # Only the entry comes before a label
+    assert sum(counts.values()) + len(ENTRY) == emulator.executed
+    # The code after the if runs once per call but the last
+    assert counts['sum'] > 0 and counts['L0'] > counts['main']
+
+
+def test_errors():
+    with pytest.raises(MipsError, match='undefined label'):
+        Emulator(['j nowhere'])
+    with pytest.raises(MipsError, match='unsupported instruction'):
+        Emulator(['frob $t0, $t1'])
+    with pytest.raises(MipsError, match='division by zero'):
+        run(['li $t0, 1', 'div $t0, $t0, $zero'])
+    with pytest.raises(MipsError, match='gave up'):
+        run(['loop:', 'j loop'], max_steps=100)
+
+
+def test_program():
+    program = make_program(build_mips(build_tac(parse_source(RECURSIVE))))
+    assert run(strip_header(program.splitlines())) == '5050\n'
+
+
+def test_program_outside_repository(tmp_path):
+    program = make_program(build_mips(build_tac(parse_source(RECURSIVE))))
+    write_program(program, str(tmp_path / 'prog.out'))
+    output = check_output(['./prog.out'], cwd=str(tmp_path),
+                          universal_newlines=True)
+    assert output == '5050\n'
@@ -0,0 +1,56 @@
+from glob import glob
+
+import pytest
+from compiler.compile import stream_ast
+from compiler.frontend import parse_source
+from compiler.interpreter import Interpreter
+from compiler.parse import format_ast, parse
+from compiler.tac import build_tac
+
+
+def test_examples():
+    for src in glob('examples/*.cmm'):
+        with open(src) as src_file:
+            expected = list(format_ast(parse(stream_ast(src_file))))
+            src_file.seek(0)
+            head = parse_source(src_file.read())
+            assert list(format_ast(head)) == expected
+
+
+def test_statements(tmp_path):
+    source = tmp_path / 'statements.cmm'
+    source.write_text(
+        "int f(int a) {\n"
+        "  int x = 1, y;\n"
+        "  if (a != 2) x = a; else { y = a <= 3; }\n"
+        "  while (x < 10 == 1) { x = (x + 1) * 2 % 3 - 4; continue; }\n"
+        "  ;\n"
+        "  {}\n"
+        "  return g(x, y), f();\n"
+        "}\n"
+    )
+    with open(source) as src_file:
+        expected = list(format_ast(parse(stream_ast(src_file))))
+    assert list(format_ast(parse_source(source.read_text()))) == expected
+
+
+def test_syntax_error():
+    with pytest.raises(SystemExit) as error:
+        parse_source('int main() {\n  int x = 1 +;\n}\n')
+    assert str(error.value).endswith('^\nsyntax error')
+
+
+def test_unary_operators():
+    source = ('int main() {\n  int x = 5;\n'
+              '  print(-x);\n  print(!x);\n  print(!0);\n  print(+x - -3);\n'
+              '  return 0;\n}\n')
+    tac_list = build_tac(parse_source(source))
+    assert Interpreter(tac_list).run() == '-5\n0\n1\n8\n'
+
+
+def test_pointer_operators():
+    for op in ('&', '*'):
+        with pytest.raises(SystemExit) as error:
+            parse_source(f'int main() {{\n  int x = 1;\n  print({op}x);\n}}\n')
+        assert str(error.value).endswith(
+            f"  print({op}x);\n        ^\nError: unary '{op}' isn't supported")
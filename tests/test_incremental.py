@@ -0,0 +1,44 @@
+import pytest
+from compiler.compile import compile_source
+from compiler.incremental import IncrementalBuild, split_source
+
+SQUARE = 'int square(int x) {\n  return x * x;\n}\n'
+MAIN = 'int main() {\n  print(square(%d));\n  return 0;\n}\n'
+
+
+def test_split_source():
+    source = 'int g;\n' + SQUARE + '/* } */\n' + MAIN % 2
+    chunks = list(split_source(source))
+    assert len(chunks) == 2
+    assert ''.join(chunks) == source.rstrip('\n')
+
+
+def test_rebuild_changed_function():
+    builder = IncrementalBuild()
+    first = builder.build(SQUARE + MAIN % 2)
+    assert builder.rebuilt == ['square', 'main']
+
+    second = builder.build(SQUARE + MAIN % 3)
+    assert builder.rebuilt == ['main']
+    square_mips = first[3:first.index('main:')]
+    assert second[3:second.index('main:')] == square_mips
+    assert 'li $a0, 3' in second
+
+    builder.build(SQUARE + MAIN % 3)
+    assert builder.rebuilt == []
+
+
+def test_rebuild_follows_calls():
+    builder = IncrementalBuild()
+    builder.build(SQUARE + MAIN % 2)
+    with pytest.raises(SystemExit):
+        builder.build(SQUARE.replace('square', 'cube') + MAIN % 2)
+
+
+@pytest.mark.parametrize('target', ['mips', 'x86-64'])
+@pytest.mark.parametrize('allocator', ['linear', 'coloring'])
+def test_build_options(allocator, target):
+    source = SQUARE + MAIN % 2
+    builder = IncrementalBuild(True, True, allocator, target)
+    assert builder.build(source) == compile_source(source, True, None, True,
+                                                   allocator, target)
@@ -0,0 +1,58 @@
+import pytest
+from compiler.frontend import parse_source
+from compiler.interpreter import Interpreter, TacError
+from compiler.optimize import optimize_tac
+from compiler.tac import build_tac
+
+SUM = '''int sum(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+
+int main() {
+  print(sum(%d));
+  return 0;
+}
+'''
+
+NESTED = '''int sub(int a, int b) {
+  return a - b;
+}
+
+int main() {
+  int x = 6 * 7 + 0;
+  int y = x * 1;
+  print(sub(sub(x, 2), sub(y, 40)));
+}
+'''
+
+
+def interpreter(source, optimize=False):
+    tac_list = build_tac(parse_source(source), dag=optimize)
+    if optimize:
+        tac_list = optimize_tac(tac_list)
+    return Interpreter(tac_list)
+
+
+def test_run():
+    assert interpreter(NESTED).run() == '38\n'
+    # Deeper than python's recursion limit
+    deep = interpreter(SUM % 5000)
+    assert deep.run() == f'{5000 * 5001 // 2}\n'
+    assert deep.function_counts()['sum'] == 7 * 5000 + 3
+    assert deep.instruction_counts()['TacCall'] == 5001
+
+
+def test_optimized_counts():
+    plain, optimized = interpreter(NESTED), interpreter(NESTED, True)
+    assert plain.run() == optimized.run()
+    assert optimized.executed < plain.executed
+
+
+def test_errors():
+    with pytest.raises(TacError, match='division by zero'):
+        interpreter('int main() {\n  int a = 0;\n  print(1 / a);\n}\n').run()
+    with pytest.raises(TacError, match='gave up'):
+        interpreter(SUM % 100).run(max_steps=50)
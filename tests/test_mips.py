@@ -1,11 +1,11 @@
 import re
-from compiler.compile import make_ast
+from compiler.compile import stream_ast
+from compiler.emulator import MipsError, run
+from compiler.frontend import parse_source
 from compiler.mips import build_mips
-from compiler.parse import parse_ast
+from compiler.parse import parse
 from compiler.tac import build_tac
 from glob import glob
-from subprocess import PIPE, run
-from tempfile import NamedTemporaryFile
 
 import pytest
 
@@ -16,28 +16,17 @@ def check_mips(fname, expected, instructions):
 
     __tracebackhide__ = True
 
-    with NamedTemporaryFile() as temp:
+    # Execute the machine instructions
+    try:
+        output = run(instructions)
+    except MipsError as error:
+        pytest.fail(f'{fname} Error: \n{error}')
 
-        # Write the mips instructions to a temporary file
-        temp.write("\n".join(instructions).encode('utf-8'))
-
-        # Reset file pointer (for reading)
-        temp.seek(0)
-
-        # Execute the temporary machine instructions
-        cmd = f"spim load {temp.name}"
-        out = run(cmd, shell=True, stdout=PIPE, stderr=PIPE, check=True)
-
-        # Fail if stderr has been written to
-        if out.stderr:
-            stderr = out.stderr.decode('utf-8').strip()
-            pytest.fail(f'{fname} Error: \n{stderr}')
-
-        # Else check if the content of stdout is correct
-        program_output = out.stdout.decode('utf-8').strip().splitlines()
-        result = program_output[-1]
-        if result != expected.strip():
-            pytest.fail(f'{fname}\nExpected: {expected}\nGot: {result}')
+    # Check if the content of stdout is correct
+    program_output = output.strip().splitlines()
+    result = program_output[-1]
+    if result != expected.strip():
+        pytest.fail(f'{fname}\nExpected: {expected}\nGot: {result}')
 
 
 def test_examples():
@@ -48,5 +37,36 @@ def test_examples():
             if match:
                 src_file.seek(0)
                 category, expected = match.groups()
-                mips = build_mips(build_tac(parse_ast(make_ast(src_file))))
+                mips = build_mips(build_tac(parse(stream_ast(src_file))))
                 check_mips(src_file.name, expected, mips)
+
+
+def function_mips(source, name):
+    mips = build_mips(build_tac(parse_source(source)))
+    start = mips.index(f'{name}:')
+    end = next(i for i, line in enumerate(mips) if i > start and
+               line.endswith(':') and not line.startswith('L'))
+    return mips[start:end]
+
+
+def test_stack_frames():
+    source = ('int g(int a, int b, int c, int d, int e, int f) {\n'
+              '  return a - f + e;\n}\n\n'
+              'int f(int a) {\n  return g(a, 2, 3, 4, 5, 6) + a;\n}\n')
+    leaf = function_mips(source, 'g')
+    # A leaf only saves the frame pointer, and pops the two arguments
+    # passed on the stack
+    assert leaf[1:4] == ['addi $sp, $sp, -4', 'sw $fp, 0($sp)',
+                         'move $fp, $sp']
+    assert leaf[-3:] == ['addi $sp, $fp, 12', 'lw $fp, 0($fp)', 'jr $ra']
+    assert leaf[4:7] == ['move $t0, $a0', 'lw $t1, 8($fp)',
+                         'lw $t2, 4($fp)']
+    caller = function_mips(source, 'f')
+    assert 'sw $ra, 4($fp)' in caller and 'lw $ra, 4($fp)' in caller
+    assert caller.index('li $a3, 4') < caller.index('sw $v0, 0($sp)')
+    assert not any(line == 'syscall' for line in caller + leaf)
+
+
+def test_fall_off_end():
+    mips = function_mips('int f(int a) {\n  print(a);\n}\n', 'f')
+    assert mips[-1] == 'jr $ra'
@@ -0,0 +1,85 @@
+from compiler.cfg import ControlFlowGraph
+from compiler.numbering import number_values
+from compiler.tac import (TacAssingment, TacEndFunc, TacIfStatement,
+                          TacLabel, TacOperation, TacPrint, TacReturn,
+                          TacStartFunc)
+
+
+def function(*body):
+    return [TacStartFunc('main'), *body, TacReturn('0'), TacEndFunc('main')]
+
+
+def numbered(tac_list, dominators=False):
+    eliminated = number_values(ControlFlowGraph(tac_list), dominators)
+    return eliminated, list(map(str, tac_list[1:-2]))
+
+
+def test_commutative():
+    tac_list = function(
+        TacOperation('t0', '*', 'a', 'b'),
+        TacOperation('t1', '*', 'b', 'a'),
+        TacOperation('t2', '-', 'a', 'b'),
+        TacOperation('t3', '-', 'b', 'a'),
+        TacOperation('t4', '==', 't1', 't0'),
+        TacOperation('t5', '==', 't0', 't0'),
+    )
+    assert numbered(tac_list) == (2, [
+        't0 := a * b', 't1 := t0', 't2 := a - b', 't3 := b - a',
+        't4 := t1 == t0', 't5 := t4'])
+
+
+def test_copies_share_numbers():
+    tac_list = function(
+        TacAssingment('c', 'a'),
+        TacOperation('t0', '+', 'a', '1'),
+        TacOperation('t1', '+', 'c', '1'),
+        TacPrint('t1'),
+    )
+    assert numbered(tac_list) == (
+        1, ['c := a', 't0 := a + 1', 't1 := t0', 'print t1'])
+
+
+def test_redefinition_kills():
+    tac_list = function(
+        TacOperation('t0', '+', 'a', 'b'),
+        TacAssingment('x', 't0'),
+        TacAssingment('a', '1'),
+        TacOperation('t1', '+', 'a', 'b'),
+        TacAssingment('x', '2'),
+        TacOperation('t2', '+', 'a', 'b'),
+    )
+    eliminated, lines = numbered(tac_list)
+    assert eliminated == 1
+    assert lines[3] == 't1 := a + b'
+    assert lines[5] == 't2 := t1'
+
+
+def test_dominator_scope():
+    """a * b is available after the branch, a + b is not"""
+    tac_list = function(
+        TacOperation('t0', '*', 'a', 'b'),
+        TacOperation('t1', '+', 'a', 'b'),
+        TacIfStatement('c', 'L0'),
+        TacAssingment('t1', '0'),
+        TacLabel('L0'),
+        TacOperation('t2', '*', 'a', 'b'),
+        TacOperation('t3', '+', 'a', 'b'),
+        TacPrint('t3'),
+    )
+    assert numbered(list(tac_list)) == (0, list(map(str, tac_list[1:-2])))
+    eliminated, lines = numbered(tac_list, dominators=True)
+    assert eliminated == 1
+    assert lines[5:7] == ['t2 := t0', 't3 := a + b']
+
+
+def test_loop_kills():
+    """The loop writes a, so a * b must be recomputed at its head"""
+    tac_list = function(
+        TacOperation('t0', '*', 'a', 'b'),
+        TacLabel('L0'),
+        TacOperation('t1', '*', 'a', 'b'),
+        TacAssingment('a', 't1'),
+        TacIfStatement('a', 'L0'),
+    )
+    assert numbered(tac_list, dominators=True) == (0, [
+        't0 := a * b', 'L0', 't1 := a * b', 'a := t1', '!if a goto L0'])
@@ -1,19 +1,139 @@
-from shutil import get_terminal_size
-from compiler.tac import TacInstruction
-from compiler.optimize import eliminate_dead_code
-
-
-# def test_eliminate_dead_code():
-#     """
-#     t2 := 5
-#     y := t2
-#     return y
-#     """
-#     tac_list = [
-#         TacInstruction(None, '=', "t2", "5"),
-#         TacInstruction(None, "-", "y", "t2"),
-#         TacInstruction(None, "return", "y", None),
-#     ]
-#     new_list, changed = eliminate_dead_code(tac_list)
-#     assert not changed
-#     assert new_list == tac_list
+import sys
+from collections import Counter
+from glob import glob
+
+import pytest
+
+from compiler.cfg import ControlFlowGraph
+from compiler.compile import main
+from compiler.frontend import parse_source
+from compiler.optimize import (eliminate_dead_code, optimize_tac,
+                               propagate_copies)
+from compiler.packed import pack
+from compiler.tac import (TacAssingment, TacEndFunc, TacIfStatement,
+                          TacLabel, TacOperation, TacPrint, TacReturn,
+                          TacStartFunc, build_tac)
+
+
+def test_eliminate_dead_code():
+    """
+    t2 := 5
+    y := t2
+    return y
+    """
+    tac_list = [
+        TacOperation('t2', '+', '2', '3'),
+        TacAssingment('y', 't2'),
+        TacReturn('y'),
+    ]
+    new_list, changed = eliminate_dead_code(tac_list)
+    assert not changed
+    assert new_list == tac_list
+
+
+def test_eliminate_dead_chain():
+    tac_list = [
+        TacStartFunc('main'),
+        TacOperation('t0', '+', 'x', '1'),
+        TacOperation('t1', '*', 't0', '2'),
+        TacAssingment('y', 't1'),
+        TacReturn('0'),
+        TacEndFunc('main'),
+    ]
+    new_list, changed = eliminate_dead_code(tac_list)
+    assert changed
+    assert list(map(str, new_list)) == ['func main', 'return 0', 'endfunc']
+
+
+def test_eliminate_dead_code_branches():
+    """The first write to x is read when the branch is taken"""
+    tac_list = [
+        TacStartFunc('main'),
+        TacAssingment('x', '0'),
+        TacIfStatement('c', 'L0'),
+        TacAssingment('x', '1'),
+        TacLabel('L0'),
+        TacPrint('x'),
+        TacAssingment('x', '2'),
+        TacReturn('0'),
+        TacEndFunc('main'),
+    ]
+    new_list, changed = eliminate_dead_code(tac_list)
+    assert changed
+    assert new_list == tac_list[:6] + tac_list[7:]
+
+
+def test_optimize_examples():
+    for src in sorted(glob('examples/*.cmm')):
+        if 'undefined' in src:
+            continue
+        with open(src) as src_file:
+            source = src_file.read()
+        objects = optimize_tac(build_tac(parse_source(source)))
+        packed = optimize_tac(pack(build_tac(parse_source(source))))
+        assert list(map(str, packed)) == list(map(str, objects))
+
+
+def test_fold_operators():
+    with open('examples/operators.cmm') as src_file:
+        tac_list = build_tac(parse_source(src_file.read()))
+    assert list(map(str, optimize_tac(tac_list))) == [
+        'func main', 'print 4', 'endfunc']
+
+
+def test_revisit_rewritten():
+    """Propagating x makes t0 constant, which then propagates to print"""
+    tac_list = [
+        TacStartFunc('main'),
+        TacAssingment('x', '2'),
+        TacOperation('t0', '*', 'x', '3'),
+        TacOperation('t1', '+', 't0', '0'),
+        TacPrint('t1'),
+        TacEndFunc('main'),
+    ]
+    assert list(map(str, optimize_tac(tac_list))) == [
+        'func main', 'print 6', 'endfunc']
+
+
+def test_common_subexpressions():
+    source = '''int f(int a, int b) {
+  return a * b + b * a;
+}
+'''
+    stats = Counter()  # type: Counter
+    tac_list = optimize_tac(build_tac(parse_source(source)), stats=stats)
+    assert stats['value numbering'] == 1
+    assert list(map(str, tac_list))[-3:] == [
+        't7 := t5 + t5', 'return t7', 'endfunc']
+
+
+def test_propagate_copies_invalidates_changed(monkeypatch):
+    invalidated = []
+
+    def invalidate(graph):
+        invalidated.append(graph.entry.instructions[0])
+
+    monkeypatch.setattr(ControlFlowGraph, 'invalidate', invalidate)
+    tac_list = [
+        TacStartFunc('f'),
+        TacAssingment('y', 'x'),
+        TacReturn('y'),
+        TacEndFunc('f'),
+        TacStartFunc('g'),
+        TacReturn('x'),
+        TacEndFunc('g'),
+    ]
+    assert propagate_copies(tac_list)
+    assert invalidated == [tac_list[0]]
+
+
+def test_optimize_stats(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['mmcc', 'examples/operators.cmm',
+                                      '--optimize-stats', '--tac-only'])
+    with pytest.raises(SystemExit):
+        main()
+    assert 'rule fold constants: 3' in capsys.readouterr().out.splitlines()
+    monkeypatch.setattr(sys, 'argv', ['mmcc', 'examples/operators.cmm',
+                                      '--optimize-stats', '--watch'])
+    with pytest.raises(SystemExit, match='2'):
+        main()
@@ -0,0 +1,51 @@
+from glob import glob
+
+from benchmarks.optimizer import generate_tac
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.optimize import eliminate_dead_code, propagate_copies
+from compiler.packed import PackedTac, pack, unpack
+from compiler.tac import TacOperation, build_tac
+
+
+def example_tac():
+    for src in sorted(glob('examples/*.cmm')):
+        if 'undefined' not in src:
+            with open(src) as src_file:
+                yield build_tac(parse_source(src_file.read()))
+
+
+def test_round_trip():
+    for tac_list in example_tac():
+        packed = pack(tac_list)
+        assert len(packed) == len(tac_list)
+        assert list(map(str, packed)) == list(map(str, tac_list))
+        assert unpack(packed) == tac_list
+
+
+def test_build_mips():
+    for tac_list in example_tac():
+        assert build_mips(pack(tac_list)) == build_mips(tac_list)
+
+
+def test_views_write_columns():
+    packed = pack([TacOperation('t0', '+', 'x', '1')])
+    view = packed[0]
+    assert isinstance(view, TacOperation)
+    view.rhs = 2
+    assert str(packed[0]) == 't0 := x + 2'
+    assert packed.nbytes == 17
+
+
+def test_optimizer_passes():
+    objects = generate_tac(200)
+    packed = pack(generate_tac(200))
+    for tac_list in [objects, packed]:
+        for instruction in tac_list:
+            instruction.optimize()
+    objects, _ = eliminate_dead_code(objects)
+    packed, _ = eliminate_dead_code(packed)
+    assert isinstance(packed, PackedTac)
+    propagate_copies(objects)
+    propagate_copies(packed)
+    assert list(map(str, packed)) == list(map(str, objects))
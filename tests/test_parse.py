@@ -0,0 +1,59 @@
+from glob import glob
+
+import pytest
+from compiler.compile import stream_ast
+from compiler.parse import format_ast, parse, parse_ast, split_indent
+
+AST = [
+    'D',
+    '  d',
+    '    int',
+    '    F',
+    '      main',
+    '  return',
+    '    +',
+    '      1',
+    '      3',
+]
+
+
+def test_parse_ast():
+    head = parse_ast(AST)
+    assert head.tok.lexeme == 'D'
+    assert head.rhs.lhs.rhs.tok.lexeme == '3'
+    assert list(format_ast(head)) == AST
+
+
+def test_deep_ast():
+    depth = 5000
+    ast = [' ' * (2 * level) + ';' for level in range(depth)]
+    head = parse_ast(iter(ast))
+    assert list(format_ast(head)) == ast
+
+
+def test_stream_ast():
+    # Only the AST, none of the source lines mycc echoes before it
+    with open('return.cmm') as src_file:
+        assert list(stream_ast(src_file)) == list(map(split_indent, AST))
+
+    for src in glob('examples/*.cmm'):
+        with open(src) as src_file:
+            lines = list(stream_ast(src_file))
+        # The tree prints back as the lines mycc printed
+        head = parse(iter(lines))
+        assert [split_indent(line) for line in format_ast(head)] == lines
+
+
+def test_stream_ast_no_trailing_newline(tmp_path):
+    source = tmp_path / 'return.cmm'
+    source.write_text('int main() {\n  return 1 + 3;\n}')
+    with open(source) as src_file:
+        assert list(stream_ast(src_file)) == list(map(split_indent, AST))
+
+
+def test_stream_ast_syntax_error(tmp_path, capsys):
+    source = tmp_path / 'error.cmm'
+    source.write_text('int main() {\n  int x = 1 +;\n}\n')
+    with open(source) as src_file, pytest.raises(SystemExit):
+        parse(stream_ast(src_file))
+    assert capsys.readouterr().out.strip().endswith('syntax error')
@@ -0,0 +1,56 @@
+from collections import Counter
+
+from compiler.frontend import parse_source
+from compiler.optimize import optimize_tac
+from compiler.peephole import CONST, DEFAULT_RULES, VAR, Rule, RuleSet
+from compiler.tac import TacOperation, build_tac
+
+
+def rewritten(rules, op, lhs, rhs, fired=None):
+    tac = TacOperation('t0', op, lhs, rhs)
+    rules.apply(tac, fired)
+    return str(tac)
+
+
+def test_default_rules():
+    fired = Counter()  # type: Counter
+    for (op, lhs, rhs), expected in [
+            (('+', 't1', '0'), 't0 := t1'),
+            (('*', '1', 'x'), 't0 := x'),
+            (('*', 'x', '2'), 't0 := x + x'),
+            (('-', '3', '5'), 't0 := -2'),
+            (('/', '3', '0'), 't0 := 3 / 0'),
+            (('+', '0', 'x'), 't0 := 0 + x')]:
+        assert rewritten(DEFAULT_RULES, op, lhs, rhs, fired) == expected
+    assert fired == {'add zero': 1, 'multiply by one': 1,
+                     'strength reduce': 1, 'fold constants': 1}
+
+
+def test_index():
+    tried = []
+
+    def never(op, lhs, rhs):
+        tried.append((op, lhs, rhs))
+
+    rules = RuleSet([Rule('never', '-', VAR, 3, never),
+                     Rule('never', '-', CONST, VAR, never)])
+    for lhs, rhs in [('x', '4'), ('x', 'y'), ('3', 'x'), ('x', '3')]:
+        rewritten(rules, '-', lhs, rhs)
+        rewritten(rules, '+', lhs, rhs)
+    assert list(map(str, [lhs for _, lhs, _ in tried])) == ['3', 'x']
+
+
+def test_user_rules():
+    rules = DEFAULT_RULES + [
+        Rule('zero plus', '+', 0, VAR, lambda op, lhs, rhs: rhs),
+        Rule('self equal', '==', VAR, VAR,
+             lambda op, lhs, rhs: 1 if lhs is rhs else None),
+    ]
+    source = 'int f(int a) {\n  return 0 + (a == a);\n}\n'
+    for dag in [False, True]:
+        fired = Counter()  # type: Counter
+        tac_list = build_tac(parse_source(source), dag=dag, rules=rules,
+                             fired=fired)
+        tac_list = optimize_tac(tac_list, rules=rules, fired=fired)
+        assert list(map(str, tac_list))[-2:] == ['return 1', 'endfunc']
+        assert fired['self equal'] == 1
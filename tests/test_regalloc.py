@@ -0,0 +1,80 @@
+from compiler.cfg import split_functions
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.regalloc import ALLOCATORS, CALLEE_SAVED, REGISTERS, allocate
+from compiler.tac import build_tac
+
+CALLS = '''int g(int a) {
+  return a + 1;
+}
+
+int f(int a) {
+  int b = a * 3;
+  int c = g(a);
+  return b + c;
+}
+'''
+
+
+def functions(source):
+    return list(map(list, split_functions(build_tac(parse_source(source)))))
+
+
+def many_live(count):
+    """A function with count variables all live at the same time"""
+    lines = [f'  int v{i} = a + {i};' for i in range(count)]
+    total = ' + '.join(f'v{i}' for i in range(count))
+    return 'int f(int a) {\n' + '\n'.join(lines) + f'\n  return {total};\n}}\n'
+
+
+def test_registers_reused():
+    function, = functions('int f(int a) {\n'
+                          '  int b = a + 1;\n'
+                          '  int c = b * 2;\n'
+                          '  int d = c - 3;\n'
+                          '  return d;\n'
+                          '}\n')
+    for method in ALLOCATORS:
+        allocation = allocate(function, method)
+        assert not allocation.spilled
+        # Each value dies where the next is computed
+        assert len(set(allocation.registers.values())) <= 2
+
+
+def test_spilling():
+    function, = functions(many_live(len(REGISTERS) + 4))
+    for method in ALLOCATORS:
+        allocation = allocate(function, method)
+        assert allocation.spilled
+        assert len(allocation.registers) + len(allocation.spilled) == \
+            len(allocation.liveness.ranges)
+        # Variables live at the same time never share a register
+        ranges = allocation.liveness.ranges
+        for var, register in allocation.registers.items():
+            for other, other_register in allocation.registers.items():
+                if var is not other and register == other_register:
+                    first, second = sorted([ranges[var], ranges[other]],
+                                           key=lambda r: r.start)
+                    assert first.end < second.start
+
+
+def test_live_across_call():
+    _, function = functions(CALLS)
+    for method in ALLOCATORS:
+        allocation = allocate(function, method)
+        crossing = [var for var, live_range in
+                    allocation.liveness.ranges.items()
+                    if live_range.crosses_call]
+        assert list(map(str, crossing)) == ['b']
+        assert allocation.registers[crossing[0]] in CALLEE_SAVED
+        assert allocation.callee_saved == [allocation.registers[crossing[0]]]
+
+
+def test_mips():
+    mips = build_mips(build_tac(parse_source(CALLS)))
+    assert 'sw $s0, 8($fp)' in mips
+    assert 'lw $s0, 8($fp)' in mips
+    # The copies from temporaries into b and c are gone
+    moves = [line.split(' ', 1)[1].split(', ') for line in mips
+             if line.startswith('move')]
+    assert not [move for move in moves if set(move) <= set(REGISTERS)]
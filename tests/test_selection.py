@@ -0,0 +1,168 @@
+from compiler.compile import stream_ast
+from compiler.emulator import REGISTERS, Emulator
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.optimize import optimize_tac
+from compiler.parse import parse
+from compiler.selection import (BASIC_TILES, COMPARISONS, REG,
+                                REGISTER_FORM, Tile, TileSet, cost, cycles,
+                                magic, power_of_two, set_and_branch,
+                                total_cost)
+from compiler.tac import build_tac, operators
+from glob import glob
+
+LOOP = '''int sum(int n) {
+  if (n == 0) {
+    return 0;
+  }
+  return n + sum(n - 1);
+}
+
+int f(int a, int b) {
+  int c = a >= 5;
+  if (a < b) {
+    c = c + 1;
+  }
+  if (a > 100000) {
+    c = c - 1;
+  }
+  print(c);
+  return c == 2;
+}
+'''
+
+
+def mips_lines(source, **kwargs):
+    return build_mips(build_tac(parse_source(source)), **kwargs)
+
+
+def test_cost():
+    assert cost('add $t0, $t1, $t2') == 1
+    assert cost('addi $t0, $t1, -1') == 1
+    assert cost('li $t0, 65535') == 1
+    assert cost('li $t0, 65536') == 2
+    assert cost('sge $t0, $t1, $t2') == 3
+    assert cost('blt $t0, 5, L1') == 3
+    assert cost('L1:') == 0
+    assert cycles('mul $t0, $t1, $t2') > cycles('sll $t0, $t1, 2') == 1
+
+
+def test_tiles():
+    mips = mips_lines(LOOP)
+    # Immediates, and branches on the comparisons they cover
+    assert 'addi $a0, $s0, -1' in mips
+    assert 'bnez $s0, L0' in mips
+    assert any(line.startswith('bge ') for line in mips)
+    assert any(line.startswith('slti ') for line in mips)
+    assert not any(line.split(' ')[0] in ('seq', 'sge', 'sgt')
+                   for line in mips)
+    # 100000 doesn't fit an immediate
+    assert any(line.startswith('li ') and line.endswith('100000')
+               for line in mips)
+    # The result is computed in $v1 rather than moved there
+    assert not any(line.startswith('move $v1') for line in mips)
+
+
+def test_set_and_branch_tiles():
+    tiles = TileSet([REGISTER_FORM], [
+        Tile('set and branch', COMPARISONS, REG, REG, set_and_branch),
+    ])
+    source = ('int main() {\n  int a = 3;\n  if (a < 5) {\n    print(a);\n'
+              '  }\n  return 0;\n}\n')
+    mips = mips_lines(source, tiles=tiles)
+    # The comparison is only covered by the set's own register form
+    assert any(line.startswith('slt ') for line in mips)
+    assert not any(line.startswith('slti ') for line in mips)
+    assert Emulator(mips).run() == '3\n'
+
+
+def test_cheaper():
+    for src in glob('examples/*.cmm'):
+        with open(src) as src_file:
+            if 'Answer' not in src_file.readline():
+                continue
+            src_file.seek(0)
+            tac_list = optimize_tac(build_tac(parse(stream_ast(src_file))))
+        tiled_mips = build_mips(tac_list)
+        basic_mips = build_mips(tac_list, tiles=BASIC_TILES)
+        assert total_cost(tiled_mips) <= total_cost(basic_mips)
+        tiled, basic = Emulator(tiled_mips), Emulator(basic_mips)
+        assert tiled.run() == basic.run()
+        assert tiled.executed <= basic.executed
+
+
+def wrap(value, bits=32):
+    return (value + 2 ** (bits - 1)) % 2 ** bits - 2 ** (bits - 1)
+
+
+def literal(value):
+    return str(value) if value >= 0 else f'(0 - {-value})'
+
+
+def test_magic():
+    # Every dividend by every divisor, for words small enough to try them
+    # all
+    bits = 8
+    for divisor in range(-127, 128):
+        if abs(divisor) < 2 or power_of_two(divisor) is not None:
+            continue
+        multiplier, shift = magic(divisor, bits)
+        for dividend in range(-128, 128):
+            quotient = dividend * multiplier >> bits
+            if divisor > 0 and multiplier < 0:
+                quotient += dividend
+            elif divisor < 0 and multiplier > 0:
+                quotient -= dividend
+            quotient >>= shift
+            quotient += quotient < 0
+            assert quotient == operators['/'](dividend, divisor)
+
+
+DIVISORS = [
+    *range(-100, 101), *(2 ** n for n in range(31)),
+    *(-2 ** n for n in range(32)), 2 ** 31 - 1, -2 ** 31 + 1, 641,
+    10 ** 9, -10 ** 9, 65535, 65537, 3 ** 19,
+]
+
+
+def dividends(divisor):
+    """The ends of the range, and around its multiples of divisor there"""
+    values = {0, 1, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 15, -2 ** 15}
+    for end in (0, 2 ** 31 - 1, -2 ** 31):
+        multiple = end // divisor if divisor else 0
+        for quotient in (multiple - 1, multiple, multiple + 1):
+            values.update(quotient * divisor + offset
+                          for offset in range(-2, 3))
+    return [value for value in values if wrap(value) == value]
+
+
+def test_constant_operands():
+    """The lowered MIPS against tac.operators over the 32 bit range"""
+    for op in ('*', '/', '%'):
+        for divisor in DIVISORS:
+            if divisor == 0 and op != '*':
+                continue
+            source = (f'int f(int x) {{\n  return x {op} {literal(divisor)};'
+                      f'\n}}\n\nint main() {{\n  return 0;\n}}\n')
+            mips = build_mips(optimize_tac(build_tac(parse_source(source))))
+            if op != '*':
+                assert not any(line.startswith(('div ', 'rem '))
+                               for line in mips)
+            emulator = Emulator(mips)
+            registers = emulator.registers
+            for dividend in dividends(divisor):
+                # Call f, returning to the end of the program
+                registers[REGISTERS['$a0']] = dividend
+                registers[REGISTERS['$ra']] = len(emulator.code)
+                emulator.run(emulator.labels['f'])
+                expected = wrap(operators[op](dividend, divisor))
+                assert registers[REGISTERS['$v1']] == expected, \
+                    f'{dividend} {op} {divisor}'
+
+
+def test_multiply_by_constant():
+    mips = mips_lines('int f(int x) {\n  return x * 10;\n}\n')
+    assert not any(line.startswith('mul') for line in mips)
+    assert any(line.startswith('sll') for line in mips)
+    mips = mips_lines('int f(int x) {\n  return x * 12345;\n}\n')
+    assert any(line.startswith('mul') for line in mips)
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from threading import Thread
+
+import subprocess
+
+import pytest
+from compiler.cache import Cache
+from compiler.client import request
+from compiler.compile import compile_source, make_program
+from compiler.server import make_server
+
+SOURCE = 'int main() {\n  print(6 * 7);\n  return 0;\n}\n'
+
+
+@pytest.fixture
+def server(tmp_path):
+    sock_path = str(tmp_path / 'mmcc.sock')
+    server = make_server(sock_path, Cache(str(tmp_path / 'cache')))
+    thread = Thread(target=server.serve_forever)
+    thread.start()
+    yield sock_path, server.cache
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def compile_request(sock_path, source):
+    return request(sock_path, {'name': 'test', 'source': source})
+
+
+def test_serve_examples(server):
+    server, _ = server
+    sources = []
+    for src in sorted(glob('examples/*.cmm')):
+        if 'undefined' not in src:
+            with open(src) as src_file:
+                sources.append(src_file.read())
+    with ThreadPoolExecutor(4) as pool:
+        replies = list(pool.map(lambda s: compile_request(server, s),
+                                sources * 2))
+    expected = [make_program(compile_source(s)) for s in sources] * 2
+    assert [reply['program'] for reply in replies] == expected
+
+
+def test_serve_error(server):
+    server, _ = server
+    reply = compile_request(server, 'int main() {\n  fail();\n}\n')
+    assert not reply['ok']
+    assert reply['error'] == "Error: Function 'fail' undefined"
+    # Any other failure is replied to as well
+    reply = request(server, {'source': SOURCE, 'allocator': 'unknown'})
+    assert not reply['ok']
+    assert reply['error'].startswith('KeyError')
+
+
+def test_serve_options(server):
+    server, cache = server
+    message = {'source': SOURCE, 'optimize': True, 'ssa': True,
+               'allocator': 'coloring'}
+    replies = [request(server, message) for _ in range(2)]
+    expected = compile_source(SOURCE, True, None, True, 'coloring')
+    assert [reply['program'] for reply in replies] == \
+        [make_program(expected)] * 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_serve_x86(server, tmp_path):
+    server, _ = server
+    out = str(tmp_path / 'prog')
+    reply = request(server, {'source': SOURCE, 'target': 'x86-64',
+                             'out': out})
+    assert reply['ok'] and 'program' not in reply
+    assert subprocess.run([out], stdout=subprocess.PIPE).stdout == b'42\n'
@@ -0,0 +1,57 @@
+from compiler.cfg import ControlFlowGraph
+from compiler.compile import compile_source
+from compiler.frontend import parse_source
+from compiler.ssa import BOTTOM, SSAForm, TacPhi, propagate_constants, sccp
+from compiler.tac import build_tac
+
+SOURCE = '''int main() {
+  int a = 4;
+  int b = 1;
+  if (a > 2) {
+    b = a + 3;
+  }
+  if (a < 0) {
+    print(99);
+  }
+  print(a + b);
+  return 0;
+}
+'''
+
+PARAM = '''int f(int a) {
+  int b = 1;
+  if (a) {
+    b = 2;
+  }
+  return b;
+}
+'''
+
+
+def test_phis():
+    form = SSAForm(ControlFlowGraph(build_tac(parse_source(PARAM))))
+    phis = [tac for tac in form.graph.instructions()
+            if isinstance(tac, TacPhi)]
+    assert list(map(str, phis)) == ['b.2 := phi(b.1, b.3)']
+    values, reached = sccp(form)
+    assert values[phis[0].lhs] == BOTTOM
+    # Only the endfunc after the return is never reached
+    assert len(reached) == len(form.graph.blocks) - 1
+
+
+def test_leave_ssa():
+    tac_list = build_tac(parse_source(PARAM))
+    before = list(map(str, tac_list))
+    assert list(map(str, propagate_constants(tac_list))) == before
+
+
+def test_sccp():
+    tac_list = propagate_constants(build_tac(parse_source(SOURCE)))
+    lines = list(map(str, tac_list))
+    assert 'print 99' not in lines
+    assert 't10 := 4 + 7' in lines
+
+
+def test_shorter_mips():
+    assert len(compile_source(SOURCE, True, ssa=True)) < \
+        len(compile_source(SOURCE, True))
@@ -1,7 +1,10 @@
 import os
 from glob import glob
-from compiler.compile import make_ast
-from compiler.parse import parse_ast
+
+import pytest
+from compiler.compile import stream_ast
+from compiler.frontend import parse_source
+from compiler.parse import parse
 from compiler.tac import build_tac
 
 
@@ -16,7 +19,47 @@ def test_examples():
         tac_file_name = fname(src) + '.tac'
         if os.path.isfile(tac_file_name):
             with open(src) as src_file, open(tac_file_name) as tac_file:
-                head = parse_ast(make_ast(src_file))
+                head = parse(stream_ast(src_file))
                 tac_strings = list(map(str, build_tac(head)))
                 expected = [line.strip() for line in tac_file.readlines()]
                 assert tac_strings == expected
+
+
+def dag_tac(body):
+    source = f'int f(int a, int b) {{\n{body}\n}}\n'
+    return list(map(str, build_tac(parse_source(source), dag=True)))[4:-1]
+
+
+def test_dag_shares_operations():
+    assert dag_tac('return a * b + (b * a) * 1;') == [
+        't5 := a * b', 't6 := t5 + t5', 'return t6']
+
+
+def test_dag_folds_constants():
+    assert dag_tac('int x = 3; int y = (x * 2 + 1) * b; return y;') == [
+        'x := 3', 't6 := 7 * b', 'y := t6', 'return y']
+
+
+def test_dag_assignment_kills():
+    assert dag_tac('int x = a + b; a = 1; return a + b + x;') == [
+        't5 := a + b', 'x := t5', 'a := 1', 't7 := 1 + b', 't8 := t7 + x',
+        'return t8']
+
+
+def test_dag_if_restores():
+    """Neither a value assigned nor an operation built in the body is
+    known after it"""
+    assert dag_tac('int x = 1; if (a) { x = 2; b = a * 2; }\n'
+                   'return x + a * 2;') == [
+        'x := 1', '!if a goto L0', 'x := 2', 't6 := a + a', 'b := t6', 'L0',
+        't9 := a + a', 't10 := x + t9', 'return t10']
+
+
+def test_mycc_unary_operator(tmp_path):
+    source = tmp_path / 'unary.cmm'
+    source.write_text('int main() {\n  print(-1);\n  return 0;\n}\n')
+    with open(source) as src_file:
+        head = parse(stream_ast(src_file))
+    with pytest.raises(SystemExit) as error:
+        build_tac(head)
+    assert str(error.value).startswith('Error: unary operators')
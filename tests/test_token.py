@@ -0,0 +1,43 @@
+import pickle
+import sys
+from threading import Barrier, Thread
+
+from compiler.token import Token
+
+
+def test_interned():
+    assert Token('x') is Token('x')
+    assert Token('x') is not Token('y')
+    assert pickle.loads(pickle.dumps(Token('t3'))) is Token('t3')
+
+
+def test_classification():
+    assert Token('t3').is_temporary and Token('t3').is_register
+    assert Token('s1').is_saved and Token('a0').is_arg
+    assert Token('12').is_constant and Token('12').val == 12
+    assert Token('x').is_identifier and Token('x').val is None
+    assert Token('a1').to_mips == '$a1'
+    assert Token('5').to_mips == '5'
+
+
+def test_interned_across_threads():
+    lexemes = [f'threaded{i}' for i in range(1000)]
+    barrier = Barrier(8)
+    results = []
+
+    def intern():
+        barrier.wait()
+        results.append([Token(lexeme) for lexeme in lexemes])
+
+    threads = [Thread(target=intern) for _ in range(8)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    for tokens in zip(*results):
+        assert len({id(tok) for tok in tokens}) == 1
@@ -0,0 +1,51 @@
+from glob import glob
+from shutil import which
+from subprocess import PIPE, run
+
+import pytest
+from compiler.emulator import run as run_mips
+from compiler.frontend import parse_source
+from compiler.mips import build_mips
+from compiler.optimize import optimize_tac
+from compiler.tac import build_tac
+from compiler.x86 import assemble, build_x86
+
+ARGS = '''int g(int a, int b, int c, int d, int e, int f, int h, int i) {
+  return a - b + c - d + e - f + h * i;
+}
+
+int main() {
+  int x = 7;
+  print(g(1, 2, 3, 4, 5, 6, x, g(8, 7, 6, 5, 4, 3, 2, x / 3)));
+  print(x % 4 + (x > 3) * 10);
+  return 0;
+}
+'''
+
+
+def test_stack_arguments():
+    x86 = build_x86(build_tac(parse_source(ARGS)))
+    main = x86[x86.index('cmm_main:'):]
+    # Two of the eight arguments go on the stack, are popped after the call
+    assert main.count('subq $16, %rsp') == 2
+    assert main.count('addq $16, %rsp') == 2
+    g = x86[x86.index('cmm_g:'):x86.index('cmm_main:')]
+    # and read from above the return address
+    assert any('16(%rbp)' in line for line in g)
+    assert any('24(%rbp)' in line for line in g)
+
+
+@pytest.mark.skipif(which('gcc') is None, reason='needs gcc')
+def test_same_output(tmp_path):
+    sources = [ARGS] + [open(name).read() for name in glob('examples/*.cmm')
+                        if 'undefined' not in name]
+    executable = str(tmp_path / 'prog')
+    for source in sources:
+        for optimize in [False, True]:
+            tac_list = build_tac(parse_source(source), dag=optimize)
+            if optimize:
+                tac_list = optimize_tac(tac_list)
+            assemble(build_x86(tac_list), executable)
+            native = run([executable], stdout=PIPE, check=True,
+                         universal_newlines=True).stdout
+            assert native == run_mips(build_mips(tac_list))